@@ -0,0 +1,137 @@
+"""
+bench_layout.py
+Price and VolumePeriods in the old layout (TEXT keys, NUMERIC(65,30) amounts) vs. the compact one
+(INT token ids, lamports, DOUBLE PRECISION prices): table size before and after compression, and
+query times for a single token's candles and an all-token volume scan
+
+Needs a TimescaleDB reachable with the .env settings, works in two scratch schemas it drops afterwards
+
+usage: python benchmarks/bench_layout.py [tokens] [rows per token] [repeats]
+"""
+
+import datetime, os, statistics, sys, time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from database import CONN_STRING
+import psycopg
+
+# rows are spread over one day, one token's mint is a 44 character string like a base58 pubkey
+MINT = "substr(md5(t::text) || md5((t + 1)::text), 1, 44)"
+
+LAYOUTS = {
+    "text": {
+        "tables": """
+            CREATE TABLE {schema}.Price (id TEXT, tokenID TEXT, price NUMERIC(65,30), timestamp TIMESTAMPTZ, PRIMARY KEY (id, timestamp));
+            CREATE TABLE {schema}.VolumePeriods (id TEXT, tokenID TEXT, buyVolume NUMERIC(65,30), sellVolume NUMERIC(65,30),
+                                                 periodStart TIMESTAMPTZ, PRIMARY KEY (id, periodStart));
+        """,
+        "fill": f"""
+            INSERT INTO {{schema}}.Price
+            SELECT {MINT} || ':' || i, {MINT}, (0.000001 + random() / 1e4)::NUMERIC(65,30), now() - i * %(step)s
+            FROM generate_series(1, %(tokens)s) t, generate_series(1, %(rows)s) i;
+            INSERT INTO {{schema}}.VolumePeriods
+            SELECT {MINT} || ':' || i, {MINT}, round((random() * 50)::NUMERIC, 9), round((random() * 50)::NUMERIC, 9), now() - i * %(step)s
+            FROM generate_series(1, %(tokens)s) t, generate_series(1, %(rows)s) i;
+        """,
+        "token": f"(SELECT {MINT} FROM (SELECT 1 AS t) one)",
+        "volume": "buyVolume + sellVolume",
+    },
+    "compact": {
+        "tables": """
+            CREATE TABLE {schema}.Price (tokenID INT, timestamp TIMESTAMPTZ, price DOUBLE PRECISION, PRIMARY KEY (tokenID, timestamp));
+            CREATE TABLE {schema}.VolumePeriods (tokenID INT, periodStart TIMESTAMPTZ, volume BIGINT, buyVolume BIGINT,
+                                                 sellVolume BIGINT, PRIMARY KEY (tokenID, periodStart));
+        """,
+        "fill": """
+            INSERT INTO {schema}.Price
+            SELECT t, now() - i * %(step)s, 0.000001 + random() / 1e4
+            FROM generate_series(1, %(tokens)s) t, generate_series(1, %(rows)s) i;
+            INSERT INTO {schema}.VolumePeriods
+            SELECT t, now() - i * %(step)s, (random() * 100e9)::BIGINT, NULL, NULL
+            FROM generate_series(1, %(tokens)s) t, generate_series(1, %(rows)s) i;
+        """,
+        "token": "1",
+        "volume": "volume",
+    },
+}
+
+QUERIES = {
+    "1m candles, one token": """
+        SELECT time_bucket('1 minute', timestamp) AS bucket, first(price, timestamp), max(price), min(price), last(price, timestamp)
+        FROM {schema}.Price WHERE tokenID = {token} GROUP BY bucket ORDER BY bucket
+    """,
+    "volume per token, last hour": """
+        SELECT tokenID, sum({volume})
+        FROM {schema}.VolumePeriods WHERE periodStart > now() - INTERVAL '1 hour' GROUP BY tokenID
+    """,
+}
+
+
+def setup(cur, schema, layout, tokens, rows):
+    cur.execute(f"DROP SCHEMA IF EXISTS {schema} CASCADE")
+    cur.execute(f"CREATE SCHEMA {schema}")
+    cur.execute(layout["tables"].format(schema=schema))
+    for table, column in (("Price", "timestamp"), ("VolumePeriods", "periodStart")):
+        cur.execute(f"SELECT create_hypertable('{schema}.{table}', '{column.lower()}', chunk_time_interval => INTERVAL '6 hours')")
+        cur.execute(f"ALTER TABLE {schema}.{table} SET (timescaledb.compress, timescaledb.compress_segmentby = 'tokenid')")
+    step = datetime.timedelta(seconds=86400 / rows)
+    # statements with parameters have to be sent one at a time
+    for statement in layout["fill"].format(schema=schema).split(";"):
+        if statement.strip():
+            cur.execute(statement, {"tokens": tokens, "rows": rows, "step": step})
+    cur.execute(f"ANALYZE {schema}.Price")
+    cur.execute(f"ANALYZE {schema}.VolumePeriods")
+
+
+def size(cur, schema):
+    cur.execute(f"SELECT hypertable_size('{schema}.Price') + hypertable_size('{schema}.VolumePeriods')")
+    return cur.fetchone()[0]
+
+
+def compress(cur, schema):
+    for table in ("Price", "VolumePeriods"):
+        cur.execute(f"SELECT compress_chunk(chunk, if_not_compressed => TRUE) FROM show_chunks('{schema}.{table}') chunk")
+
+
+def time_queries(cur, schema, layout, repeats):
+    timings = {}
+    for name, query in QUERIES.items():
+        sql = query.format(schema=schema, token=layout["token"], volume=layout["volume"])
+        cur.execute(sql) # warm the cache
+        samples = []
+        for _ in range(repeats):
+            started = time.perf_counter()
+            cur.execute(sql)
+            cur.fetchall()
+            samples.append((time.perf_counter() - started) * 1000)
+        timings[name] = statistics.median(samples)
+    return timings
+
+
+if __name__ == "__main__":
+    tokens = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    rows = int(sys.argv[2]) if len(sys.argv) > 2 else 5000
+    repeats = int(sys.argv[3]) if len(sys.argv) > 3 else 10
+    print(f"{tokens} tokens x {rows} rows in Price and VolumePeriods, median of {repeats} runs\n")
+
+    results = {}
+    with psycopg.connect(CONN_STRING, autocommit=True) as conn:
+        with conn.cursor() as cur:
+            for name, layout in LAYOUTS.items():
+                schema = f"bench_layout_{name}"
+                try:
+                    setup(cur, schema, layout, tokens, rows)
+                    raw = size(cur, schema)
+                    raw_timings = time_queries(cur, schema, layout, repeats)
+                    compress(cur, schema)
+                    results[name] = (raw, size(cur, schema), raw_timings, time_queries(cur, schema, layout, repeats))
+                finally:
+                    cur.execute(f"DROP SCHEMA IF EXISTS {schema} CASCADE")
+
+    print(f"{'layout':<8} {'size MB':>9} {'compressed MB':>14}")
+    for name, (raw, compressed, _, _) in results.items():
+        print(f"{name:<8} {raw / 2**20:>9.1f} {compressed / 2**20:>14.1f}")
+    print(f"\n{'query':<28} {'layout':<8} {'ms':>8} {'compressed ms':>14}")
+    for query in QUERIES:
+        for name, (_, _, raw_timings, compressed_timings) in results.items():
+            print(f"{query:<28} {name:<8} {raw_timings[query]:>8.2f} {compressed_timings[query]:>14.2f}")
@@ -0,0 +1,25 @@
+"""
+counters.py
+Per-period counters behind the components' stats(), read with snapshot() and cleared with reset()
+"""
+
+
+class Counters:
+    """
+    Named counters (and running totals) for one reporting period, updated as plain attributes:
+    `counters.written += 1`. Reading them never changes them, whoever reports the period calls `reset()`.
+    """
+
+    def __init__(self, *names):
+        self._names = names
+        self.reset()
+
+    def reset(self):
+        for name in self._names:
+            setattr(self, name, 0)
+
+    def snapshot(self):
+        return {name: getattr(self, name) for name in self._names}
+
+    def __repr__(self):
+        return f"Counters({self.snapshot()})"
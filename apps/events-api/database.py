@@ -1,6 +1,8 @@
 from dotenv import find_dotenv, load_dotenv
-import psycopg2
+from psycopg_pool import AsyncConnectionPool
+import psycopg
 import os
+import sys
 
 load_dotenv(find_dotenv(".env"))
 
@@ -22,15 +24,30 @@ if SSL_MODE:
     CONN_STRING += f"?sslmode={SSL_MODE}"
 
 
+"""
+Connection pool:
+    shared by the ingestion pipeline (and later the API routes), opened in the app lifespan
+"""
+
+def create_pool() -> AsyncConnectionPool:
+    return AsyncConnectionPool(
+        CONN_STRING,
+        min_size=int(os.getenv("POSTGRES_POOL_MIN", 2)),
+        max_size=int(os.getenv("POSTGRES_POOL_MAX", 10)),
+        open=False
+    )
+
+
 """
 Setup:
     create tables if they don't exist - timescale
 """
 
 def check_table_exists(table_name: str) -> bool:
-    with psycopg2.connect(CONN_STRING) as conn:
+    with psycopg.connect(CONN_STRING) as conn:
         with conn.cursor() as cur:
-            cur.execute(f"SELECT EXISTS (SELECT FROM information_schema.tables WHERE table_name = '{table_name}');")
+            # unquoted identifiers in CREATE_TABLES.SQL are folded to lower case
+            cur.execute("SELECT EXISTS (SELECT FROM information_schema.tables WHERE table_name = %s);", (table_name.lower(),))
             fetched=cur.fetchone()
             if fetched and fetched[0]:
                 return True
@@ -41,13 +58,83 @@ def create_tables():
     with open("sql/CREATE_TABLES.SQL", "r") as file:
         sql = file.read()
 
-    with psycopg2.connect(CONN_STRING) as conn:
+    with psycopg.connect(CONN_STRING) as conn:
+        with conn.cursor() as cur:
+            cur.execute(sql)
+            conn.commit()
+
+    # new databases are brought to the compact layout the ingestion writes right away
+    migrate_compact()
+
+# hierarchical continuous aggregates (one built on another) need TimescaleDB 2.9
+MIN_TIMESCALEDB = (2, 9)
+
+def timescaledb_version(cur):
+    cur.execute("SELECT extversion FROM pg_extension WHERE extname = 'timescaledb';")
+    fetched = cur.fetchone()
+    if not fetched:
+        return None
+    # "2.14.2", development builds look like "2.15.0-dev"
+    return tuple(int(part) for part in fetched[0].split("-")[0].split(".")[:2])
+
+def check_timescaledb(cur):
+    version = timescaledb_version(cur)
+    if version is None:
+        raise RuntimeError("The timescaledb extension is not installed in this database")
+    if version < MIN_TIMESCALEDB:
+        raise RuntimeError(
+            f"TimescaleDB {'.'.join(map(str, version))} is too old for the continuous aggregates, "
+            f"{'.'.join(map(str, MIN_TIMESCALEDB))} or newer is needed"
+        )
+
+def create_aggregates():
+    # continuous aggregates can't be created in a transaction (a multi statement query is one),
+    # so every statement is sent on its own with autocommit
+    with open("sql/CREATE_AGGREGATES.SQL", "r") as file:
+        sql = file.read()
+
+    with psycopg.connect(CONN_STRING, autocommit=True) as conn:
+        with conn.cursor() as cur:
+            check_timescaledb(cur)
+            for statement in sql.split(";"):
+                if statement.strip():
+                    cur.execute(statement)
+
+
+"""
+Migration:
+    convert a database from the TEXT key / NUMERIC(65,30) layout of CREATE_TABLES.SQL to the compact one
+    the ingestion writes, see MIGRATE_COMPACT.SQL
+"""
+
+def migrate_compact():
+    with open("sql/MIGRATE_COMPACT.SQL", "r") as file:
+        sql = file.read()
+
+    # one transaction: the aggregates are dropped in it too, a failed migration leaves everything as it was
+    with psycopg.connect(CONN_STRING) as conn:
         with conn.cursor() as cur:
+            # checked first, the aggregates it drops have to be recreated afterwards
+            check_timescaledb(cur)
             cur.execute(sql)
             conn.commit()
 
+    create_aggregates()
+
         
 if __name__ == "__main__":
-    if not check_table_exists("Token"):
+    if len(sys.argv) > 1 and sys.argv[1] == "migrate":
+        if check_table_exists("TokenIds"):
+            print("Already on the compact layout")
+        else:
+            print("Migrating tables to the compact layout...")
+            migrate_compact()
+    elif not check_table_exists("Token"):
         print("Creating tables...")
         create_tables()
+    elif not check_table_exists("TokenIds"):
+        print("Tables are on the earlier layout, convert them with `python database.py migrate`")
+        sys.exit(1)
+    else:
+        # idempotent, adds the aggregates to databases created before they existed
+        create_aggregates()
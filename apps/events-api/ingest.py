@@ -0,0 +1,353 @@
+"""
+ingest.py
+Kafka -> TimescaleDB ingestion: token processor messages are parsed into rows, buffered per table and
+written in batches with COPY (or staged upserts) inside one transaction, Kafka offsets are committed after the commit.
+Rows use the compact layout of sql/MIGRATE_COMPACT.SQL: integer token ids and integer base-unit amounts
+"""
+
+from psycopg_pool import AsyncConnectionPool
+from psycopg import errors
+from decimal import Decimal
+from counters import Counters
+import asyncio, datetime, json, logging, time, traceback
+
+NULL_PUBKEY = "11111111111111111111111111111111" # solana.PublicKey{} as sent for unset authorities
+INGEST_MODES = ("copy", "upsert")
+LAMPORTS_PER_SOL = 1_000_000_000
+
+# table -> columns, in COPY order. The first column is the token: parsers put the mint there,
+# the writer swaps it for the TokenIds id
+TABLES = {
+    "Token": ("id", "metadata", "supply", "decimals", "numberOfBuys", "numberOfSells", "freezeAuthority",
+              "mintAuthority", "basePoolAccount", "quotePoolAccount", "owner", "totalBuyVolume", "totalSellVolume",
+              "totalBurned", "isInitialized", "ipo", "lastUpdated"),
+    "Price": ("tokenID", "timestamp", "price"),
+    "VolumePeriods": ("tokenID", "periodStart", "volume", "buyVolume", "sellVolume"),
+    "BurnPeriods": ("tokenID", "periodStart", "amount"),
+    "LargestHolders": ("tokenID", "timestamp", "topOwnershipPercentage"),
+}
+# primary keys of the compact layout and the ON CONFLICT targets of the upserts. The hypertables are keyed by
+# (TokenIds id, time): a mint always maps to the same id, so a replayed message lands on the row it wrote before
+KEYS = {
+    "Token": ("id",),
+    "Price": ("tokenID", "timestamp"),
+    "VolumePeriods": ("tokenID", "periodStart"),
+    "BurnPeriods": ("tokenID", "periodStart"),
+    "LargestHolders": ("tokenID", "timestamp"),
+}
+WRITE_ORDER = ("Token", "Price", "VolumePeriods", "BurnPeriods", "LargestHolders")
+# errors caused by the rows themselves (numeric overflow, NOT NULL, ...), retrying the same batch can't fix them
+ROW_ERRORS = (errors.DataError, errors.IntegrityError)
+
+
+def to_datetime(value):
+    """The token processor mixes unix seconds (block times) and milliseconds (wall clock times)."""
+    value = float(value)
+    if value > 1e11:
+        value /= 1000
+    return datetime.datetime.fromtimestamp(value, tz=datetime.timezone.utc)
+
+
+def _base_units(value):
+    """Token amounts arrive in base units already, as decimal strings or numbers."""
+    return int(Decimal(str(value))) if value is not None else None
+
+
+def _lamports(value):
+    """SOL amounts arrive in SOL with at most 9 decimals."""
+    return int(Decimal(str(value)) * LAMPORTS_PER_SOL) if value is not None else None
+
+
+def _float(value):
+    return float(value) if value is not None else None
+
+
+def _pubkey(value):
+    return value if value and value != NULL_PUBKEY else None
+
+
+def parse_token(data):
+    mint = data.get("PublicKeyString") or data["PublicKey"]
+    totals = data.get("TotalVolume") or {}
+    # RealSupply is supply / 10^decimals, it isn't stored
+    return (
+        mint, json.dumps(data.get("Metadata"), default=str), _base_units(data.get("Supply")), data.get("Decimals"),
+        data.get("NumberOfBuys", 0), data.get("NumberOfSells", 0), _pubkey(data.get("FreezeAuthority")),
+        _pubkey(data.get("MintAuthority")), _pubkey(data.get("BasePoolAccount")), _pubkey(data.get("QuotePoolAccount")),
+        data.get("Owner"), _lamports(totals.get("TotalBuyVolume")), _lamports(totals.get("TotalSellVolume")),
+        _base_units(data.get("TotalBurned")), data.get("IsInitialized"),
+        to_datetime(data["IPO"]) if data.get("IPO") else None,
+        to_datetime(data["LastUpdated"]) if data.get("LastUpdated") else None,
+    )
+
+
+def parse_price(data):
+    return (data["tokenAddress"], to_datetime(data["time"]), _float(data["price"]))
+
+
+def parse_volume(data):
+    # the token processor sends the period's total, the buy/sell split stays NULL unless a message carries it
+    buy, sell = _lamports(data.get("buyVolume")), _lamports(data.get("sellVolume"))
+    volume = _lamports(data.get("volume"))
+    if volume is None and buy is not None and sell is not None:
+        volume = buy + sell
+    return (data["tokenAddress"], to_datetime(data["time"]), volume, buy, sell)
+
+
+def parse_burn(data):
+    return (data["tokenAddress"], to_datetime(data["startTime"]), _base_units(data["amountBurned"]))
+
+
+def parse_top_holders(data):
+    return (data["tokenAddress"], to_datetime(data["timestamp"]), _float(data["topOwnershipPercentage"]))
+
+
+class TimescaleWriter:
+    """
+    Rows are buffered per table until `batch_rows` are waiting or the oldest has waited `flush_interval`
+    seconds, then the whole buffer is written in one transaction: every mint is swapped for its TokenIds
+    id (new mints are added to the dictionary, known ones come from a cache), tokens are upserted through
+    a staging table, everything else COPYed. `on_durable(messages)` runs for each Kafka batch the transaction
+    covered, after the commit. A failed flush keeps the rows and is retried, while the buffer is full
+    `add` waits for it, which holds back the Kafka consumer. Once a flush failed `max_retries` times in a row
+    on the rows themselves (ROW_ERRORS), the batch is bisected: the rows the database rejects are skipped and
+    counted as invalid, the rest is written. Other errors (the database being down) are retried without end.
+
+    Rows are deduplicated on their primary key within each flush (the last copy wins). In "copy" mode
+    the time-series tables are COPYed directly, a batch that hits rows already stored falls back to
+    inserting only the new ones. In "upsert" mode every table goes through a staging table and a
+    set-based INSERT ... ON CONFLICT DO UPDATE that skips unchanged rows, so replaying a topic from
+    the start costs one statement per table and flush instead of a failed COPY.
+
+    `topics` maps a Kafka topic to (table, parser).
+    """
+
+    def __init__(self, pool: AsyncConnectionPool, topics: dict, on_durable, batch_rows=10_000, flush_interval=1.0, mode="copy", token_cache_size=500_000, max_retries=3):
+        if mode not in INGEST_MODES:
+            raise ValueError(f"Unknown ingest mode {mode}, expected one of {INGEST_MODES}")
+        self.mode = mode
+        self.pool = pool
+        self.topics = topics
+        self.on_durable = on_durable
+        self.batch_rows = batch_rows
+        self.flush_interval = flush_interval
+        self.rows = {table: [] for table in TABLES}
+        self.size = 0
+        self.pending = [] # Kafka batches whose rows are buffered
+        self.oldest = None
+        self.lock = asyncio.Lock()
+        self.running = False
+        self.token_ids = {} # mint -> TokenIds id, only ids from committed transactions
+        self.token_cache_size = token_cache_size
+        self.max_retries = max_retries
+        self.failures = 0 # flushes failed in a row
+
+        self.counters = Counters("written", "flushes", "errors", "invalid", "duplicates", "new_tokens", "flush_ms")
+
+    async def add(self, messages):
+        """Kafka batch handler: buffer the rows, flush (and wait for it) once the buffer is full."""
+        for message in messages:
+            target = self.topics.get(message.topic())
+            if target is None:
+                continue
+            table, parse = target
+            try:
+                self.rows[table].append(parse(json.loads(message.value(), parse_float=Decimal)))
+                self.size += 1
+            except Exception as e:
+                self.counters.invalid += 1
+                logging.error(f"Skipping invalid {message.topic()} message: {e}")
+        self.pending.append(messages)
+        if self.oldest is None:
+            self.oldest = time.monotonic()
+        delay = self.flush_interval
+        while self.size >= self.batch_rows:
+            try:
+                await self.flush()
+            except Exception:
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 30)
+
+    async def run(self):
+        """Flush on time, `add` flushes on size."""
+        self.running = True
+        while self.running:
+            await asyncio.sleep(self.flush_interval / 4)
+            if self.oldest is not None and time.monotonic() - self.oldest >= self.flush_interval:
+                try:
+                    await self.flush()
+                except Exception:
+                    await asyncio.sleep(self.flush_interval)
+
+    async def flush(self):
+        async with self.lock:
+            if not self.pending:
+                return
+            # rows arriving while the write is in flight go to a fresh buffer
+            rows, pending, size = self.rows, self.pending, self.size
+            self.rows = {table: [] for table in TABLES}
+            self.pending = []
+            self.size = 0
+            self.oldest = None
+
+            started = time.perf_counter()
+            skipped = 0
+            try:
+                new_ids = await self._write(rows)
+            except Exception as e:
+                self.failures += 1
+                if not isinstance(e, ROW_ERRORS) or self.failures < self.max_retries:
+                    self._restore(rows, pending, size)
+                    raise
+                logging.warning(f"Writing {size} rows failed {self.failures} times in a row ({e}), isolating the bad rows")
+                try:
+                    new_ids, skipped = await self._write_isolated(rows)
+                except Exception:
+                    self._restore(rows, pending, size)
+                    raise
+
+            self.failures = 0
+            if len(self.token_ids) + len(new_ids) > self.token_cache_size:
+                self.token_ids.clear()
+            self.token_ids.update(new_ids)
+            for messages in pending:
+                self.on_durable(messages)
+            self.counters.written += size - skipped
+            self.counters.flushes += 1
+            self.counters.flush_ms += (time.perf_counter() - started) * 1000
+
+    def _restore(self, rows, pending, size):
+        """Put the rows of a failed flush back in front of the ones that arrived meanwhile."""
+        self.counters.errors += 1
+        logging.error(f"Error writing {size} rows to TimescaleDB: {traceback.format_exc()}")
+        for table in TABLES:
+            rows[table].extend(self.rows[table])
+        self.rows = rows
+        self.pending = pending + self.pending
+        self.size += size
+        self.oldest = time.monotonic()
+
+    async def close(self):
+        """Stop the timer and write what is still buffered."""
+        self.running = False
+        try:
+            await self.flush()
+        except Exception:
+            logging.error(f"{self.size} buffered rows were not written, their Kafka offsets stay uncommitted")
+
+    async def _write(self, rows):
+        """Write `rows` in one transaction, returns the ids of the mints that were looked up on the way."""
+        async with self.pool.connection() as conn:
+            async with conn.transaction():
+                async with conn.cursor() as cur:
+                    new_ids = await self._token_ids(cur, rows)
+                    ids = {**self.token_ids, **new_ids}
+                    for table in WRITE_ORDER:
+                        if not rows[table]:
+                            continue
+                        table_rows = [(ids[row[0]], *row[1:]) for row in self._dedupe(table, rows[table])]
+                        if table == "Token" or self.mode == "upsert":
+                            await self._upsert(cur, table, table_rows, update=True)
+                        else:
+                            await self._copy_or_skip(conn, cur, table, table_rows)
+        return new_ids
+
+    async def _write_isolated(self, rows):
+        """Write `rows` in halves until each rejected row is alone, returns the looked up ids and the number of skipped rows."""
+        # deduplicated up front, two copies of a key must not end up in different halves
+        flat = [(table, row) for table in WRITE_ORDER for row in self._dedupe(table, rows[table])]
+        return await self._bisect(flat)
+
+    async def _bisect(self, flat):
+        batch = {table: [] for table in TABLES}
+        for table, row in flat:
+            batch[table].append(row)
+        try:
+            return await self._write(batch), 0
+        except ROW_ERRORS as e:
+            if len(flat) == 1:
+                self.counters.invalid += 1
+                logging.error(f"Skipping {flat[0][0]} row {flat[0][1]} rejected by TimescaleDB: {e}")
+                return {}, 1
+        middle = len(flat) // 2
+        first_ids, first_skipped = await self._bisect(flat[:middle])
+        second_ids, second_skipped = await self._bisect(flat[middle:])
+        return {**first_ids, **second_ids}, first_skipped + second_skipped
+
+    def _dedupe(self, table, rows):
+        """Last row per primary key, ON CONFLICT DO UPDATE can't touch the same row twice in one statement."""
+        positions = [TABLES[table].index(column) for column in KEYS[table]]
+        unique = {tuple(row[position] for position in positions): row for row in rows}
+        self.counters.duplicates += len(rows) - len(unique)
+        return list(unique.values())
+
+    async def _token_ids(self, cur, rows):
+        """
+        Ids of the mints missing from the cache, added to TokenIds first if they are new. They are cached only
+        once the transaction committed, a rolled back insert would leave ids that don't exist.
+        """
+        mints = sorted({row[0] for table in WRITE_ORDER for row in rows[table]} - self.token_ids.keys())
+        if not mints:
+            return {}
+        await cur.execute("SELECT mint, id FROM TokenIds WHERE mint = ANY(%s)", (mints,))
+        ids = dict(await cur.fetchall())
+        new = [mint for mint in mints if mint not in ids]
+        if new:
+            # only unseen mints are inserted, a conflicting insert would still use up an identity value.
+            # sorted, so concurrent writers lock the same mints in the same order
+            await cur.execute("INSERT INTO TokenIds (mint) SELECT unnest(%s::text[]) ON CONFLICT (mint) DO NOTHING", (new,))
+            await cur.execute("SELECT mint, id FROM TokenIds WHERE mint = ANY(%s)", (new,))
+            ids.update(await cur.fetchall())
+            self.counters.new_tokens += len(new)
+        return ids
+
+    async def _copy(self, cur, table, columns, rows):
+        async with cur.copy(f"COPY {table} ({', '.join(columns)}) FROM STDIN") as copy:
+            for row in rows:
+                await copy.write_row(row)
+
+    async def _copy_or_skip(self, conn, cur, table, rows):
+        """COPY, rows already stored (a Kafka redelivery) make it fail, then only the new ones are inserted."""
+        try:
+            async with conn.transaction():
+                await self._copy(cur, table, TABLES[table], rows)
+        except errors.UniqueViolation:
+            logging.warning(f"Redelivered rows in {table}, skipping the ones already stored")
+            await self._upsert(cur, table, rows, update=False)
+
+    async def _upsert(self, cur, table, rows, update):
+        """COPY into a temp staging table, then one INSERT ... SELECT ... ON CONFLICT into `table`."""
+        columns, key = TABLES[table], KEYS[table]
+        staging = f"{table}_staging"
+        await cur.execute(f"CREATE TEMP TABLE IF NOT EXISTS {staging} (LIKE {table} INCLUDING DEFAULTS) ON COMMIT DELETE ROWS")
+        await self._copy(cur, staging, columns, rows)
+        names = ", ".join(columns)
+        conflict = ", ".join(key)
+        if update:
+            values = [column for column in columns if column not in key]
+            # a replayed row equal to the stored one is left alone instead of rewritten
+            action = (
+                "DO UPDATE SET " + ", ".join(f"{column} = EXCLUDED.{column}" for column in values)
+                + f" WHERE ({', '.join(f'{table}.{column}' for column in values)})"
+                + f" IS DISTINCT FROM ({', '.join(f'EXCLUDED.{column}' for column in values)})"
+            )
+        else:
+            action = "DO NOTHING"
+        await cur.execute(f"INSERT INTO {table} ({names}) SELECT {names} FROM {staging} ON CONFLICT ({conflict}) {action}")
+
+    def stats(self):
+        counters = self.counters
+        return {
+            "buffered": self.size,
+            "written": counters.written,
+            "flushes": counters.flushes,
+            "flush_ms_avg": round(counters.flush_ms / counters.flushes, 2) if counters.flushes else 0.0,
+            "errors": counters.errors,
+            "invalid": counters.invalid,
+            "duplicates": counters.duplicates,
+            "new_tokens": counters.new_tokens,
+            "cached_tokens": len(self.token_ids),
+        }
+
+    def reset_stats(self):
+        self.counters.reset()
@@ -0,0 +1,189 @@
+"""
+kafka_consumer.py
+Kafka consumption off the event loop: a dedicated thread polls in batches and hands them to the loop
+through a bounded queue, offsets are committed only after a batch was processed
+"""
+
+from confluent_kafka import Consumer, KafkaError, TopicPartition
+from counters import Counters
+import asyncio, concurrent.futures, logging, queue, threading, time, traceback
+
+
+class KafkaBatchConsumer:
+    """
+    All calls on the confluent_kafka Consumer happen on one thread, which `consume`s up to `batch_size`
+    messages (waiting at most `poll_timeout`) and puts them on an asyncio queue of `max_batches`.
+    When the loop falls behind the thread blocks on the full queue, so the consumer stops fetching
+    instead of buffering without bound.
+
+    `run(handler)` awaits `handler(messages)` for every batch in order and then commits the batch's
+    offsets (auto commit is off, delivery is at least once). A failing handler is retried with backoff,
+    the batch is never skipped. With `commit=False` the handler commits itself via `commit(messages)`,
+    e.g. once a later write made the batch durable; `on_drained()` runs once the last batch was handled,
+    before the final commit and close.
+    """
+
+    def __init__(self, config: dict, topics, batch_size=500, poll_timeout=0.5, max_batches=8, lag_interval=10.0):
+        self.config = {**config, "enable.auto.commit": False}
+        self.topics = [topic for topic in topics if topic]
+        self.batch_size = batch_size
+        self.poll_timeout = poll_timeout
+        self.lag_interval = lag_interval
+        self.queue = asyncio.Queue(max_batches)
+        self.commits = queue.SimpleQueue() # offsets to commit, handed from the loop to the poll thread
+        self.loop = None
+        self.thread = None
+        self.running = False
+        self.drained = threading.Event() # set once run() processed everything handed over
+        self.error = None # why the poll thread stopped on its own, run() raises it
+
+        self.counters = Counters("consumed", "batches", "committed", "failed")
+        self.lag = {} # topic -> messages behind the high watermark, refreshed by the poll thread
+
+    def start(self):
+        self.loop = asyncio.get_running_loop()
+        self.running = True
+        self.thread = threading.Thread(target=self._poll_thread, name="kafka-consumer", daemon=True)
+        self.thread.start()
+
+    async def stop(self):
+        self.running = False
+        if self.thread is not None:
+            await asyncio.to_thread(self.thread.join)
+
+    def alive(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    # ------- poll thread -------
+
+    def _poll_thread(self):
+        consumer = Consumer(self.config)
+        consumer.subscribe(self.topics)
+        logging.info(f"Subscribed to topics {self.topics}")
+        next_lag = time.monotonic() + self.lag_interval
+        try:
+            while self.running:
+                self._commit_pending(consumer)
+                messages = consumer.consume(num_messages=self.batch_size, timeout=self.poll_timeout)
+                batch = [message for message in messages if self._usable(message)]
+                if self.error is not None:
+                    break
+                if batch:
+                    self._hand_over(batch)
+                if time.monotonic() >= next_lag:
+                    self.lag = self._lag(consumer)
+                    next_lag = time.monotonic() + self.lag_interval
+        except Exception as e:
+            logging.error(f"Error in Kafka poll thread: {traceback.format_exc()}")
+            self.error = e
+        finally:
+            self.running = False
+            # let run() finish the batches already handed over so their offsets make the final commit
+            self.drained.wait(timeout=30)
+            self._commit_pending(consumer)
+            consumer.close()
+            logging.info("Kafka consumer closed")
+
+    def _usable(self, message):
+        error = message.error()
+        if error is None:
+            return True
+        if error.code() == KafkaError._PARTITION_EOF:
+            return False
+        if error.code() == KafkaError.UNKNOWN_TOPIC_OR_PART:
+            logging.fatal("(SETUP) - Need to create topics on Kafka")
+            self.error = error
+            return False
+        logging.error(f"Consumer error: {error}")
+        return False
+
+    def _hand_over(self, batch):
+        # blocks while the queue is full, wakes up regularly to notice a stop
+        while self.running:
+            future = asyncio.run_coroutine_threadsafe(self.queue.put(batch), self.loop)
+            try:
+                future.result(timeout=1.0)
+                return
+            except concurrent.futures.TimeoutError: # not the builtin TimeoutError before 3.11
+                if not future.cancel():
+                    return # the put completed meanwhile
+
+    def _commit_pending(self, consumer):
+        offsets = {}
+        while not self.commits.empty():
+            for partition in self.commits.get():
+                offsets[(partition.topic, partition.partition)] = partition
+        if offsets:
+            try:
+                consumer.commit(offsets=list(offsets.values()), asynchronous=False)
+            except Exception as e:
+                logging.error(f"Error committing offsets: {e}")
+
+    def _lag(self, consumer):
+        lag = {}
+        try:
+            assigned = consumer.assignment()
+            for partition in consumer.position(assigned) if assigned else []:
+                _, high = consumer.get_watermark_offsets(partition, cached=True)
+                if partition.offset >= 0 and high >= 0:
+                    lag[partition.topic] = lag.get(partition.topic, 0) + max(0, high - partition.offset)
+        except Exception as e:
+            logging.error(f"Error reading consumer lag: {e}")
+        return lag
+
+    # ------- event loop -------
+
+    async def run(self, handler, commit=True, on_drained=None):
+        try:
+            await self._run(handler, commit)
+            if on_drained is not None:
+                await on_drained()
+        finally:
+            self.drained.set()
+        if self.error is not None:
+            raise RuntimeError(f"Kafka consumer stopped: {self.error}")
+
+    async def _run(self, handler, commit):
+        retry_delay = 0.5
+        while self.running or not self.queue.empty():
+            try:
+                batch = await asyncio.wait_for(self.queue.get(), timeout=1.0)
+            except asyncio.TimeoutError:
+                continue
+
+            while True:
+                try:
+                    await handler(batch)
+                    break
+                except Exception:
+                    self.counters.failed += 1
+                    logging.error(f"Error processing batch of {len(batch)} messages, retrying in {retry_delay}s: {traceback.format_exc()}")
+                    await asyncio.sleep(retry_delay)
+                    retry_delay = min(retry_delay * 2, 30)
+            retry_delay = 0.5
+
+            if commit:
+                self.commit(batch)
+            self.counters.consumed += len(batch)
+            self.counters.batches += 1
+
+    def commit(self, batch):
+        """Queue the offsets after `batch` for commit, the poll thread commits them before its next fetch."""
+        offsets = {}
+        for message in batch:
+            offsets[(message.topic(), message.partition())] = message.offset() + 1
+        self.commits.put([TopicPartition(topic, partition, offset) for (topic, partition), offset in offsets.items()])
+        self.counters.committed += len(batch)
+
+    def stats(self):
+        return {
+            "running": self.running,
+            "thread_alive": self.alive(),
+            "error": str(self.error) if self.error is not None else None,
+            "queued_batches": self.queue.qsize(),
+            **self.counters.snapshot(),
+            "lag": dict(self.lag),
+        }
+
+    def reset_stats(self):
+        self.counters.reset()
@@ -2,16 +2,19 @@
 import uvicorn
 from typing import AsyncIterator
 from dotenv import find_dotenv, load_dotenv
-import logging, asyncio, json
-from fastapi import FastAPI
+import logging, asyncio, json, signal
+from fastapi import FastAPI, HTTPException
 from colorama import Fore
 from redis import Redis
-from confluent_kafka import Consumer, KafkaError
+from kafka_consumer import KafkaBatchConsumer
+from database import create_pool
+from ingest import TimescaleWriter, parse_token, parse_price, parse_volume, parse_burn, parse_top_holders
 
 from contextlib import asynccontextmanager
 import os
 import datetime
 # from routes import token_routes
+from routes import router as api_router
 
 logging.basicConfig(level=logging.INFO, format=f'{Fore.MAGENTA}[API]{Fore.RESET} %(asctime)s - %(levelname)s - %(message)s', datefmt='%H:%M:%S')
 load_dotenv(find_dotenv(".env"))
@@ -24,6 +27,8 @@ redis_port = os.getenv("REDIS_PORT")
 kafka_remote = os.getenv("KAFKA_BROKER")
 kafka_port = os.getenv("KAFKA_PORT")
 
+token_stale_channel = os.getenv("REDIS_STALE_CHANNEL")
+
 redis = Redis(host=str(os.getenv("REDIS_HOST")), port=int(redis_port), db=0) #type: ignore
 
 interested_topics = [
@@ -43,71 +48,104 @@ if not redis_port:
     exit(1)
 
 if not token_stale_channel:
-    logging.error("REDIS_TOKEN_STALE_CHANNEL not found in .env")
+    logging.error("REDIS_STALE_CHANNEL not found in .env")
     exit(1)
 
-async def listen_to_all_topics():
-    try:
-        consumer = Consumer({
-            'bootstrap.servers': f"{kafka_remote}:{kafka_port}",
-            'group.id': 'events-api',
-            'auto.offset.reset': 'earliest'
-        })
-        return consumer
-    except Exception as e:
-        logging.error(f"Error in Kafka consumer: {e}")
-        exit(1)
-
-async def pub_to_timescale(data: dict):
-    pass
-
-async def kafka_listener():
-    # kafka consumer task
-    try:
-        consumer = await listen_to_all_topics()
-        consumer.subscribe(interested_topics)
-    except Exception as e:
-        print("FUCK")
+# Polling happens on the consumer's own thread, batches reach the loop through a bounded queue
+# and their offsets are committed once kafka_listener processed them
+consumer = KafkaBatchConsumer(
+    {
+        'bootstrap.servers': f"{kafka_remote}:{kafka_port}",
+        'group.id': 'events-api',
+        'auto.offset.reset': 'earliest'
+    },
+    interested_topics,
+    batch_size=int(os.getenv("KAFKA_BATCH_SIZE", 500)),
+    max_batches=int(os.getenv("KAFKA_QUEUE_BATCHES", 8))
+)
+METRICS_INTERVAL = int(os.getenv("METRICS_INTERVAL", 30))
+
+# Rows are COPYed to TimescaleDB once INGEST_BATCH_ROWS are buffered or the oldest waited INGEST_FLUSH_MS,
+# the Kafka offsets of a batch are committed only after the transaction holding its rows committed
+db_pool = create_pool()
+timescale_writer = TimescaleWriter(
+    db_pool,
+    {
+        os.getenv("KAFKA_TOKENS_TOPIC"): ("Token", parse_token),
+        os.getenv("KAFKA_PRICES_TOPIC"): ("Price", parse_price),
+        os.getenv("KAFKA_VOLUMES_TOPIC"): ("VolumePeriods", parse_volume),
+        os.getenv("KAFKA_BURNS_TOPIC"): ("BurnPeriods", parse_burn),
+        os.getenv("KAFKA_TOP_HOLDERS_TOPIC"): ("LargestHolders", parse_top_holders),
+    },
+    consumer.commit,
+    batch_rows=int(os.getenv("INGEST_BATCH_ROWS", 10_000)),
+    flush_interval=float(os.getenv("INGEST_FLUSH_MS", 1000)) / 1000,
+    # INGEST_MODE: copy (default) or upsert (staged INSERT ... ON CONFLICT, safe to replay topics from earliest)
+    mode=os.getenv("INGEST_MODE", "copy"),
+    # INGEST_MAX_RETRIES: failed flushes after which the rows TimescaleDB rejects are skipped instead of retried
+    max_retries=int(os.getenv("INGEST_MAX_RETRIES", 3))
+)
+
+async def pub_to_timescale(messages: list):
+    await timescale_writer.add(messages)
+
+async def kafka_listener(messages: list):
+    for message in messages:
+        topic = message.topic()
+        key = message.key()
+        value = message.value()
+        timestamp = datetime.datetime.fromtimestamp(message.timestamp()[1] / 1e3)
+        logging.debug(f"Received message: {topic} {key} {value} {timestamp}")
+    await pub_to_timescale(messages)
+
+async def report_metrics(interval: int):
+    while True:
+        await asyncio.sleep(interval)
+        logging.info(f"Kafka consumer: {consumer.stats()}")
+        logging.info(f"Timescale writer: {timescale_writer.stats()}")
+        consumer.reset_stats()
+        timescale_writer.reset_stats()
 
-    logging.info("Subscribed to topics")
 
-    while True:
-        try:
-            message = consumer.poll(timeout=1.0)
-
-            if message is None:
-                continue
-            if message.error():
-
-                logging.error(str(message.error()))
-                
-                if "UNKNOWN_TOPIC_OR_PART" in str(message.error()):
-                    logging.fatal("(SETUP) - Need to create topics on Kafka")
-                    exit(1)
-
-                logging.error(f"Consumer error: {message.error()}")
-                continue
-
-            topic = message.topic()
-            key = message.key()
-            value = message.value()
-            timestamp = datetime.datetime.fromtimestamp(message.timestamp()[1] / 1e3)
-            logging.info(f"Received message: {topic} {key} {value} {timestamp}")
-
-            
-        except Exception as e:
-            logging.error(f"Error in Kafka listener: {e}")
-            exit(1)
+def on_consumer_done(task: asyncio.Task):
+    # the API is no use with a dead consumer: stop the server, __main__ exits with 1 like it did on missing topics
+    if task.cancelled() or task.exception() is None:
+        return
+    logging.fatal(f"Kafka consumer died, stopping the API: {task.exception()}")
+    signal.raise_signal(signal.SIGTERM)
 
 
 @asynccontextmanager
 async def start_kafka_listener(application: FastAPI):
-    asyncio.create_task(kafka_listener())  # This will run kafka_listener as a background task
+    await db_pool.open()
+    application.state.db_pool = db_pool
+    consumer.start()
+    # offsets are committed by the writer once the rows are durable, the last flush runs before the consumer closes
+    consumer_task = asyncio.create_task(consumer.run(kafka_listener, commit=False, on_drained=timescale_writer.close))
+    consumer_task.add_done_callback(on_consumer_done)
+    tasks = [
+        consumer_task,
+        asyncio.create_task(timescale_writer.run()),
+        asyncio.create_task(report_metrics(METRICS_INTERVAL)),
+    ]
     yield
     logging.info("Stopping Kafka listener")
+    await consumer.stop()
+    for task in tasks:
+        task.cancel()
+    await db_pool.close()
 
 app = FastAPI(lifespan=start_kafka_listener)
 # app.include_router(token_routes.router, prefix="/api", tags=["tokens"])
+app.include_router(api_router)
+
+
+@app.get("/kafka/lag")
+async def kafka_lag():
+    # messages behind the high watermark per topic, refreshed every few seconds by the consumer thread
+    if consumer.error is not None or not consumer.alive():
+        raise HTTPException(status_code=503, detail=f"Kafka consumer stopped: {consumer.error}")
+    return consumer.lag
 
 if __name__ == "__main__":
     try:
@@ -117,6 +155,8 @@ if __name__ == "__main__":
         config = uvicorn.Config(app, host=api_host, port=int(api_port), loop="asyncio")
         server = uvicorn.Server(config)
         server.run()
+        if consumer.error is not None:
+            exit(1)
     except Exception as e:
         logging.error(f"Error in main: {e}")
         exit(1)
@@ -1,7 +1,8 @@
 from fastapi import APIRouter
-from .token_routes import router as token_router
+# from .token_routes import router as token_router
+from .candle_routes import router as candle_router
 
 router = APIRouter()
 
-router.include_router(token_router, prefix="/api", tags=["tokens"])
-
+# router.include_router(token_router, prefix="/api", tags=["tokens"])
+router.include_router(candle_router, prefix="/api", tags=["candles"])
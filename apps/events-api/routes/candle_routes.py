@@ -0,0 +1,54 @@
+from fastapi import APIRouter, HTTPException, Query, Request
+from typing import Optional
+import datetime
+
+router = APIRouter()
+
+LAMPORTS_PER_SOL = 1_000_000_000
+
+# interval -> (candles view, volume view), see sql/CREATE_AGGREGATES.SQL
+INTERVALS = {
+    "1s": ("price_ohlc_1s", "volume_1s"),
+    "1m": ("price_ohlc_1m", "volume_1m"),
+    "5m": ("price_ohlc_5m", "volume_5m"),
+    "1h": ("price_ohlc_1h", "volume_1h"),
+}
+
+@router.get("/candles/{token}")
+async def get_candles(
+    request: Request,
+    token: str,
+    interval: str = "1m",
+    start: Optional[datetime.datetime] = None,
+    end: Optional[datetime.datetime] = None,
+    limit: int = Query(1000, le=10_000),
+):
+    # OHLC, total and buy/sell volume (in SOL, stored in lamports) per bucket, read from the continuous aggregates
+    # instead of the raw rows
+    if interval not in INTERVALS:
+        raise HTTPException(status_code=400, detail=f"interval must be one of {list(INTERVALS)}")
+    candles, volumes = INTERVALS[interval]
+    start = start or datetime.datetime.fromtimestamp(0, tz=datetime.timezone.utc)
+    end = end or datetime.datetime.now(tz=datetime.timezone.utc)
+
+    async with request.app.state.db_pool.connection() as conn:
+        cursor = await conn.execute(
+            f"""
+            WITH token AS (SELECT id FROM TokenIds WHERE mint = %(token)s)
+            SELECT coalesce(p.bucket, v.bucket) AS bucket, p.open, p.high, p.low, p.close,
+                   coalesce(v.volume, 0) / %(lamports)s, v.buy_volume / %(lamports)s, v.sell_volume / %(lamports)s
+            FROM (SELECT * FROM {candles} WHERE tokenID = (SELECT id FROM token) AND bucket >= %(start)s AND bucket < %(end)s) p
+            FULL JOIN (SELECT * FROM {volumes} WHERE tokenID = (SELECT id FROM token) AND bucket >= %(start)s AND bucket < %(end)s) v
+                ON v.bucket = p.bucket
+            ORDER BY 1
+            LIMIT %(limit)s
+            """,
+            {"token": token, "start": start, "end": end, "limit": limit, "lamports": LAMPORTS_PER_SOL},
+        )
+        rows = await cursor.fetchall()
+
+    return [
+        # buyVolume/sellVolume are None for buckets whose volume messages only carried the total
+        {"time": bucket, "open": open, "high": high, "low": low, "close": close, "volume": volume, "buyVolume": buy, "sellVolume": sell}
+        for bucket, open, high, low, close, volume, buy, sell in rows
+    ]
@@ -0,0 +1,8 @@
+"""
+conftest.py
+Puts the events-api modules on the import path
+"""
+
+import os, sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,131 @@
+"""
+test_database.py
+The TimescaleDB version check in front of the continuous aggregates and the compact layout migration
+"""
+
+import database, os, pytest, re
+
+EVENTS_API = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+        self.fetched = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, params=None):
+        if self.conn.fail_on and self.conn.fail_on in sql:
+            raise RuntimeError("statement failed")
+        self.conn.statements.append(sql.strip())
+        self.fetched = (self.conn.extversion,) if "pg_extension" in sql and self.conn.extversion else None
+
+    def fetchone(self):
+        return self.fetched
+
+
+class FakeConnection:
+    def __init__(self, extversion, autocommit=False, fail_on=None):
+        self.extversion = extversion
+        self.autocommit = autocommit
+        self.fail_on = fail_on
+        self.statements = []
+        self.committed = []
+
+    def commit(self):
+        self.committed.append(len(self.statements))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def cursor(self):
+        return FakeCursor(self)
+
+
+@pytest.fixture
+def connect(monkeypatch):
+    """psycopg.connect handing out connections to a database with the given timescaledb version, returns them all."""
+    def make(extversion, fail_on=None):
+        connections = []
+
+        def connect(conn_string, autocommit=False):
+            connections.append(FakeConnection(extversion, autocommit, fail_on))
+            return connections[-1]
+
+        monkeypatch.setattr(database.psycopg, "connect", connect)
+        monkeypatch.chdir(EVENTS_API) # the SQL files are opened relative to the app
+        return connections
+    return make
+
+
+def without_comments(statements):
+    return [re.sub(r"/\*.*?\*/", "", statement, flags=re.S) for statement in statements]
+
+
+@pytest.mark.parametrize("extversion, version", [("2.9.0", (2, 9)), ("2.14.2", (2, 14)), ("2.15.0-dev", (2, 15)), (None, None)])
+def test_timescaledb_version(extversion, version):
+    assert database.timescaledb_version(FakeCursor(FakeConnection(extversion))) == version
+
+
+@pytest.mark.parametrize("extversion", ["2.8.1", None])
+def test_aggregates_are_not_created_without_a_recent_timescaledb(connect, extversion):
+    connections = connect(extversion)
+    with pytest.raises(RuntimeError):
+        database.create_aggregates()
+    conn, = connections
+    assert not any("MATERIALIZED VIEW" in statement for statement in conn.statements)
+
+
+def test_aggregates_are_created_one_statement_at_a_time(connect):
+    connections = connect("2.14.2")
+    database.create_aggregates()
+    conn, = connections
+    assert conn.autocommit
+    statements = without_comments(conn.statements)
+    created = [statement for statement in statements if "CREATE MATERIALIZED VIEW" in statement]
+    assert len(created) == 8 and all(statement.count("CREATE MATERIALIZED VIEW") == 1 for statement in created)
+    assert sum("add_continuous_aggregate_policy" in statement for statement in statements) == 8
+
+
+def test_the_migration_is_one_transaction_followed_by_the_aggregates(connect):
+    connections = connect("2.14.2")
+    database.migrate_compact()
+    migration, aggregates = connections
+
+    assert not migration.autocommit
+    assert len(migration.statements) == 2 and "ALTER TABLE Price RENAME TO Price_text" in migration.statements[1]
+    assert migration.committed == [2]
+    assert aggregates.autocommit and any("CREATE MATERIALIZED VIEW" in statement for statement in aggregates.statements)
+
+
+def test_a_failed_migration_is_not_committed_and_leaves_the_aggregates_alone(connect):
+    connections = connect("2.14.2", fail_on="INSERT INTO TokenIds") # the copy fails half way through
+    with pytest.raises(RuntimeError):
+        database.migrate_compact()
+    migration, = connections
+    assert migration.committed == []
+
+
+def test_an_old_timescaledb_is_refused_before_anything_is_migrated(connect):
+    connections = connect("2.8.1")
+    with pytest.raises(RuntimeError):
+        database.migrate_compact()
+    migration, = connections
+    assert migration.statements == ["SELECT extversion FROM pg_extension WHERE extname = 'timescaledb';"]
+
+
+def test_the_migration_drops_the_aggregates_before_renaming_their_tables():
+    with open(os.path.join(EVENTS_API, "sql", "MIGRATE_COMPACT.SQL")) as file:
+        sql = without_comments([file.read()])[0]
+    drops = [sql.index(f"DROP MATERIALIZED VIEW IF EXISTS price_ohlc_{level}, volume_{level}") for level in ("1h", "5m", "1m", "1s")]
+    assert drops == sorted(drops) and drops[-1] < sql.index("ALTER TABLE Price RENAME")
+    # creating or refreshing a continuous aggregate can't run in the migration's transaction
+    assert "CREATE MATERIALIZED VIEW" not in sql and "refresh_continuous_aggregate" not in sql
@@ -0,0 +1,312 @@
+"""
+test_ingest.py
+Message parsing and the batched TimescaleDB writer: token ids, COPY with redelivery fallback, upserts and retries
+"""
+
+from ingest import TimescaleWriter, TABLES, KEYS, parse_volume, parse_burn, parse_token, to_datetime
+from psycopg import errors
+from contextlib import asynccontextmanager
+import asyncio, copy, datetime, json, os, pytest, re
+
+SQL_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "sql")
+
+
+class FakeMessage:
+    def __init__(self, topic, value):
+        self._topic, self._value = topic, json.dumps(value)
+
+    def topic(self):
+        return self._topic
+
+    def value(self):
+        return self._value
+
+
+class FakeCopy:
+    def __init__(self, db, table):
+        self.db, self.table, self.rows = db, table, []
+
+    async def write_row(self, row):
+        if any(isinstance(value, int) and value >= 10**39 for value in row):
+            raise errors.NumericValueOutOfRange("numeric field overflow") # NUMERIC(39,0)
+        self.rows.append(tuple(row))
+
+
+class FakeCursor:
+    """Understands the handful of statements the writer sends, tables are dicts keyed by primary key."""
+
+    def __init__(self, db):
+        self.db = db
+        self.result = []
+
+    async def execute(self, sql, params=None):
+        self.db.statements.append(sql)
+        if sql.startswith("SELECT mint, id FROM TokenIds"):
+            self.result = [(mint, self.db.token_ids[mint]) for mint in params[0] if mint in self.db.token_ids]
+        elif sql.startswith("INSERT INTO TokenIds"):
+            for mint in params[0]:
+                self.db.token_ids.setdefault(mint, len(self.db.token_ids) + 1)
+        elif sql.startswith("CREATE TEMP TABLE"):
+            pass
+        elif match := re.match(r"INSERT INTO (\w+) \(.*\) SELECT .* FROM (\w+) ON CONFLICT \((.*)\) (DO \w+)", sql):
+            table, staging, conflict, action = match.groups()
+            assert conflict == ", ".join(KEYS[table]), f"conflict target {conflict} is not the primary key of {table}"
+            for row in self.db.staging.pop(staging):
+                key = self.db.key(table, row)
+                if key not in self.db.tables[table] or action == "DO UPDATE":
+                    self.db.tables[table][key] = row
+        else:
+            raise AssertionError(f"unexpected statement {sql}")
+
+    async def fetchall(self):
+        return self.result
+
+    @asynccontextmanager
+    async def copy(self, sql):
+        table = re.match(r"COPY (\w+) \((.*)\) FROM STDIN", sql).group(1)
+        writer = FakeCopy(self.db, table)
+        yield writer
+        if table.endswith("_staging"):
+            self.db.staging[table] = writer.rows
+            return
+        for row in writer.rows:
+            if self.db.key(table, row) in self.db.tables[table]:
+                raise errors.UniqueViolation("duplicate key")
+            self.db.tables[table][self.db.key(table, row)] = row
+
+
+class FakeDatabase:
+    """Pool, connection and transactions in one: a transaction snapshots the tables and restores them on error."""
+
+    def __init__(self):
+        self.token_ids = {}
+        self.tables = {table: {} for table in TABLES}
+        self.staging = {}
+        self.statements = []
+        self.fail = None
+
+    def key(self, table, row):
+        return tuple(row[TABLES[table].index(column)] for column in KEYS[table])
+
+    def rows(self, table):
+        return sorted(self.tables[table].values())
+
+    @asynccontextmanager
+    async def connection(self):
+        if self.fail is not None:
+            raise self.fail
+        yield self
+
+    @asynccontextmanager
+    async def transaction(self):
+        snapshot = copy.deepcopy((self.token_ids, self.tables))
+        try:
+            yield
+        except BaseException:
+            self.token_ids, self.tables = snapshot
+            raise
+
+    @asynccontextmanager
+    async def cursor(self):
+        yield FakeCursor(self)
+
+
+TOPICS = {"volumes": ("VolumePeriods", parse_volume), "burns": ("BurnPeriods", parse_burn), "tokens": ("Token", parse_token)}
+T0 = 1_700_000_000
+
+
+def volume(mint, time, total, **split):
+    return FakeMessage("volumes", {"tokenAddress": mint, "time": time, "volume": total, **split})
+
+
+def make_writer(db, **kwargs):
+    durable = []
+    writer = TimescaleWriter(db, TOPICS, durable.append, batch_rows=1000, **kwargs)
+    return writer, durable
+
+
+def test_timestamps_in_seconds_and_milliseconds():
+    assert to_datetime(T0) == to_datetime(T0 * 1000) == datetime.datetime.fromtimestamp(T0, tz=datetime.timezone.utc)
+
+
+def test_volume_messages_with_only_the_total_leave_the_split_unknown():
+    assert parse_volume({"tokenAddress": "mint", "time": T0, "volume": "1.5"})[2:] == (1_500_000_000, None, None)
+    assert parse_volume({"tokenAddress": "mint", "time": T0, "volume": 3, "buyVolume": 1, "sellVolume": 2})[2:] == (3 * 10**9, 10**9, 2 * 10**9)
+    assert parse_volume({"tokenAddress": "mint", "time": T0, "buyVolume": "0.1", "sellVolume": "0.2"})[2] == 300_000_000
+
+
+def test_token_amounts_stay_in_base_units_and_sol_totals_become_lamports():
+    row = parse_token({"PublicKeyString": "mint", "Supply": "1000000000000000", "Decimals": 6,
+                       "TotalVolume": {"TotalBuyVolume": "12.000000001", "TotalSellVolume": 0},
+                       "FreezeAuthority": "11111111111111111111111111111111", "IPO": T0})
+    columns = dict(zip(TABLES["Token"], row))
+    assert columns["supply"] == 10**15 and columns["totalBuyVolume"] == 12_000_000_001
+    assert columns["freezeAuthority"] is None
+
+
+def test_a_flush_maps_mints_to_ids_and_reports_the_batches_durable():
+    db = FakeDatabase()
+    writer, durable = make_writer(db)
+    first = [volume("mint-a", T0, 1), volume("mint-b", T0, 2)]
+    second = [FakeMessage("burns", {"tokenAddress": "mint-a", "startTime": T0, "amountBurned": "5"}), FakeMessage("unrelated", {})]
+
+    async def scenario():
+        await writer.add(first)
+        await writer.add(second)
+        assert durable == [] # nothing is durable before the flush
+        await writer.flush()
+
+    asyncio.run(scenario())
+    assert db.token_ids == {"mint-a": 1, "mint-b": 2}
+    assert db.rows("VolumePeriods") == [(1, to_datetime(T0), 10**9, None, None), (2, to_datetime(T0), 2 * 10**9, None, None)]
+    assert db.rows("BurnPeriods") == [(1, to_datetime(T0), 5)]
+    assert durable == [first, second]
+    assert writer.stats()["written"] == 3 and writer.stats()["new_tokens"] == 2
+
+    # known mints come from the cache on the next flush
+    asyncio.run(writer.add([volume("mint-a", T0 + 1, 1)]))
+    db.statements.clear()
+    asyncio.run(writer.flush())
+    assert not any("TokenIds" in statement for statement in db.statements)
+
+
+def test_invalid_messages_are_skipped_not_retried():
+    db = FakeDatabase()
+    writer, durable = make_writer(db)
+    batch = [FakeMessage("volumes", {"time": T0}), volume("mint", T0, 1)]
+    asyncio.run(writer.add(batch))
+    asyncio.run(writer.flush())
+    assert writer.stats()["invalid"] == 1 and len(db.rows("VolumePeriods")) == 1
+    assert durable == [batch]
+
+
+def test_duplicates_within_a_flush_keep_the_last_copy():
+    db = FakeDatabase()
+    writer, _ = make_writer(db)
+    asyncio.run(writer.add([volume("mint", T0, 1), volume("mint", T0, 2)]))
+    asyncio.run(writer.flush())
+    assert [row[2] for row in db.rows("VolumePeriods")] == [2 * 10**9]
+    assert writer.stats()["duplicates"] == 1
+
+
+def test_copy_mode_skips_rows_already_stored():
+    db = FakeDatabase()
+    writer, _ = make_writer(db)
+    asyncio.run(writer.add([volume("mint", T0, 1)]))
+    asyncio.run(writer.flush())
+    # a redelivery of the first row together with a new one, COPY fails and only the new row is inserted
+    asyncio.run(writer.add([volume("mint", T0, 9), volume("mint", T0 + 1, 2)]))
+    asyncio.run(writer.flush())
+    assert [row[2] for row in db.rows("VolumePeriods")] == [10**9, 2 * 10**9]
+
+
+def test_upsert_mode_replays_idempotently_and_takes_changed_rows():
+    db = FakeDatabase()
+    writer, _ = make_writer(db, mode="upsert")
+    replay = [volume("mint", T0 + i, i) for i in range(5)]
+    for _ in range(2):
+        asyncio.run(writer.add(replay))
+        asyncio.run(writer.flush())
+    assert len(db.rows("VolumePeriods")) == 5
+    assert not any(statement.startswith("COPY VolumePeriods ") for statement in db.statements)
+
+    asyncio.run(writer.add([volume("mint", T0, 7, buyVolume=3, sellVolume=4)]))
+    asyncio.run(writer.flush())
+    assert db.rows("VolumePeriods")[0][2:] == (7 * 10**9, 3 * 10**9, 4 * 10**9)
+
+    with pytest.raises(ValueError):
+        TimescaleWriter(db, TOPICS, print, mode="merge")
+
+
+def test_a_failed_flush_keeps_its_rows_and_commits_nothing():
+    db = FakeDatabase()
+    writer, durable = make_writer(db)
+    batch = [volume("mint", T0, 1)]
+
+    async def scenario():
+        await writer.add(batch)
+        db.fail = ConnectionError("database unavailable")
+        with pytest.raises(ConnectionError):
+            await writer.flush()
+        assert durable == [] and writer.stats()["buffered"] == 1 and writer.stats()["errors"] == 1
+
+        db.fail = None
+        await writer.flush()
+
+    asyncio.run(scenario())
+    assert durable == [batch] and len(db.rows("VolumePeriods")) == 1
+    assert writer.stats()["buffered"] == 0
+
+
+def test_rows_the_database_rejects_are_skipped_after_the_retries():
+    db = FakeDatabase()
+    writer, durable = make_writer(db, max_retries=2)
+    batch = [volume("mint-a", T0, 1), volume("mint-b", T0, 10**31), volume("mint-c", T0, 3), volume("mint-a", T0 + 1, 4)]
+
+    async def scenario():
+        await writer.add(batch)
+        with pytest.raises(errors.NumericValueOutOfRange):
+            await writer.flush()
+        assert durable == [] and writer.stats()["buffered"] == 4
+        await writer.flush() # second failure in a row, the overflowing row is isolated and skipped
+
+    asyncio.run(scenario())
+    assert [row[2] for row in db.rows("VolumePeriods")] == [10**9, 4 * 10**9, 3 * 10**9]
+    assert durable == [batch]
+    stats = writer.stats()
+    assert stats["invalid"] == 1 and stats["written"] == 3 and stats["buffered"] == 0 and stats["errors"] == 1
+    assert writer.failures == 0
+
+
+def test_ids_of_a_rolled_back_flush_are_not_cached(monkeypatch):
+    db = FakeDatabase()
+    writer, _ = make_writer(db)
+
+    @asynccontextmanager
+    async def failing_copy(cursor, sql):
+        raise errors.DiskFull("no space left")
+        yield
+
+    monkeypatch.setattr(FakeCursor, "copy", failing_copy)
+
+    async def scenario():
+        await writer.add([volume("mint", T0, 1)])
+        with pytest.raises(errors.DiskFull):
+            await writer.flush()
+        assert writer.token_ids == {} and db.token_ids == {}
+
+    asyncio.run(scenario())
+
+
+def test_a_full_buffer_holds_the_consumer_until_it_was_written():
+    db = FakeDatabase()
+    durable = []
+    writer = TimescaleWriter(db, TOPICS, durable.append, batch_rows=2, flush_interval=0.01)
+
+    async def scenario():
+        db.fail = ConnectionError("database unavailable")
+        add = asyncio.create_task(writer.add([volume("mint", T0, 1), volume("mint", T0 + 1, 1)]))
+        await asyncio.sleep(0.05)
+        assert not add.done() # the Kafka handler is held back while the flush keeps failing
+        db.fail = None
+        await asyncio.wait_for(add, 1)
+
+    asyncio.run(scenario())
+    assert len(durable) == 1 and len(db.rows("VolumePeriods")) == 2
+
+
+def compact_ddl():
+    with open(os.path.join(SQL_DIR, "MIGRATE_COMPACT.SQL")) as file:
+        sql = file.read()
+    return {name: body for name, body in re.findall(r"CREATE TABLE (\w+) \((.*?)\n\);", sql, re.S)}
+
+
+def test_conflict_targets_and_columns_match_the_schema():
+    ddl = compact_ddl()
+    for table, columns in TABLES.items():
+        body = re.sub(r"--[^\n]*", "", ddl[table])
+        declared = [line.split()[0] for line in body.splitlines() if line.split() and line.split()[0] not in ("PRIMARY", "CONSTRAINT")]
+        assert set(columns) <= set(declared), f"{table} has no column {set(columns) - set(declared)}"
+        primary_key = re.search(r"(\w+) \w+[^,\n]* PRIMARY KEY|PRIMARY KEY \(([^)]*)\)", body)
+        key = primary_key.group(1) or primary_key.group(2)
+        assert tuple(column.strip() for column in key.split(",")) == KEYS[table]
@@ -0,0 +1,226 @@
+"""
+test_kafka_consumer.py
+Batch hand over from the poll thread, commits after processing, retries, and stopping on missing topics or poll failures
+"""
+
+from confluent_kafka import KafkaError
+from kafka_consumer import KafkaBatchConsumer
+import asyncio, threading, time
+
+
+class FakeMessage:
+    def __init__(self, topic, partition, offset, error=None):
+        self._topic, self._partition, self._offset, self._error = topic, partition, offset, error
+
+    def topic(self):
+        return self._topic
+
+    def partition(self):
+        return self._partition
+
+    def offset(self):
+        return self._offset
+
+    def error(self):
+        return self._error
+
+
+class FakeError:
+    def __init__(self, code):
+        self._code = code
+
+    def code(self):
+        return self._code
+
+
+class FakeConsumer:
+    """Hands out the scripted `batches` one per consume(), then nothing. Records commits and on which thread calls happen."""
+
+    instances = []
+
+    def __init__(self, config, batches=()):
+        self.config = config
+        self.batches = list(batches)
+        self.committed = []
+        self.threads = set()
+        self.closed = False
+        FakeConsumer.instances.append(self)
+
+    def subscribe(self, topics):
+        self.threads.add(threading.get_ident())
+        self.topics = topics
+
+    def consume(self, num_messages, timeout):
+        self.threads.add(threading.get_ident())
+        if self.batches:
+            return self.batches.pop(0)[:num_messages]
+        time.sleep(min(timeout, 0.01))
+        return []
+
+    def commit(self, offsets, asynchronous=True):
+        self.threads.add(threading.get_ident())
+        self.committed.extend((partition.topic, partition.partition, partition.offset) for partition in offsets)
+
+    def assignment(self):
+        return []
+
+    def close(self):
+        self.threads.add(threading.get_ident())
+        self.closed = True
+
+
+def patch_consumer(monkeypatch, batches):
+    FakeConsumer.instances = []
+    monkeypatch.setattr("kafka_consumer.Consumer", lambda config: FakeConsumer(config, batches))
+
+
+async def consume(consumer, handler, until, **run_kwargs):
+    consumer.start()
+    task = asyncio.create_task(consumer.run(handler, **run_kwargs))
+    deadline = time.monotonic() + 2
+    while not until() and time.monotonic() < deadline:
+        await asyncio.sleep(0.005)
+    await consumer.stop()
+    await asyncio.wait_for(task, 2)
+
+
+def test_batches_are_handled_in_order_and_committed_after(monkeypatch):
+    patch_consumer(monkeypatch, [
+        [FakeMessage("swaps", 0, 10), FakeMessage("swaps", 1, 3), FakeMessage("swaps", 0, 11)],
+        [FakeMessage("burns", 0, 0), FakeMessage("swaps", 0, None, FakeError(KafkaError._PARTITION_EOF))],
+    ])
+    handled = []
+
+    async def handler(batch):
+        handled.append([(message.topic(), message.offset()) for message in batch])
+
+    async def scenario():
+        consumer = KafkaBatchConsumer({"group.id": "test"}, ["swaps", "burns", None], poll_timeout=0.01)
+        await consume(consumer, handler, lambda: len(handled) == 2)
+        return consumer
+
+    consumer = asyncio.run(scenario())
+    fake = FakeConsumer.instances[0]
+    assert fake.config["enable.auto.commit"] is False and fake.topics == ["swaps", "burns"]
+    assert handled == [[("swaps", 10), ("swaps", 3), ("swaps", 11)], [("burns", 0)]]
+    assert sorted(fake.committed) == [("burns", 0, 1), ("swaps", 0, 12), ("swaps", 1, 4)]
+    assert len(fake.threads) == 1 and threading.get_ident() not in fake.threads
+    assert fake.closed
+    assert consumer.stats()["consumed"] == 4 and consumer.stats()["batches"] == 2
+
+
+def test_a_failing_batch_is_retried_not_skipped(monkeypatch):
+    patch_consumer(monkeypatch, [[FakeMessage("swaps", 0, 0)], [FakeMessage("swaps", 0, 1)]])
+    attempts = []
+
+    async def handler(batch):
+        attempts.append(batch[0].offset())
+        if len(attempts) == 1:
+            raise ConnectionError("database unavailable")
+
+    async def scenario():
+        consumer = KafkaBatchConsumer({}, ["swaps"], poll_timeout=0.01)
+        await consume(consumer, handler, lambda: len(attempts) == 3)
+        return consumer
+
+    consumer = asyncio.run(scenario())
+    assert attempts == [0, 0, 1]
+    assert consumer.stats()["failed"] == 1
+    assert FakeConsumer.instances[0].committed[-1] == ("swaps", 0, 2)
+
+
+def test_without_auto_commit_only_committed_batches_are_committed(monkeypatch):
+    patch_consumer(monkeypatch, [[FakeMessage("swaps", 0, 0)], [FakeMessage("swaps", 0, 1)]])
+    handled = []
+    drained = []
+
+    async def scenario():
+        consumer = KafkaBatchConsumer({}, ["swaps"], poll_timeout=0.01)
+
+        async def handler(batch):
+            handled.append(batch)
+            if len(handled) == 1:
+                consumer.commit(batch) # only the first one was made durable
+
+        async def on_drained():
+            drained.append(len(handled))
+
+        await consume(consumer, handler, lambda: len(handled) == 2, commit=False, on_drained=on_drained)
+
+    asyncio.run(scenario())
+    assert FakeConsumer.instances[0].committed == [("swaps", 0, 1)]
+    assert drained == [2]
+
+
+def test_a_missing_topic_stops_the_consumer(monkeypatch):
+    patch_consumer(monkeypatch, [[FakeMessage("swaps", 0, None, FakeError(KafkaError.UNKNOWN_TOPIC_OR_PART))]])
+
+    async def handler(batch):
+        raise AssertionError("nothing should be handled")
+
+    async def scenario():
+        consumer = KafkaBatchConsumer({}, ["swaps"], poll_timeout=0.01)
+        consumer.start()
+        try:
+            await asyncio.wait_for(consumer.run(handler), 2)
+        except RuntimeError as e:
+            return str(e)
+        finally:
+            await consumer.stop() # joins the poll thread, which closes the consumer
+
+    assert "Kafka consumer stopped" in asyncio.run(scenario())
+    assert FakeConsumer.instances[0].closed
+
+
+def test_a_full_queue_holds_the_poll_thread_back(monkeypatch):
+    patch_consumer(monkeypatch, [[FakeMessage("swaps", 0, offset)] for offset in range(10)])
+    release = asyncio.Event()
+    handled = []
+
+    async def handler(batch):
+        await release.wait()
+        handled.append(batch[0].offset())
+
+    async def scenario():
+        consumer = KafkaBatchConsumer({}, ["swaps"], poll_timeout=0.01, max_batches=2)
+        consumer.start()
+        task = asyncio.create_task(consumer.run(handler))
+        await asyncio.sleep(0.2)
+        # one batch in the handler, two queued, one held by the poll thread
+        assert consumer.queue.qsize() == 2 and len(FakeConsumer.instances[0].batches) == 6
+        release.set()
+        while len(handled) < 10:
+            await asyncio.sleep(0.005)
+        await consumer.stop()
+        await asyncio.wait_for(task, 2)
+
+    asyncio.run(scenario())
+    assert handled == list(range(10))
+
+
+def test_a_failing_poll_thread_is_reported(monkeypatch):
+    patch_consumer(monkeypatch, [])
+
+    def broken_consume(self, num_messages, timeout):
+        raise RuntimeError("broker connection lost")
+
+    monkeypatch.setattr(FakeConsumer, "consume", broken_consume)
+
+    async def handler(batch):
+        raise AssertionError("nothing should be handled")
+
+    async def scenario():
+        consumer = KafkaBatchConsumer({}, ["swaps"], poll_timeout=0.01)
+        consumer.start()
+        try:
+            await asyncio.wait_for(consumer.run(handler), 2)
+        except RuntimeError as e:
+            assert "broker connection lost" in str(e)
+        else:
+            raise AssertionError("run() should raise once the poll thread died")
+        finally:
+            await consumer.stop()
+        return consumer.stats()
+
+    stats = asyncio.run(scenario())
+    assert not stats["thread_alive"] and stats["error"] == "broker connection lost"
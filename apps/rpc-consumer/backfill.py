@@ -0,0 +1,66 @@
+"""
+backfill.py
+Recovers notifications missed while a subscription was down, using getSignaturesForAddress
+"""
+
+from solders.rpc.responses import LogsNotification, LogsNotificationResult, RpcLogsResponse, RpcResponseContext
+from solana.rpc.commitment import Confirmed
+import asyncio, logging
+
+PAGE_SIZE = 1000 # getSignaturesForAddress maximum
+REPLAY_CONCURRENCY = 4 # getTransaction calls in flight per replayed gap
+
+
+async def signatures_between(client, account, until=None, before=None, limit=PAGE_SIZE, min_slot=None):
+    """
+    Signatures mentioning `account` newer than `until` (exclusive) and older than `before` (exclusive),
+    newest first, paged until `until` or `min_slot` is reached or `limit` signatures were collected.
+    """
+    statuses = []
+    while len(statuses) < limit:
+        page_size = min(PAGE_SIZE, limit - len(statuses))
+        response = await client.get_signatures_for_address(account, before=before, until=until, limit=page_size, commitment=Confirmed)
+        page = response.value
+        if min_slot is not None and page and page[-1].slot < min_slot:
+            statuses.extend(status for status in page if status.slot >= min_slot)
+            return statuses
+        statuses.extend(page)
+        if len(page) < page_size:
+            return statuses
+        before = page[-1].signature
+    logging.warning(f"Stopped collecting signatures for {account} after {limit}, older ones are skipped")
+    return statuses
+
+
+async def replay_gap(client, account, until, dispatch, fetch, subscription_id=0, limit=PAGE_SIZE, concurrency=REPLAY_CONCURRENCY, limiter=None):
+    """
+    Rebuild the LogsNotifications `account` would have produced since `until` and hand them to
+    `dispatch(notification)` oldest first; dispatch returns False for ones it skipped.
+    `fetch(client, signature)` returns the getTransaction response (the transaction cache), its log
+    messages become the notification's logs. At most `concurrency` fetches run at once and, with a
+    `limiter` (helpers.RateLimiter, shared by every subscription), each waits for a token first.
+    Returns how many notifications were replayed.
+    """
+    statuses = [status for status in await signatures_between(client, account, until=until, limit=limit) if status.err is None]
+    if not statuses:
+        return 0
+
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def bounded_fetch(signature):
+        async with semaphore:
+            if limiter is not None:
+                await limiter.acquire()
+            return await fetch(client, signature)
+
+    responses = await asyncio.gather(*(bounded_fetch(status.signature) for status in statuses), return_exceptions=True)
+    replayed = 0
+    for status, response in zip(reversed(statuses), reversed(responses)):
+        if isinstance(response, Exception) or getattr(response, "value", None) is None:
+            logging.error(f"Could not fetch {status.signature} while backfilling {account}: {response}")
+            continue
+        logs = response.value.transaction.meta.log_messages or []
+        value = RpcLogsResponse(status.signature, None, logs)
+        if await dispatch(LogsNotification(LogsNotificationResult(value, RpcResponseContext(status.slot)), subscription_id)):
+            replayed += 1
+    return replayed
@@ -0,0 +1,68 @@
+"""
+balance_delta.py
+Single pass token balance delta engine used by Transaction.get_swap
+"""
+
+from solders.pubkey import Pubkey
+from decimal import Decimal
+
+SOLANA_PUB_ADDRESS = "So11111111111111111111111111111111111111112"
+WRAPPED_SOL_PUBKEY = Pubkey.from_string(SOLANA_PUB_ADDRESS)
+
+
+class SwapDelta:
+    """
+    Result of diffing one transaction's token balances for a single target mint.
+    Amounts are integers in base units (lamports for SOL).
+    """
+
+    __slots__ = ("has_tokens", "has_target", "sol_delta", "sol_decimals")
+
+    def __init__(self):
+        self.has_tokens = False # any non-WSOL mint in the post balances
+        self.has_target = False # the target mint is in the post balances
+        self.sol_delta = 0 # change of the AMM's WSOL balance, negative when SOL left the pool (a sell)
+        self.sol_decimals = 9
+
+    @property
+    def transaction_type(self):
+        return "Sell" if self.sol_delta < 0 else "Buy"
+
+    @property
+    def amount_sol(self) -> str:
+        return format((Decimal(abs(self.sol_delta)).scaleb(-self.sol_decimals)).normalize(), "f")
+
+
+def swap_delta(pre_balances, post_balances, target_mint: Pubkey, amm_authority: Pubkey) -> SwapDelta:
+    """
+    Walk pre and post token balances once, keyed by account index, and only keep the accounts
+    holding WSOL or the target mint; every other mint is skipped without building anything.
+    """
+    result = SwapDelta()
+    accounts = {} # account index -> [mint, owner, pre amount, post amount]
+
+    for balance in pre_balances:
+        mint = balance.mint
+        if mint == target_mint or mint == WRAPPED_SOL_PUBKEY:
+            accounts[balance.account_index] = [mint, balance.owner, int(balance.ui_token_amount.amount), 0]
+
+    for balance in post_balances:
+        mint = balance.mint
+        if mint == WRAPPED_SOL_PUBKEY:
+            result.sol_decimals = balance.ui_token_amount.decimals
+        else:
+            result.has_tokens = True
+            if mint != target_mint:
+                continue
+            result.has_target = True
+        entry = accounts.get(balance.account_index)
+        if entry is None:
+            accounts[balance.account_index] = [mint, balance.owner, 0, int(balance.ui_token_amount.amount)]
+        else:
+            entry[3] = int(balance.ui_token_amount.amount)
+
+    for mint, owner, pre_amount, post_amount in accounts.values():
+        if owner == amm_authority and mint == WRAPPED_SOL_PUBKEY:
+            result.sol_delta += post_amount - pre_amount
+
+    return result
@@ -0,0 +1,129 @@
+"""
+batch_fetch.py
+Micro-batching getTransaction fetcher, sends signatures requested within a few ms as one JSON-RPC batch
+"""
+
+from solana.rpc.async_api import AsyncClient
+from solana.rpc.core import RPCException, RPCNoResultException
+from solders.rpc.requests import GetTransaction
+from solders.rpc.responses import GetTransactionResp, RPCError
+from metrics import Counters, Histogram
+import asyncio, json, time
+
+RPC_ERRORS = RPCError.__args__
+
+
+class BatchingFetcher:
+    """
+    Drop-in for `AsyncClient.get_transaction`. Calls are queued per request config (encoding,
+    commitment, version) and sent as one JSON-RPC batch array once `max_batch` signatures are
+    waiting or the first one has waited `max_wait` seconds; each caller gets its own response back,
+    matched by JSON-RPC id, and a call the node sent no response for fails. A batch of one goes out
+    as a plain request.
+    """
+
+    def __init__(self, client: AsyncClient, max_batch=16, max_wait=0.003):
+        self.client = client
+        self.name = str(client._provider.endpoint_uri)
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max_wait
+        self.pending = {} # config -> [(signature, future, started_at)]
+        self.timers = {} # config -> asyncio.TimerHandle
+        self.tasks = set()
+
+        self.counters = Counters("batches", "calls", "errors")
+        self.latency_ms = Histogram((5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000))
+
+    async def get_transaction(self, tx_sig, encoding="json", commitment=None, max_supported_transaction_version=None):
+        config = (encoding, commitment, max_supported_transaction_version)
+        future = asyncio.get_running_loop().create_future()
+        batch = self.pending.setdefault(config, [])
+        batch.append((tx_sig, future, time.monotonic()))
+
+        if len(batch) >= self.max_batch:
+            self._send(config)
+        elif len(batch) == 1:
+            self.timers[config] = asyncio.get_running_loop().call_later(self.max_wait, self._send, config)
+        return await future
+
+    def _send(self, config):
+        timer = self.timers.pop(config, None)
+        if timer is not None:
+            timer.cancel()
+        batch = self.pending.pop(config, None)
+        if not batch:
+            return
+        task = asyncio.create_task(self._request(config, batch))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def _request(self, config, batch):
+        self.counters.batches += 1
+        self.counters.calls += len(batch)
+        try:
+            if len(batch) == 1:
+                responses = [await self.client.get_transaction(batch[0][0], *config)]
+            else:
+                responses = await self._request_batch(config, batch)
+        except Exception as e:
+            self.counters.errors += 1
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+                    future.exception() # callers that went away shouldn't log "never retrieved"
+            return
+
+        now = time.monotonic()
+        for (_, future, started_at), response in zip(batch, responses):
+            self.latency_ms.observe((now - started_at) * 1000)
+            if future.done():
+                continue
+            if isinstance(response, RPC_ERRORS):
+                response = RPCException(response)
+            if isinstance(response, Exception):
+                future.set_exception(response)
+                future.exception()
+            else:
+                future.set_result(response)
+
+    async def _request_batch(self, config, batch):
+        """Responses in `batch` order, an exception in place of a call that failed or got no response."""
+        bodies = []
+        for request_id, (signature, _, _) in enumerate(batch):
+            body = self.client._get_transaction_body(signature, *config)
+            bodies.append(GetTransaction(body.signature, body.config, request_id))
+
+        raw = await self.client._provider.make_batch_request_unparsed(tuple(bodies))
+        replies = json.loads(raw)
+        if not isinstance(replies, list):
+            # the node rejected the whole batch (e.g. rate limited), every call gets its error
+            raise RPCException(replies.get("error", replies) if isinstance(replies, dict) else replies)
+
+        # JSON-RPC doesn't promise the array comes back in request order, or complete. Replies are
+        # parsed one by one: solders' batch parser panics on error objects without a "data" field
+        by_id = {reply.get("id"): reply for reply in replies if isinstance(reply, dict)}
+        ordered = []
+        for request_id, (signature, _, _) in enumerate(batch):
+            reply = by_id.get(request_id)
+            if reply is None:
+                ordered.append(RPCNoResultException(f"No response for {signature} in a batch of {len(batch)}"))
+            elif reply.get("error") is not None:
+                ordered.append(RPCException(reply["error"]))
+            else:
+                ordered.append(GetTransactionResp.from_json(json.dumps(reply)))
+        return ordered
+
+    def stats(self):
+        """Batch fill ratio and per call latency since the last reset_stats()."""
+        counters = self.counters
+        return {
+            "batches": counters.batches,
+            "calls": counters.calls,
+            "fill_ratio": round(counters.calls / (counters.batches * self.max_batch), 3) if counters.batches else 0.0,
+            "errors": counters.errors,
+            "latency_ms": self.latency_ms.snapshot(),
+        }
+
+    def reset_stats(self):
+        self.counters.reset()
+        self.latency_ms.reset()
@@ -0,0 +1,87 @@
+"""
+bench_balance_delta.py
+Per-transaction cost of extracting the target token swap from multi-hop transactions:
+the previous four-dict get_swap body vs. the single pass balance delta engine
+
+The transactions in fixtures/ are synthetic (see fixtures/README.md), so the numbers compare the two
+code paths on generated multi-hop balances, not on mainnet traffic
+
+usage: python benchmarks/bench_balance_delta.py [iterations]
+"""
+
+from solders.rpc.responses import GetTransactionResp
+from solders.pubkey import Pubkey
+from decimal import Decimal
+import json, os, sys, time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from classes import Transaction, WRAPPED_SOL_PUBKEY, LAMPORTS_PER_SOL
+
+FIXTURE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "multihop_transactions.jsonl")
+AMM_AUTHORITY = "5Q544fKrFoe6tsEbD7S8EmxGTJYAKtTVhAW5Q5pge4j1"
+
+
+def load_transactions():
+    with open(FIXTURE, "r") as file:
+        records = [json.loads(line) for line in file if line.strip()]
+    return [(GetTransactionResp.from_json(json.dumps(record["response"])), record["target"]) for record in records]
+
+
+def legacy_get_swap(trans_data, signature, target_token, authority_address=AMM_AUTHORITY):
+    # body of the previous Transaction.get_swap, minus the fetch
+    result = []
+    amm_pubkey = Pubkey.from_string(authority_address)
+    post_balances = trans_data.value.transaction.meta.post_token_balances
+    pre_balances = trans_data.value.transaction.meta.pre_token_balances
+    fee_paid = str(Decimal(trans_data.value.transaction.meta.fee) / LAMPORTS_PER_SOL)
+    block_time = trans_data.value.block_time
+    native_accounts_pre, native_accounts_post, non_native_accounts_post = {}, {}, {}
+    maker = "Unknown"
+    for pre_balance in pre_balances:
+        if pre_balance.mint == WRAPPED_SOL_PUBKEY:
+            native_accounts_pre[str(pre_balance.owner)] = pre_balance.ui_token_amount.ui_amount_string
+    for post_balance in post_balances:
+        if post_balance.mint == WRAPPED_SOL_PUBKEY:
+            native_accounts_post[str(post_balance.owner)] = post_balance.ui_token_amount.ui_amount_string
+        else:
+            non_native_accounts_post.setdefault(post_balance.mint, []).append((post_balance.owner, post_balance.ui_token_amount.ui_amount_string))
+    for i, _ in enumerate(non_native_accounts_post.keys()):
+        token_addr = list(non_native_accounts_post.keys())[i]
+        if maker == "Unknown":
+            for account in trans_data.value.transaction.transaction.message.account_keys:
+                if account.pubkey != authority_address and account.signer == True and account.writable == True:
+                    maker = account.pubkey
+                    break
+        swap_amt = Decimal(native_accounts_post.get(str(amm_pubkey), '0')) - Decimal(native_accounts_pre.get(str(amm_pubkey), '0'))
+        transaction_type = "Sell" if float(swap_amt) < 0 else "Buy"
+        result.append(Transaction(signature, token_addr, transaction_type, maker, str(abs(swap_amt)), fee_paid, block_time))
+    for res in result:
+        if res.token_addr == Pubkey.from_string(target_token):
+            return res
+
+
+def run(label, extract, transactions, iterations):
+    count = len(transactions)
+    start = time.perf_counter()
+    for i in range(iterations):
+        trans_data, target = transactions[i % count]
+        extract(trans_data, None, target)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<22} {elapsed / iterations * 1e6:>8.2f} us/transaction")
+    return elapsed
+
+
+if __name__ == "__main__":
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 20_000
+    transactions = load_transactions()
+    balances = sum(len(t.value.transaction.meta.post_token_balances) for t, _ in transactions) / len(transactions)
+    print(f"{len(transactions)} synthetic transactions ({balances:.1f} token balances each), {iterations} iterations\n")
+
+    for trans_data, target in transactions: # both must agree on type, amount and maker
+        old, new = legacy_get_swap(trans_data, None, target), Transaction.swap_from_transaction(trans_data, None, target)
+        assert old.transaction_type == new.transaction_type and Decimal(old.amount_sol) == Decimal(new.amount_sol)
+        assert old.maker == new.maker, f"maker {new.maker} != {old.maker}"
+
+    before = run("four-dict get_swap", legacy_get_swap, transactions, iterations)
+    after = run("balance delta engine", Transaction.swap_from_transaction, transactions, iterations)
+    print(f"\nspeedup: {before / after:.1f}x")
@@ -0,0 +1,40 @@
+"""
+bench_codec.py
+Encode time and bytes per event, current JSON (str(event)) vs. the compact binary codec
+
+usage: python benchmarks/bench_codec.py [iterations]
+"""
+
+from solders.signature import Signature
+from solders.pubkey import Pubkey
+import os, sys, time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from events import NewPairEvent, SwapEvent, BurnEvent
+from classes import Transaction
+from codec import encode_event, decode_event
+
+
+def sample_events():
+    token = Pubkey.new_unique()
+    return {
+        "new_pair": NewPairEvent(str(token), "So11111111111111111111111111111111111111112", str(Pubkey.new_unique()), str(Pubkey.new_unique()), 1726100000),
+        "swap": SwapEvent(Transaction(Signature.new_unique(), token, "Buy", Pubkey.new_unique(), "1.234567891", "0.000105", 1726100042)),
+        "burn": BurnEvent(str(token), str(Pubkey.new_unique()), str(Pubkey.new_unique()), "125000000000000", 1726100099),
+    }
+
+
+def time_it(encode, event, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        encode(event)
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+if __name__ == "__main__":
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 50_000
+    print(f"{'event':<10} {'json us':>9} {'binary us':>10} {'json B':>8} {'binary B':>9}")
+    for name, event in sample_events().items():
+        json_payload, binary_payload = str(event).encode(), encode_event(event)
+        decode_event(binary_payload) # sanity check the round trip
+        print(f"{name:<10} {time_it(str, event, iterations):>9.2f} {time_it(encode_event, event, iterations):>10.2f} {len(json_payload):>8} {len(binary_payload):>9}")
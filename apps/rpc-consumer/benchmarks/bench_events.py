@@ -0,0 +1,72 @@
+"""
+bench_events.py
+Memory and allocations per swap: the previous dict-backed Transaction/SwapEvent vs. the slotted ones
+
+usage: python benchmarks/bench_events.py [events]
+"""
+
+from solders.signature import Signature
+from solders.pubkey import Pubkey
+import gc, json, os, sys, time, tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from classes import Transaction
+from events import SwapEvent
+
+
+# ---- the previous implementation, kept here only for comparison ----
+
+class LegacyTransaction:
+    def __init__(self, signature, token_addr, transaction_type, maker, amount_sol, fee_sol, block_time=None):
+        self.signature = signature
+        self.token_addr = token_addr
+        self.transaction_type = transaction_type
+        self.maker = maker
+        self.amount_sol = amount_sol
+        self.fee_sol = fee_sol
+        self.block_time = block_time
+
+    def to_json(self):
+        return {"signature": str(self.signature), "token_address": str(self.token_addr), "transaction_type": self.transaction_type,
+                "maker": str(self.maker), "amount_sol": self.amount_sol, "fee_sol": self.fee_sol, "block_time": self.block_time}
+
+
+class LegacySwapEvent:
+    def __init__(self, transaction):
+        self.transaction = transaction
+        # Event.__init__ stored a data dict (built via to_json) on every instance
+        self.event_type = "swap"
+        self.block_time = time.time()
+        self.data = {"transaction": transaction.to_json()}
+
+    def __str__(self):
+        return json.dumps({"event_type": self.event_type, "data": {"transaction": self.transaction.to_json()}})
+
+
+def build(transaction_cls, event_cls, inputs):
+    return [event_cls(transaction_cls(*args)) for args in inputs]
+
+
+def measure(label, transaction_cls, event_cls, inputs):
+    gc.collect()
+    tracemalloc.start()
+    events = build(transaction_cls, event_cls, inputs)
+    retained, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    start = time.perf_counter()
+    for event in build(transaction_cls, event_cls, inputs):
+        str(event)
+    elapsed = time.perf_counter() - start
+
+    count = len(inputs)
+    print(f"{label:<8} {retained / count:>10.0f} B retained/swap  {elapsed / count * 1e6:>7.2f} us build+publish/swap")
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20_000
+    token = Pubkey.new_unique()
+    inputs = [(Signature.new_unique(), token, "Buy", Pubkey.new_unique(), "1.234567891", "0.000105", 1726100000 + i) for i in range(count)]
+    print(f"{count} swaps\n")
+    measure("before", LegacyTransaction, LegacySwapEvent, inputs)
+    measure("after", Transaction, SwapEvent, inputs)
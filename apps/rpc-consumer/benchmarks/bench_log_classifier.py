@@ -0,0 +1,64 @@
+"""
+bench_log_classifier.py
+Per-frame CPU cost of classifying Raydium logs: the old per-line startswith/split loop vs. log_classifier
+
+Runs on the synthetic frames in fixtures/ (see fixtures/README.md), not on mainnet traffic
+
+usage: python benchmarks/bench_log_classifier.py [frames]
+"""
+
+from solders.rpc.responses import parse_websocket_message
+from solders.signature import Signature
+import os, sys, time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from log_classifier import classify_logs
+
+FIXTURE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "logs_notifications.jsonl")
+
+
+def load_values():
+    with open(FIXTURE, "r") as file:
+        values = [parse_websocket_message(line)[0].result.value for line in file if line.strip()]
+    # (err, signature string, logs) so both paths start from the same plain python data
+    return [(value.err, str(value.signature), value.logs) for value in values]
+
+
+def classify_old(err, signature, logs):
+    # the loop callback_raydium used to run: err and signature re-checked for every line
+    found = []
+    for log in logs:
+        if err is None:
+            sig = Signature.from_string(signature)
+            if log.startswith("Program log: initialize2"):
+                mint_log_info = log[48:]
+                found.append(int(mint_log_info.split("open_time: ")[1].split(",")[0]))
+            if "Burn" in log:
+                found.append(sig)
+    return found
+
+
+def classify_new(err, signature, logs):
+    if err is None:
+        return classify_logs(logs)
+
+
+def run(label, classify, values, frames):
+    count = len(values)
+    start = time.process_time()
+    for i in range(frames):
+        classify(*values[i % count])
+    elapsed = time.process_time() - start
+    print(f"{label:<22} {elapsed / frames * 1e6:>8.2f} us CPU/frame  {frames / elapsed:>12,.0f} frames/s")
+    return elapsed
+
+
+if __name__ == "__main__":
+    frames = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    values = load_values()
+    lines = sum(len(logs) for _, _, logs in values)
+    print(f"{len(values)} synthetic frames ({lines / len(values):.1f} log lines/frame), {frames} iterations\n")
+
+    before = run("per-line loop", classify_old, values, frames)
+    after = run("log_classifier", classify_new, values, frames)
+    print(f"\nspeedup: {before / after:.1f}x")
@@ -0,0 +1,60 @@
+"""
+bench_notifications.py
+Frames per second for reading err/signature/logs out of logsNotification frames,
+the old to_json + json.loads round trip vs. reading the typed solders notification directly
+
+The frames in fixtures/ are synthetic (see fixtures/README.md), so the numbers compare the two code
+paths on Raydium-shaped frames, not on mainnet traffic
+
+usage: python benchmarks/bench_notifications.py [frames]
+"""
+
+from solders.rpc.responses import parse_websocket_message
+from solders.signature import Signature
+import json, os, sys, time
+
+FIXTURE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "logs_notifications.jsonl")
+
+
+def load_frames():
+    with open(FIXTURE, "r") as file:
+        return [line for line in file if line.strip()]
+
+
+def read_old(notification):
+    # what the callbacks did before: re-serialize, re-parse, then decode the signature again
+    json_data = json.loads(notification.to_json())
+    err = json_data["result"]["value"]["err"]
+    signature = Signature.from_string(json_data["result"]["value"]["signature"])
+    return err, signature, json_data["result"]["value"]["logs"]
+
+
+def read_typed(notification):
+    value = notification.result.value
+    return value.err, value.signature, value.logs
+
+
+def run(label, reader, notifications, frames):
+    count = len(notifications)
+    start = time.perf_counter()
+    for i in range(frames):
+        reader(notifications[i % count])
+    elapsed = time.perf_counter() - start
+    print(f"{label:<28} {frames / elapsed:>12,.0f} frames/s  {elapsed / frames * 1e6:>8.2f} us/frame")
+    return elapsed
+
+
+if __name__ == "__main__":
+    frames = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    raw_frames = load_frames()
+    notifications = [parse_websocket_message(raw)[0] for raw in raw_frames]
+    print(f"{len(raw_frames)} synthetic frames, {frames} iterations\n")
+
+    before = run("to_json + json.loads", read_old, notifications, frames)
+    after = run("typed notification", read_typed, notifications, frames)
+    print(f"\ncallback-side speedup: {before / after:.1f}x")
+
+    # end to end including the websocket frame parse, which both paths pay in recv()
+    before = run("recv parse + old path", lambda raw: read_old(parse_websocket_message(raw)[0]), raw_frames, frames // 4)
+    after = run("recv parse + typed", lambda raw: read_typed(parse_websocket_message(raw)[0]), raw_frames, frames // 4)
+    print(f"\nend-to-end speedup: {before / after:.1f}x")
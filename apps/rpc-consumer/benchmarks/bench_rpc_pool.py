@@ -0,0 +1,73 @@
+"""
+bench_rpc_pool.py
+getTransaction latency against three fake providers with different profiles:
+each provider alone vs. the latency-aware RpcEndpointPool with and without hedging
+
+usage: python benchmarks/bench_rpc_pool.py [calls] [concurrency]
+"""
+
+from solana.rpc.async_api import AsyncClient
+from solana.rpc.commitment import Confirmed
+from solders.signature import Signature
+import asyncio, logging, os, sys, time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from rpc_pool import RpcEndpointPool
+from fake_rpc import FakeRpcServer, load_results
+
+PROFILES = {
+    "fast, heavy tail": dict(latency_ms=15, jitter_ms=5, tail_rate=0.03, tail_ms=400),
+    "steady": dict(latency_ms=35, jitter_ms=5),
+    "slow, flaky": dict(latency_ms=60, jitter_ms=20, error_rate=0.05, rate_limit_rate=0.02),
+}
+
+
+async def run(label, client, signatures, calls, concurrency):
+    latencies, errors = [], 0
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i):
+        nonlocal errors
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                await client.get_transaction(signatures[i % len(signatures)], encoding="jsonParsed",
+                                             commitment=Confirmed, max_supported_transaction_version=0)
+            except Exception:
+                errors += 1
+                return
+            latencies.append(time.perf_counter() - started)
+
+    await asyncio.gather(*[one(i) for i in range(calls)])
+    latencies.sort()
+    pct = lambda fraction: latencies[min(len(latencies) - 1, int(len(latencies) * fraction))] * 1000
+    print(f"{label:<26} p50 {pct(0.5):>7.1f} ms   p95 {pct(0.95):>7.1f} ms   p99 {pct(0.99):>7.1f} ms   errors {errors}")
+
+
+async def main(calls, concurrency):
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    logging.getLogger().setLevel(logging.ERROR)
+    results = load_results()
+    signatures = [Signature.from_string(signature) for signature in results]
+    servers = [await FakeRpcServer(results=results, seed=i, **profile).start() for i, profile in enumerate(PROFILES.values())]
+    print(f"{calls} calls, concurrency {concurrency}\n")
+
+    for label, server in zip(PROFILES, servers):
+        client = AsyncClient(server.url)
+        await run(label, client, signatures, calls, concurrency)
+        await client.close()
+
+    for label, hedge in (("pool, no hedging", False), ("pool, hedged at p95", True)):
+        pool = RpcEndpointPool([server.url for server in servers], hedge=hedge, hedge_min=0.02)
+        await run(label, pool, signatures, calls, concurrency)
+        print(f"{'':<26} {pool.stats()}")
+        await pool.close()
+
+    for server in servers:
+        await server.close()
+
+
+if __name__ == "__main__":
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+    asyncio.run(main(calls, concurrency))
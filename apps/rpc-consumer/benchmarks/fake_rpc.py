@@ -0,0 +1,121 @@
+"""
+fake_rpc.py
+Local fake JSON-RPC HTTP server for benchmarks, answers getTransaction (single and batch) from the
+multihop fixture with a configurable latency profile, error rate and rate limiting
+
+usage: python benchmarks/fake_rpc.py [--port 8899] [--latency-ms 20] [--jitter-ms 5]
+                                     [--tail-rate 0.05] [--tail-ms 400] [--error-rate 0] [--rate-limit-rate 0]
+"""
+
+import argparse, asyncio, json, os, random
+
+FIXTURE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "multihop_transactions.jsonl")
+
+
+def load_results():
+    """signature -> getTransaction result object from the fixture."""
+    results = {}
+    with open(FIXTURE, "r") as file:
+        for line in file:
+            if line.strip():
+                result = json.loads(line)["response"]["result"]
+                results[result["transaction"]["signatures"][0]] = result
+    return results
+
+
+class FakeRpcServer:
+    """
+    Minimal HTTP/1.1 server (keep-alive, Content-Length bodies only). Each request sleeps
+    `latency_ms` +/- `jitter_ms`, with probability `tail_rate` it sleeps `tail_ms` instead.
+    `error_rate` of requests get a 500 and `rate_limit_rate` a 429.
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, latency_ms=20, jitter_ms=5, tail_rate=0.0, tail_ms=400,
+                 error_rate=0.0, rate_limit_rate=0.0, results=None, seed=None):
+        self.host = host
+        self.port = port
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.tail_rate = tail_rate
+        self.tail_ms = tail_ms
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.results = results if results is not None else load_results()
+        self.random = random.Random(seed)
+        self.server = None
+        self.requests = 0
+
+    @property
+    def url(self):
+        return f"http://{self.host}:{self.port}"
+
+    async def start(self):
+        self.server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self
+
+    async def close(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+    def _delay(self):
+        if self.random.random() < self.tail_rate:
+            return self.tail_ms / 1000
+        return max(0.0, self.latency_ms + self.random.uniform(-self.jitter_ms, self.jitter_ms)) / 1000
+
+    def _answer(self, request):
+        result = self.results.get(request["params"][0]) if request.get("method") == "getTransaction" else None
+        return {"jsonrpc": "2.0", "id": request.get("id"), "result": result}
+
+    async def _handle(self, reader, writer):
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                length = 0
+                for line in head.split(b"\r\n")[1:]:
+                    name, _, value = line.partition(b":")
+                    if name.strip().lower() == b"content-length":
+                        length = int(value)
+                body = json.loads(await reader.readexactly(length)) if length else None
+                self.requests += 1
+
+                await asyncio.sleep(self._delay())
+                roll = self.random.random()
+                if roll < self.rate_limit_rate:
+                    status, payload = "429 Too Many Requests", b""
+                elif roll < self.rate_limit_rate + self.error_rate:
+                    status, payload = "500 Internal Server Error", b""
+                else:
+                    answer = [self._answer(item) for item in body] if isinstance(body, list) else self._answer(body)
+                    status, payload = "200 OK", json.dumps(answer).encode()
+
+                writer.write(
+                    f"HTTP/1.1 {status}\r\nContent-Type: application/json\r\nContent-Length: {len(payload)}\r\n\r\n".encode()
+                    + payload
+                )
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionResetError, asyncio.CancelledError):
+            pass
+        finally:
+            writer.close()
+
+
+async def serve(args):
+    server = await FakeRpcServer(
+        port=args.port, latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, tail_rate=args.tail_rate,
+        tail_ms=args.tail_ms, error_rate=args.error_rate, rate_limit_rate=args.rate_limit_rate,
+    ).start()
+    print(f"Fake RPC serving {len(server.results)} transactions on {server.url}")
+    await server.server.serve_forever()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fake Solana JSON-RPC server")
+    parser.add_argument("--port", type=int, default=8899)
+    parser.add_argument("--latency-ms", type=float, default=20)
+    parser.add_argument("--jitter-ms", type=float, default=5)
+    parser.add_argument("--tail-rate", type=float, default=0.0)
+    parser.add_argument("--tail-ms", type=float, default=400)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    asyncio.run(serve(parser.parse_args()))
@@ -7,6 +7,15 @@ from solana.rpc.commitment import Confirmed
 import json, time, logging, traceback, asyncio
 from decimal import Decimal
 from collections.abc import Mapping, Iterable
+from collections import OrderedDict
+from functools import lru_cache
+from balance_delta import swap_delta
+import raw_tx
+from workers import CallbackQueue
+from batch_fetch import BatchingFetcher
+from dedup import FirstArrivalDispatcher, SeenWindow, provider_name
+from backfill import replay_gap
+from helpers import Backoff
 import solders
 
 
@@ -25,8 +34,11 @@ init(autoreset=True)
 logging.basicConfig(level=logging.INFO, format=f'{Fore.YELLOW}[Listener]{Fore.RESET} %(asctime)s - %(levelname)s - %(message)s', datefmt='%H:%M:%S')
 logging.getLogger("urllib").setLevel(logging.WARNING)
 
+RESUME_WINDOW = 300 # seconds of seen signatures kept to drop duplicates between the backfill and the live stream
+
+
 class BaseSubscriptionHandler:
-    def __init__(self, url, commitment="confirmed", encoding="jsonParsed"):
+    def __init__(self, url, commitment="confirmed", encoding="jsonParsed", dispatcher=None, backfill_limit=1000, backfill_limiter=None):
         self.url = url["rpc"] if isinstance(url, dict) else url
         self.url_2 = url.get("http") if isinstance(url, dict) else None
         self.commitment = commitment
@@ -38,15 +50,25 @@ class BaseSubscriptionHandler:
         self.request_counter = 0
         self.websocket = None
         self.running = True
+        # callbacks run on a worker pool so RPC round trips never block reading the next frame
+        self.dispatcher = dispatcher or CallbackQueue()
+        # reconnect state: backoff between attempts, resume point and recently seen signatures for the gap backfill
+        self.backoff = Backoff()
+        self.last_signature = None
+        self.seen = SeenWindow(RESUME_WINDOW)
+        self.backfill_limit = backfill_limit
+        self.backfill_limiter = backfill_limiter # helpers.RateLimiter shared by every replay, or None
+        self.backfill_tasks = set()
 
     async def connect_websocket(self):
-        logging.info(f"Connecting to {self.url}")
         while True:
+            logging.info(f"Connecting to {self.url}")
             try:
                 return await connect(self.url)
             except Exception as e:
-                logging.error(f"Error connecting to websocket: {e}")
-                time.sleep(1)
+                delay = self.backoff.next_delay()
+                logging.error(f"Error connecting to websocket: {e}, retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
 
     async def subscribe(self, websocket, filter=None):
         self.request_counter += 1
@@ -70,42 +92,73 @@ class BaseSubscriptionHandler:
         return self.subscription_id
 
     async def unsubscribe(self):
+        self.running = False
         if self.websocket:
             await self.websocket.logs_unsubscribe(self.subscription_id)
-            self.running = False
             await self.websocket.close()
             logging.info(f"Unsubscribed from {self.subscription_id}")
 
-    async def _listen_loop(self, websocket, callback):
+    async def listen(self, callback, *args):
+        """
+        Connect, subscribe and read notifications until unsubscribed. A dropped socket is reconnected
+        with jittered exponential backoff, re-subscribed with the same filter, and the notifications
+        missed in between are backfilled from getSignaturesForAddress.
+        """
+        while self.running:
+            websocket = await self.connect_websocket()
+            try:
+                await self.subscribe(websocket, filter=self.filter)
+                self.backoff.reset()
+                if self.last_signature is not None:
+                    self._start_backfill(callback, args, self.last_signature)
+                await self._listen_loop(websocket, callback, *args)
+            except Exception:
+                if self.running: # only log error if not intentionally stopped
+                    logging.error(f"Error in listen loop: {traceback.format_exc()}")
+            finally:
+                await websocket.close()
+
+            if self.running:
+                delay = self.backoff.next_delay()
+                logging.info(f"Reconnecting to {self.url} in {delay:.1f}s")
+                await asyncio.sleep(delay)
+
+    async def _listen_loop(self, websocket, callback, *args):
         self.websocket = websocket  # Store websocket reference
         client = self.async_client_2 or self.async_client
+        while self.running:
+            next_resp = await websocket.recv()
+            if next_resp:
+                notification = next_resp[0]
+                signature = getattr(getattr(notification.result, "value", None), "signature", None)
+                if signature is not None:
+                    if self.seen.first_seen(signature) is not None:
+                        continue # already replayed by a backfill
+                    self.last_signature = signature
+                await self.dispatcher.put(callback, client, notification, *args)
+                self._update_request_counter()
+
+    def _start_backfill(self, callback, args, until):
+        account = getattr(self.filter, "pubkey", None)
+        if account is None or self.backfill_limit <= 0:
+            return
+        task = asyncio.create_task(self._backfill(account, callback, args, until))
+        self.backfill_tasks.add(task)
+        task.add_done_callback(self.backfill_tasks.discard)
+
+    async def _backfill(self, account, callback, args, until):
+        client = self.async_client_2 or self.async_client
+
+        async def dispatch(notification):
+            if self.seen.first_seen(notification.result.value.signature) is not None:
+                return False # delivered live after the reconnect
+            return await self.dispatcher.put(callback, client, notification, *args)
+
         try:
-            while self.running:
-                next_resp = await websocket.recv()
-                if next_resp:
-                    await callback(client, next_resp[0].to_json())
-                    self._update_request_counter()
-        except asyncio.CancelledError:
-            logging.info("Listen loop was cancelled")
-        except Exception as e:
-            if self.running:  # Only log error if not intentionally stopped
-                logging.error(f"Error in listen/callback: {traceback.format_exc()}")
-                await self._reconnect_and_listen(callback)
-
-    async def _reconnect_and_listen(self, callback):
-        retry_count = 0
-        max_retries = 5
-        while retry_count < max_retries and self.running:
-            logging.info("Reconnecting...")
-            await asyncio.sleep(3)  # Incremental back-off can be implemented here
-            try:
-                await self.listen(callback)
-                break
-            except Exception as e:
-                logging.error(f"Attempt {retry_count + 1} failed: {traceback.format_exc()}")
-                retry_count += 1
-        if retry_count == max_retries:
-            logging.error("Max retries reached, stopping reconnection attempts.")
+            replayed = await replay_gap(client, account, until, dispatch, transaction_cache.fetch, self.subscription_id, self.backfill_limit, limiter=self.backfill_limiter)
+            logging.info(f"Backfilled {replayed} notifications for {account} missed while reconnecting")
+        except Exception:
+            logging.error(f"Error backfilling {account}: {traceback.format_exc()}")
 
     def _update_request_counter(self):
         self.request_counter += 1
@@ -116,79 +169,166 @@ class BaseSubscriptionHandler:
             self.start_time = time.time()
 
 class LogsSubscriptionHandler(BaseSubscriptionHandler):
-    def __init__(self, url, filter=None):
-        super().__init__(url)
+    def __init__(self, url, filter=None, dispatcher=None, backfill_limit=1000, backfill_limiter=None):
+        super().__init__(url, dispatcher=dispatcher, backfill_limit=backfill_limit, backfill_limiter=backfill_limiter)
+        self.filter = filter
+
+class RedundantLogsSubscriptionHandler:
+    """
+    Subscribes to the same logs filter on several providers at once and merges the streams, only the
+    first arrival of each signature reaches the callback (see dedup.FirstArrivalDispatcher).
+    The other providers cover one provider's reconnect, so per provider gap backfill is off by default.
+    """
+
+    def __init__(self, urls, filter=None, dispatcher=None, window=60, backfill_limit=0):
         self.filter = filter
+        self.dispatcher = dispatcher or CallbackQueue()
+        self.merger = FirstArrivalDispatcher(self.dispatcher, window)
+        self.handlers = [
+            LogsSubscriptionHandler(url, filter=filter, dispatcher=self.merger.provider(provider_name(url)), backfill_limit=backfill_limit)
+            for url in urls
+        ]
 
     async def listen(self, callback):
-        while self.running:
-            websocket = await self.connect_websocket()
-            try:
-                await self.subscribe(websocket, filter=self.filter)
-                await self._listen_loop(websocket, callback)
-            except Exception as e:
-                logging.error(f"Error in listen loop: {traceback.format_exc()}")
-                await self._reconnect_and_listen(callback)
+        await asyncio.gather(*(handler.listen(callback) for handler in self.handlers))
+
+    async def unsubscribe(self):
+        for handler in self.handlers:
+            await handler.unsubscribe()
+
+    def stats(self):
+        return self.merger.stats()
+
+    def reset_stats(self):
+        self.merger.reset_stats()
 
 class TransactionSubscriptionHandler(LogsSubscriptionHandler):
-    def __init__(self, url, filter=None):
-        super().__init__(url, filter)
-
-    async def _reconnect_and_listen(self, callback, target_token):
-        retry_count = 0
-        max_retries = 5
-        while retry_count < max_retries and self.running:
-            logging.info("Reconnecting...")
-            await asyncio.sleep(3)
-            try:
-                await self.listen(callback, target_token)
-                break
-            except Exception as e:
-                logging.error(f"Attempt {retry_count + 1} failed: {traceback.format_exc()}")
-                retry_count += 1
-        if retry_count == max_retries:
-            logging.error("Max retries reached, stopping reconnection attempts.")
+    """Logs subscription whose callback also gets the target token, `listen(callback, target_token)`."""
 
-    async def _listen_loop(self, websocket, callback, target_token):
-        # add support for token targetting in transaction detection
-        self.websocket = websocket  # Store websocket reference
-        client = self.async_client_2 or self.async_client
+    def __init__(self, url, filter=None, dispatcher=None, backfill_limit=1000, backfill_limiter=None):
+        super().__init__(url, filter, dispatcher, backfill_limit, backfill_limiter)
+
+
+# ------- Transaction Cache -------
+
+
+class TransactionCache:
+    """
+    Shared cache in front of `get_transaction`, keyed by (signature, encoding).
+    Entries expire after `ttl` seconds and the least recently used ones are evicted past `max_size`.
+    Concurrent lookups for a signature that is already being fetched await the same future.
+    `encoding` is used when a caller doesn't ask for one, "jsonParsed" or "base64" (see raw_tx.py).
+    Misses go through a BatchingFetcher per client once batching is configured with `max_batch` > 1,
+    or through an RpcEndpointPool (rpc_pool.py) instead of the caller's client when one is configured.
+    """
+
+    def __init__(self, max_size=5000, ttl=120, encoding="jsonParsed"):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.encoding = encoding
+        self.batch_size = 1
+        self.batch_wait = 0.003
+        self.fetchers = {} # client -> BatchingFetcher
+        self.pool = None
+        self.entries = OrderedDict() # key -> (expires_at, response)
+        self.in_flight = {} # key -> future
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+
+    def configure(self, max_size, ttl, encoding="jsonParsed"):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.encoding = encoding
+
+    def configure_batching(self, max_batch, max_wait):
+        self.batch_size = max_batch
+        self.batch_wait = max_wait
+
+    def configure_pool(self, pool):
+        self.pool = pool
+
+    def batched(self, client):
+        if self.batch_size <= 1:
+            return client
+        fetcher = self.fetchers.get(client)
+        if fetcher is None:
+            fetcher = self.fetchers[client] = BatchingFetcher(client, self.batch_size, self.batch_wait)
+        return fetcher
+
+    def fetcher(self, ctx):
+        return self.pool if self.pool is not None else self.batched(ctx)
+
+    async def fetch(self, ctx, signature, encoding=None):
+        encoding = encoding or self.encoding
+        key = (str(signature), encoding)
+
+        entry = self.entries.get(key)
+        if entry is not None:
+            if entry[0] > time.monotonic():
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            del self.entries[key]
+
+        future = self.in_flight.get(key)
+        if future is not None:
+            self.coalesced += 1
+            return await asyncio.shield(future)
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self.in_flight[key] = future
         try:
-            while self.running:
-                next_resp = await websocket.recv()
-                if next_resp:
-                    await callback(client, next_resp[0].to_json(), target_token)
-                    self._update_request_counter()
+            response = await self.fetcher(ctx).get_transaction(signature, max_supported_transaction_version=0, commitment=Confirmed, encoding=encoding)
         except asyncio.CancelledError:
-            logging.info("Listen loop was cancelled")
+            future.cancel()
+            raise
         except Exception as e:
-            if self.running:
-                logging.error(f"Error in listen/callback: {traceback.format_exc()}")
-                await self._reconnect_and_listen(callback, target_token)
+            future.set_exception(e)
+            future.exception() # mark retrieved, waiters (if any) re-raise it themselves
+            raise
+        finally:
+            self.in_flight.pop(key, None)
+
+        future.set_result(response)
+        if getattr(response, "value", None) is not None: # don't cache "not found yet"
+            self.entries[key] = (time.monotonic() + self.ttl, response)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+        return response
+
+    def stats(self):
+        return {
+            "size": len(self.entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "evictions": self.evictions,
+            "rpc_calls_saved": self.hits + self.coalesced,
+        }
 
-    async def listen(self, callback, target_token):
-        while self.running:
-            websocket = await self.connect_websocket()
-            try:
-                await self.subscribe(websocket, filter=self.filter)
-                await self._listen_loop(websocket, callback, target_token)
-            except Exception as e:
-                logging.error(f"Error in listen loop: {traceback.format_exc()}")
-                await self._reconnect_and_listen(callback, target_token)
+
+transaction_cache = TransactionCache()
 
 
 # ------- Transaction Detection -------
 
 
 class Transaction:
-    def __init__(self, signature, token_addr, transaction_type, maker, amount_sol, fee_sol, block_time=time.time()):
+    __slots__ = ("signature", "token_addr", "transaction_type", "maker", "amount_sol", "fee_sol", "block_time")
+
+    def __init__(self, signature, token_addr, transaction_type, maker, amount_sol, fee_sol, block_time=None):
         self.signature = signature
         self.token_addr = token_addr
         self.transaction_type = transaction_type
         self.maker = maker
         self.amount_sol = amount_sol
         self.fee_sol = fee_sol
-        self.block_time = block_time
+        self.block_time = time.time() if block_time is None else block_time
 
 
     def __repr__(self):
@@ -210,14 +350,16 @@ class Transaction:
     
     @staticmethod
     async def get_swap(ctx : AsyncClient, signature : Signature, target_token: str, authority_address="5Q544fKrFoe6tsEbD7S8EmxGTJYAKtTVhAW5Q5pge4j1"): # authority address is amm address 
-        trans_data = await ctx.get_transaction(signature, max_supported_transaction_version=0, commitment=Confirmed, encoding="jsonParsed")
-        result = []
+        trans_data = await transaction_cache.fetch(ctx, signature)
+        return Transaction.swap_from_transaction(trans_data, signature, target_token, authority_address)
 
+    @staticmethod
+    def swap_from_transaction(trans_data, signature : Signature, target_token: str, authority_address="5Q544fKrFoe6tsEbD7S8EmxGTJYAKtTVhAW5Q5pge4j1"):
         try:
-            amm_pubkey = Pubkey.from_string(authority_address)
-            post_balances = trans_data.value.transaction.meta.post_token_balances
-            pre_balances = trans_data.value.transaction.meta.pre_token_balances
-            fee_paid = str(Decimal(trans_data.value.transaction.meta.fee) / LAMPORTS_PER_SOL)
+            meta = trans_data.value.transaction.meta
+            post_balances = meta.post_token_balances
+            pre_balances = meta.pre_token_balances
+            fee_paid = str(Decimal(meta.fee) / LAMPORTS_PER_SOL)
             block_time = trans_data.value.block_time
         except AttributeError as e:
             logging.error(f"Error in transaction data: {e}")
@@ -230,68 +372,31 @@ class Transaction:
 
             return
 
-        # -------------- load up all accounts into a dictionary for easy access -------------- 
-        native_accounts_pre = {}
-        native_accounts_post = {}
-        non_native_accounts_pre = {}
-        non_native_accounts_post = {}
-        token_addr = "Unknown"
-        transaction_type = "Unknown"
-        maker = "Unknown"
+        # one pass over the token balances, only the target mint and WSOL are diffed
+        target_pubkey = pubkey_from_string(target_token)
+        delta = swap_delta(pre_balances, post_balances, target_pubkey, pubkey_from_string(authority_address))
 
-        for pre_balance in pre_balances:
-            if pre_balance.mint == WRAPPED_SOL_PUBKEY:
-                native_accounts_pre[str(pre_balance.owner)] = pre_balance.ui_token_amount.ui_amount_string
-            else:
-                if non_native_accounts_pre.get(pre_balance.mint) == None:
-                    non_native_accounts_pre[pre_balance.mint] = {}
-                non_native_accounts_pre[pre_balance.mint][str(pre_balance.owner)] = pre_balance.ui_token_amount.ui_amount_string
-
-
-        for post_balance in post_balances:
-            if post_balance.mint == WRAPPED_SOL_PUBKEY:
-                native_accounts_post[str(post_balance.owner)] = post_balance.ui_token_amount.ui_amount_string
-            else:
-                if non_native_accounts_post.get(post_balance.mint) == None:
-                    non_native_accounts_post[post_balance.mint] = []
-                non_native_accounts_post[post_balance.mint].append((post_balance.owner,post_balance.ui_token_amount.ui_amount_string))
-
-        for i,balance_list in enumerate(non_native_accounts_post.keys()):
-
-            # since there are multiple swaps in the transaction, we need to find the swap amount for the current token
-            token_addr =  list(non_native_accounts_post.keys())[i]
-
-            for nn_acc in non_native_accounts_post.get(token_addr): #type:ignore - for all accounts that hold the token
-                if nn_acc[0] != authority_address: # if the account is not the amm address
-                    nn_acc_get_post = non_native_accounts_post.get(token_addr) 
-                    if nn_acc_get_post != None: # if the account is in the post balances
-                        if native_accounts_post.get(nn_acc[1]) != native_accounts_pre.get(nn_acc[1]): #type:ignore - if the balance of the account has changed
-                            maker = Pubkey.from_string(nn_acc) # set the maker to the account
-                            break
-
-            if maker == "Unknown":
-                # use different logic to find maker for more complex transactions
-                for account in trans_data.value.transaction.transaction.message.account_keys:
-                    if account.pubkey != authority_address and account.signer == True and account.writable == True:
-                        maker = account.pubkey
-                        break
-            
-            swap_amt = Decimal(native_accounts_post.get(str(amm_pubkey), '0')) - Decimal(native_accounts_pre.get(str(amm_pubkey), '0'))
-
-            if float(swap_amt) < 0:
-                transaction_type = "Sell"
-            else:
-                transaction_type = "Buy"
-            swap_amt = str(abs(swap_amt))
-            result.append(Transaction(signature,token_addr,transaction_type, maker, swap_amt, fee_paid, block_time))
-
-        if len(result) == 0:
+        if not delta.has_tokens:
             raise Exception("No swaps detected in transaction")
-        else:
-            # go through all the results and only return the ONE that matches the target token
-            for res in result:
-                if res.token_addr == Pubkey.from_string(target_token):
-                    return res
-            # throw an exception if the target token was not found
+        if not delta.has_target:
             raise Exception("Target token not found in transaction")
-    
+
+        # the maker is the first writable signer that isn't the AMM, i.e. normally the fee payer
+        maker = "Unknown"
+        if raw_tx.is_raw(trans_data):
+            for pubkey in raw_tx.signer_writable_keys(trans_data):
+                if str(pubkey) != authority_address:
+                    maker = pubkey
+                    break
+        else:
+            for account in trans_data.value.transaction.transaction.message.account_keys:
+                if account.signer == True and account.writable == True and str(account.pubkey) != authority_address:
+                    maker = account.pubkey
+                    break
+
+        return Transaction(signature, target_pubkey, delta.transaction_type, maker, delta.amount_sol, fee_paid, block_time)
+
+
+@lru_cache(maxsize=4096)
+def pubkey_from_string(address: str) -> Pubkey:
+    return Pubkey.from_string(address)
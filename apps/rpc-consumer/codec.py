@@ -0,0 +1,114 @@
+"""
+codec.py
+Versioned compact binary encoding for events, selectable per channel as an alternative to JSON
+
+Layout (little endian), every payload starts with a 2 byte header:
+    version   u8   (CODEC_VERSION)
+    type      u8   (1 = new_pair, 2 = swap, 3 = burn)
+
+    new_pair: base_token[32] quote_token[32] base_pool_account[32] quote_pool_account[32] block_time f64
+    swap:     signature[64] token_address[32] maker[32] transaction_type u8 (0 buy, 1 sell, | 0x80 backfilled)
+              amount_lamports u64 fee_lamports u64 block_time f64
+    burn:     token[32] account[32] authority[32] amount u64 (raw token units) block_time f64
+
+Pubkeys and signatures are raw bytes, SOL amounts are integer lamports. An unknown key ("Unknown")
+is sent as 32 zero bytes and a burn without an amount as u64 max (decoded back to None, like the
+JSON null). No subscriber in this repo reads binary payloads yet (the token processor only reads
+JSON), decode_event is the reference decoder for one that does.
+"""
+
+from solders.signature import Signature
+from solders.pubkey import Pubkey
+from decimal import Decimal
+import struct
+
+CODEC_VERSION = 1
+LAMPORTS_PER_SOL = 1_000_000_000
+
+NEW_PAIR, SWAP, BURN = 1, 2, 3
+TRANSACTION_TYPES = ("Buy", "Sell")
+BACKFILLED_FLAG = 0x80 # high bit of the swap transaction_type byte
+UNKNOWN_KEY = bytes(32)
+MISSING_AMOUNT = 2**64 - 1
+
+HEADER = struct.Struct("<BB")
+NEW_PAIR_BODY = struct.Struct("<32s32s32s32sd")
+SWAP_BODY = struct.Struct("<64s32s32sBQQd")
+BURN_BODY = struct.Struct("<32s32s32sQd")
+
+
+def _key_bytes(key) -> bytes:
+    if isinstance(key, Pubkey):
+        return bytes(key)
+    if key is None or key == "Unknown":
+        return UNKNOWN_KEY
+    return bytes(Pubkey.from_string(str(key)))
+
+
+def _key_str(raw: bytes) -> str:
+    return "Unknown" if raw == UNKNOWN_KEY else str(Pubkey.from_bytes(raw))
+
+
+def _lamports(amount_sol) -> int:
+    return int(Decimal(str(amount_sol)) * LAMPORTS_PER_SOL)
+
+
+def _sol_str(lamports: int) -> str:
+    return format((Decimal(lamports) / LAMPORTS_PER_SOL).normalize(), "f")
+
+
+def encode_event(event) -> bytes:
+    """Encode a NewPairEvent, SwapEvent or BurnEvent."""
+    if event.event_type == "new_pair":
+        return HEADER.pack(CODEC_VERSION, NEW_PAIR) + NEW_PAIR_BODY.pack(
+            _key_bytes(event.base_token), _key_bytes(event.quote_token),
+            _key_bytes(event.base_pool_account), _key_bytes(event.quote_pool_account),
+            float(event.block_time),
+        )
+    if event.event_type == "swap":
+        transaction = event.transaction
+        signature = transaction.signature if isinstance(transaction.signature, Signature) else Signature.from_string(str(transaction.signature))
+        return HEADER.pack(CODEC_VERSION, SWAP) + SWAP_BODY.pack(
+            bytes(signature), _key_bytes(transaction.token_addr), _key_bytes(transaction.maker),
+            TRANSACTION_TYPES.index(transaction.transaction_type) | (BACKFILLED_FLAG if event.backfilled else 0),
+            _lamports(transaction.amount_sol), _lamports(transaction.fee_sol),
+            float(transaction.block_time),
+        )
+    if event.event_type == "burn":
+        return HEADER.pack(CODEC_VERSION, BURN) + BURN_BODY.pack(
+            _key_bytes(event.token), _key_bytes(event.account), _key_bytes(event.authority),
+            MISSING_AMOUNT if event.amount is None else int(event.amount), float(event.block_time),
+        )
+    raise ValueError(f"Cannot binary encode event type {event.event_type}")
+
+
+def decode_event(payload: bytes) -> dict:
+    """Decode into the same {"event_type", "data"} shape the JSON encoding produces."""
+    version, event_type = HEADER.unpack_from(payload)
+    if version != CODEC_VERSION:
+        raise ValueError(f"Unsupported event codec version {version}")
+
+    if event_type == NEW_PAIR:
+        base, quote, base_pool, quote_pool, block_time = NEW_PAIR_BODY.unpack_from(payload, HEADER.size)
+        return {"event_type": "new_pair", "data": {
+            "base_token": _key_str(base), "quote_token": _key_str(quote),
+            "base_pool_account": _key_str(base_pool), "quote_pool_account": _key_str(quote_pool),
+            "block_time": block_time,
+        }}
+    if event_type == SWAP:
+        signature, token, maker, transaction_type, amount, fee, block_time = SWAP_BODY.unpack_from(payload, HEADER.size)
+        data = {"transaction": {
+            "signature": str(Signature.from_bytes(signature)), "token_address": _key_str(token),
+            "transaction_type": TRANSACTION_TYPES[transaction_type & ~BACKFILLED_FLAG], "maker": _key_str(maker),
+            "amount_sol": _sol_str(amount), "fee_sol": _sol_str(fee), "block_time": block_time,
+        }}
+        if transaction_type & BACKFILLED_FLAG:
+            data["backfilled"] = True
+        return {"event_type": "swap", "data": data}
+    if event_type == BURN:
+        token, account, authority, amount, block_time = BURN_BODY.unpack_from(payload, HEADER.size)
+        return {"event_type": "burn", "data": {
+            "token": _key_str(token), "account": _key_str(account), "authority": _key_str(authority),
+            "amount": None if amount == MISSING_AMOUNT else str(amount), "block_time": block_time,
+        }}
+    raise ValueError(f"Unknown event type {event_type}")
@@ -0,0 +1,189 @@
+"""
+dedup.py
+Sliding window dedup for notifications arriving from several websocket providers at once,
+and a bounded (optionally Redis shared) index for claiming new pair detections once
+"""
+
+from redis.asyncio import Redis as AsyncRedis
+from collections import OrderedDict
+from urllib.parse import urlparse
+from metrics import Counters
+import logging, time
+
+
+class SeenWindow:
+    """Keys seen within the last `window` seconds, bounded to `max_size` entries (oldest dropped first)."""
+
+    def __init__(self, window=60, max_size=100_000):
+        self.window = window
+        self.max_size = max_size
+        self.entries = OrderedDict() # key -> (first seen at, value recorded with it)
+
+    def first_seen(self, key, value=None, now=None):
+        """Record `key` and return None when it is new, otherwise the (seen_at, value) of its first sighting."""
+        now = time.monotonic() if now is None else now
+        entries = self.entries
+        while entries:
+            oldest = next(iter(entries.values()))
+            if now - oldest[0] <= self.window and len(entries) < self.max_size:
+                break
+            entries.popitem(last=False)
+
+        seen = entries.get(key)
+        if seen is None:
+            entries[key] = (now, value)
+        return seen
+
+    def contains(self, key, now=None):
+        """Whether `key` was recorded within the window, without recording it."""
+        now = time.monotonic() if now is None else now
+        seen = self.entries.get(key)
+        return seen is not None and now - seen[0] <= self.window
+
+    def __len__(self):
+        return len(self.entries)
+
+
+def provider_name(url) -> str:
+    """Host of a provider url, keeps API keys in paths and query strings out of the logs."""
+    url = url["rpc"] if isinstance(url, dict) else url
+    return urlparse(url).netloc or url
+
+
+class ProviderArrivals:
+    """Dispatcher handed to one provider's handler, reports every frame to the shared FirstArrivalDispatcher."""
+
+    def __init__(self, merger, name):
+        self.merger = merger
+        self.name = name
+
+    async def put(self, callback, *args):
+        return await self.merger.arrive(self.name, callback, args)
+
+
+class FirstArrivalDispatcher:
+    """
+    Merges the notification streams of several providers subscribed to the same filter. Only the first
+    arrival of each signature is passed on to `dispatcher`; later copies are dropped but counted, with
+    how far behind the winner they arrived, so slow providers show up in `stats`.
+    """
+
+    def __init__(self, dispatcher, window=60):
+        self.dispatcher = dispatcher
+        self.seen = SeenWindow(window)
+        self.providers = {} # name -> Counters
+
+    def provider(self, name):
+        self.providers[name] = Counters("arrivals", "wins", "late", "skew_total", "skew_max")
+        return ProviderArrivals(self, name)
+
+    async def arrive(self, name, callback, args):
+        now = time.monotonic()
+        metrics = self.providers[name]
+        metrics.arrivals += 1
+
+        # args are (client, notification, ...), frames without a signature are passed through
+        value = getattr(getattr(args[1], "result", None), "value", None) if len(args) > 1 else None
+        signature = getattr(value, "signature", None)
+        if signature is None:
+            return await self.dispatcher.put(callback, *args)
+
+        first = self.seen.first_seen(signature, name, now)
+        if first is not None:
+            skew = now - first[0]
+            metrics.late += 1
+            metrics.skew_total += skew
+            metrics.skew_max = max(metrics.skew_max, skew)
+            return False
+
+        metrics.wins += 1
+        return await self.dispatcher.put(callback, *args)
+
+    def stats(self):
+        """Per provider win rate and how far behind the first arrival its duplicates came in."""
+        stats = {}
+        for name, metrics in self.providers.items():
+            stats[name] = {
+                "arrivals": metrics.arrivals,
+                "wins": metrics.wins,
+                "win_rate": round(metrics.wins / metrics.arrivals, 3) if metrics.arrivals else 0.0,
+                "skew_avg_ms": round(metrics.skew_total / metrics.late * 1000, 2) if metrics.late else 0.0,
+                "skew_max_ms": round(metrics.skew_max * 1000, 2),
+            }
+        stats["window_size"] = len(self.seen)
+        return stats
+
+    def reset_stats(self):
+        for metrics in self.providers.values():
+            metrics.reset()
+
+
+class DedupIndex:
+    """
+    Bounded LRU of claimed keys (pool accounts, signatures) that expire after `ttl` seconds.
+    With `redis_client` set a claim is also a `SET NX EX` on `prefix + key`, so only one of several
+    consumer replicas wins it. If Redis can't be reached the local answer is used, a duplicate beats a miss.
+    """
+
+    def __init__(self, max_size=10_000, ttl=3600, redis_client: AsyncRedis = None, prefix="dedup:"):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.redis_client = redis_client
+        self.prefix = prefix
+        self.entries = OrderedDict() # key -> expires_at
+
+        self.counters = Counters("claimed", "duplicates", "remote_duplicates", "redis_errors")
+
+    def _seen_locally(self, key, now):
+        expires_at = self.entries.get(key)
+        if expires_at is None:
+            return False
+        if expires_at <= now:
+            del self.entries[key]
+            return False
+        self.entries.move_to_end(key)
+        return True
+
+    def _remember(self, key, now):
+        self.entries[key] = now + self.ttl
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    async def claim(self, key) -> bool:
+        """True the first time `key` is claimed (by any replica when Redis backed) within `ttl`."""
+        key = str(key)
+        now = time.monotonic()
+        if self._seen_locally(key, now):
+            self.counters.duplicates += 1
+            return False
+        self._remember(key, now)
+
+        if self.redis_client is not None:
+            try:
+                if not await self.redis_client.set(self.prefix + key, 1, nx=True, ex=int(self.ttl)):
+                    self.counters.remote_duplicates += 1
+                    return False
+            except Exception as e:
+                self.counters.redis_errors += 1
+                logging.error(f"Dedup index could not reach Redis, deciding locally: {e}")
+
+        self.counters.claimed += 1
+        return True
+
+    async def release(self, key):
+        """Give up a claim whose work failed, so a later arrival (another provider or replica) can claim `key` again."""
+        key = str(key)
+        self.entries.pop(key, None)
+        if self.redis_client is not None:
+            try:
+                await self.redis_client.delete(self.prefix + key)
+            except Exception as e:
+                self.counters.redis_errors += 1
+                logging.error(f"Dedup index could not release {key} in Redis: {e}")
+
+    def stats(self):
+        return {"size": len(self.entries), **self.counters.snapshot()}
+
+    def reset_stats(self):
+        self.counters.reset()
@@ -1,22 +1,138 @@
 from colorama import Fore, init
-from time import sleep
-import logging
+import asyncio, logging, random, time
 
 init(autoreset=True)
 
+class CircuitBreaker:
+    """
+    Closed until `failure_threshold` consecutive failures, then open: callers skip the dependency for
+    `reset_timeout` seconds. The first `allow()` after that lets one call through (half open), its
+    success closes the breaker again and a failure re-opens it.
+    """
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, name, failure_threshold=3, reset_timeout=5.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.trips = 0
+
+    @property
+    def closed(self):
+        return self.state == self.CLOSED
+
+    def allow(self):
+        if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+            self.state = self.HALF_OPEN
+            return True
+        return self.state == self.CLOSED
+
+    def retry_in(self):
+        if self.state != self.OPEN:
+            return 0.0
+        return max(0.0, self.opened_at + self.reset_timeout - time.monotonic())
+
+    def record_success(self):
+        if self.state != self.CLOSED:
+            logging.info(f"{Fore.GREEN}{self.name} circuit closed{Fore.RESET}")
+        self.state = self.CLOSED
+        self.failures = 0
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                self.trips += 1
+                logging.error(f"{Fore.RED}{self.name} circuit open after {self.failures} failures{Fore.RESET}")
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+
+
 class HealthTask:
-    def __init__(self, redis_client, interval, emergency_callback):
+    """Pings Redis every `interval` seconds on the event loop and reports the outcome to `breaker`."""
+
+    def __init__(self, redis_client, interval, breaker: CircuitBreaker):
         self.redis_client = redis_client
         self.interval = interval
-        self.emergency_callback = emergency_callback
+        self.breaker = breaker
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.redis_client.ping()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logging.error(f"{Fore.RED}Redis health check failed: {e}")
+                self.breaker.record_failure()
+            else:
+                logging.info("♥ Healthy ♥")
+                self.breaker.record_success()
 
-    def run(self):
+
+class Backoff:
+    """
+    Jittered exponential backoff ("full jitter"): the n-th consecutive failure waits a random
+    time between 0 and min(cap, base * factor ** n) seconds. reset() once a connection is healthy again.
+    """
+
+    def __init__(self, base=0.5, cap=30.0, factor=2.0):
+        self.base = base
+        self.cap = cap
+        self.factor = factor
+        self.attempts = 0
+
+    def next_delay(self):
+        delay = random.uniform(0, min(self.cap, self.base * self.factor ** min(self.attempts, 32)))
+        self.attempts += 1
+        return delay
+
+    def reset(self):
+        self.attempts = 0
+
+
+class RateLimiter:
+    """Token bucket, `acquire` waits for one of `rate` tokens per second, bursts of up to `burst` go straight through."""
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.burst = burst or max(1.0, rate)
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self.lock:
             while True:
-                try:
-                    sleep(self.interval)
-                    logging.info("♥ Healthy ♥")
-                    self.redis_client.ping()
-                except Exception as e:
-                    logging.fatal(f"{Fore.RED}Redis health check failed: {e}")
-                    self.emergency_callback()
-                
\ No newline at end of file
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+def run(main, use_uvloop=False):
+    """asyncio.run(main()) on a uvloop event loop when `use_uvloop` is set and uvloop is installed."""
+    if use_uvloop:
+        try:
+            import uvloop
+        except ImportError:
+            logging.warning("uvloop is not installed, using the default asyncio event loop")
+        else:
+            if hasattr(asyncio, "Runner"):
+                with asyncio.Runner(loop_factory=uvloop.new_event_loop) as runner:
+                    return runner.run(main())
+            # asyncio.Runner is new in Python 3.11, older versions pick the loop through the policy
+            asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+            try:
+                return asyncio.run(main())
+            finally:
+                asyncio.set_event_loop_policy(None)
+    return asyncio.run(main())
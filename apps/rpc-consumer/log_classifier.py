@@ -0,0 +1,75 @@
+"""
+log_classifier.py
+Single pass classifier for Raydium program logs, turns a notification's log lines into structured records
+"""
+
+import re
+
+# Every line we care about starts with "Program log: ", one anchored regex dispatches on what follows.
+# initialize2 lines look like:
+#   Program log: initialize2: InitializeInstruction2 { nonce: 254, open_time: 1726100000, init_pc_amount: 79000000000, init_coin_amount: 206900000000000000 }
+LOG_LINE_PATTERN = re.compile(
+    r"Program log: (?:"
+    r"initialize2: InitializeInstruction2 \{ nonce: (?P<nonce>\d+), open_time: (?P<open_time>\d+), "
+    r"init_pc_amount: (?P<init_pc_amount>\d+), init_coin_amount: (?P<init_coin_amount>\d+)"
+    r"|Instruction: (?P<burn>Burn(?:Checked)?)\b"
+    r"|(?P<error>err:)"
+    r")"
+)
+
+
+class Initialize2:
+    """Fields of a Raydium initialize2 (new pool) log line."""
+
+    __slots__ = ("nonce", "open_time", "init_pc_amount", "init_coin_amount")
+
+    def __init__(self, nonce: int, open_time: int, init_pc_amount: int, init_coin_amount: int):
+        self.nonce = nonce
+        self.open_time = open_time
+        self.init_pc_amount = init_pc_amount
+        self.init_coin_amount = init_coin_amount
+
+    def __repr__(self):
+        return f"Initialize2(nonce={self.nonce}, open_time={self.open_time}, init_pc_amount={self.init_pc_amount}, init_coin_amount={self.init_coin_amount})"
+
+
+class LogClassification:
+    """Everything the callbacks need to know about one notification's logs."""
+
+    __slots__ = ("initialize2", "burns", "errors")
+
+    def __init__(self):
+        self.initialize2 = None # Initialize2 or None
+        self.burns = [] # "Burn" / "BurnChecked" per token burn instruction seen
+        self.errors = [] # lines carrying a program error marker
+
+    @property
+    def has_error(self) -> bool:
+        return len(self.errors) > 0
+
+    def __repr__(self):
+        return f"LogClassification(initialize2={self.initialize2}, burns={self.burns}, errors={self.errors})"
+
+
+def classify_logs(logs) -> LogClassification:
+    """Make one pass over `logs`, call once per notification."""
+    result = LogClassification()
+    match = LOG_LINE_PATTERN.match
+
+    for log in logs:
+        found = match(log)
+        if found is None:
+            continue
+        kind = found.lastgroup
+        if kind == "burn":
+            result.burns.append(found.group("burn"))
+        elif kind == "error":
+            result.errors.append(log)
+        elif result.initialize2 is None:
+            result.initialize2 = Initialize2(
+                int(found.group("nonce")),
+                int(found.group("open_time")),
+                int(found.group("init_pc_amount")),
+                int(found.group("init_coin_amount")),
+            )
+    return result
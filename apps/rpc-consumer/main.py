@@ -1,6 +1,17 @@
-from classes import LogsSubscriptionHandler, TransactionSubscriptionHandler, Transaction
+from classes import LogsSubscriptionHandler, RedundantLogsSubscriptionHandler, Transaction, transaction_cache
+from multiplexer import SubscriptionMultiplexer
+from workers import CallbackQueue
+from log_classifier import classify_logs, Initialize2
+from publisher import AsyncEventPublisher
+from streams import ensure_consumer_group
+from rpc_pool import RpcEndpointPool
+from swap_backfill import SwapBackfill, BackfillJob, CheckpointStore
+from dedup import DedupIndex
+from sharding import ShardCoordinator, consumer_role
+import raw_tx
 from solders.transaction_status import ParsedInstruction
 from solders.rpc.config import RpcTransactionLogsFilterMentions
+from solders.rpc.responses import LogsNotification
 from events import NewPairEvent, BurnEvent, SwapEvent
 from solana.rpc.commitment import Confirmed
 from solana.rpc.async_api import AsyncClient
@@ -8,11 +19,11 @@ from dotenv import load_dotenv, find_dotenv
 from solders.signature import Signature
 from colorama import Fore, init
 from solders.pubkey import Pubkey
-from helpers import HealthTask
-from threading import Thread
-import json, os, asyncio
+from helpers import HealthTask, CircuitBreaker, RateLimiter, run
+from spill import SpillBuffer
+import json, os, asyncio, signal
 import logging
-from redis import Redis
+from redis.asyncio import Redis as AsyncRedis
 import traceback
 import time
 import os
@@ -39,43 +50,160 @@ RAYDIUM_AMM_ADDRESS = "5Q544fKrFoe6tsEbD7S8EmxGTJYAKtTVhAW5Q5pge4j1"
 TRACK_BURNS = os.getenv("TRACK_BURNS") == "True"
 logging.info(f"Track burns: {TRACK_BURNS}")
 
-# Redis connection
-redis_client = Redis(host=os.getenv("REDIS_HOST"), port=os.getenv("REDIS_PORT"), db=os.getenv("REDIS_DB"), decode_responses=True)
-
-# Redis health task
-failure_count = 0
-def handle_redis_failure():
-    global failure_count
-    logging.error("Redis health check failed")
-    failure_count += 1
-    if failure_count >= 5:
-        # emergency exit if redis fails
-        os._exit(1) 
-        
-
-health_task = HealthTask(redis_client, 10, handle_redis_failure)
-Thread(target=health_task.run).start()
+CALLBACK_WORKERS = int(os.getenv("CALLBACK_WORKERS", 16))
+CALLBACK_QUEUE_SIZE = int(os.getenv("CALLBACK_QUEUE_SIZE", 2000))
+CALLBACK_OVERFLOW_POLICY = os.getenv("CALLBACK_OVERFLOW_POLICY", "block")
+METRICS_INTERVAL = int(os.getenv("METRICS_INTERVAL", 30))
+# max signatures replayed per subscription after a reconnect (getSignaturesForAddress gap backfill), 0 disables it
+RECONNECT_BACKFILL_LIMIT = int(os.getenv("RECONNECT_BACKFILL_LIMIT", 1000))
+# the Raydium program subscription mentions every Raydium transaction, a gap replay there is thousands of
+# getTransaction calls for a few seconds of downtime: off by default and never more than the cap
+RAYDIUM_BACKFILL_CAP = 200
+RAYDIUM_BACKFILL_LIMIT = int(os.getenv("RAYDIUM_BACKFILL_LIMIT", 0))
+if RAYDIUM_BACKFILL_LIMIT > RAYDIUM_BACKFILL_CAP:
+    logging.warning(f"RAYDIUM_BACKFILL_LIMIT {RAYDIUM_BACKFILL_LIMIT} is above the cap, replaying at most {RAYDIUM_BACKFILL_CAP}")
+    RAYDIUM_BACKFILL_LIMIT = RAYDIUM_BACKFILL_CAP
+# getTransaction calls per second shared by every gap replay, so a reconnect of many subscriptions can't burst
+backfill_limiter = RateLimiter(float(os.getenv("RECONNECT_BACKFILL_RATE", 20)))
+
+# Shared transaction cache, the raydium and swap handlers often fetch the same signature
+# RPC_TRANSACTION_ENCODING: jsonParsed (default) or base64, base64 responses are smaller and decoded locally (raw_tx.py)
+RPC_TRANSACTION_ENCODING = os.getenv("RPC_TRANSACTION_ENCODING", "jsonParsed")
+transaction_cache.configure(int(os.getenv("TX_CACHE_SIZE", 5000)), float(os.getenv("TX_CACHE_TTL", 120)), RPC_TRANSACTION_ENCODING)
+# Cache misses arriving within RPC_BATCH_WAIT_MS go out as one JSON-RPC batch of up to RPC_BATCH_SIZE (1 disables batching)
+transaction_cache.configure_batching(int(os.getenv("RPC_BATCH_SIZE", 16)), float(os.getenv("RPC_BATCH_WAIT_MS", 3)) / 1000)
+
+# RPC_HTTP_PROVIDERS: comma separated HTTP endpoints, when set every getTransaction is routed over this pool
+# instead of the subscription's own HTTP client, slow calls are hedged to the next best provider
+RPC_HTTP_PROVIDERS = [url.strip() for url in os.getenv("RPC_HTTP_PROVIDERS", "").split(",") if url.strip()]
+rpc_pool = None
+if RPC_HTTP_PROVIDERS:
+    rpc_pool = RpcEndpointPool(
+        RPC_HTTP_PROVIDERS,
+        hedge=os.getenv("RPC_HEDGE", "True") == "True",
+        hedge_min=float(os.getenv("RPC_HEDGE_MIN_MS", 50)) / 1000,
+        rate_limit_cooldown=float(os.getenv("RPC_RATE_LIMIT_COOLDOWN", 5)),
+        wrap=transaction_cache.batched
+    )
+    transaction_cache.configure_pool(rpc_pool)
+
+# Redis outages open the breaker instead of stopping the process: events are spilled to a bounded buffer
+# (a file with PUBLISH_SPILL_PATH, one per shard worker) and published in order once Redis is back
+redis_breaker = CircuitBreaker(
+    "redis",
+    failure_threshold=int(os.getenv("REDIS_BREAKER_FAILURES", 3)),
+    reset_timeout=float(os.getenv("REDIS_BREAKER_RESET", 5))
+)
+PUBLISH_SPILL_PATH = os.getenv("PUBLISH_SPILL_PATH")
+if PUBLISH_SPILL_PATH and os.getenv("SHARD_WORKER_ID"):
+    PUBLISH_SPILL_PATH = f"{PUBLISH_SPILL_PATH}.{os.getenv('SHARD_WORKER_ID')}"
+publish_spill = SpillBuffer(int(os.getenv("PUBLISH_SPILL_SIZE", 500_000)), PUBLISH_SPILL_PATH)
+
+# Events are buffered and flushed to Redis in pipelined batches so the loop never waits on a publish
+# EVENT_OUTPUT_MODE: pubsub (default), streams (XADD to capped streams named after the channels) or both
+EVENT_OUTPUT_MODE = os.getenv("EVENT_OUTPUT_MODE", "pubsub")
+REDIS_STREAM_GROUP = os.getenv("REDIS_STREAM_GROUP", "token-processor")
+publisher = AsyncEventPublisher(
+    AsyncRedis(host=os.getenv("REDIS_HOST"), port=os.getenv("REDIS_PORT"), db=os.getenv("REDIS_DB"), decode_responses=True),
+    batch_size=int(os.getenv("PUBLISH_BATCH_SIZE", 100)),
+    flush_interval=float(os.getenv("PUBLISH_FLUSH_INTERVAL_MS", 5)) / 1000,
+    mode=EVENT_OUTPUT_MODE,
+    stream_maxlen=int(os.getenv("REDIS_STREAM_MAXLEN")) if os.getenv("REDIS_STREAM_MAXLEN") else None,
+    stream_minid_age=int(os.getenv("REDIS_STREAM_MINID_AGE")) if os.getenv("REDIS_STREAM_MINID_AGE") else None,
+    # json (default) or binary (see codec.py) per channel, the token processor only reads json
+    encodings={
+        NEW_PAIRS_CHANNEL: os.getenv("REDIS_NEW_PAIRS_ENCODING", "json"),
+        SWAPS_CHANNEL: os.getenv("REDIS_SWAPS_ENCODING", "json"),
+        BURNS_CHANNEL: os.getenv("REDIS_BURNS_ENCODING", "json"),
+    },
+    breaker=redis_breaker,
+    spill=publish_spill
+)
+for channel, encoding in publisher.encodings.items():
+    if encoding == "binary":
+        logging.warning(f"{channel} is published binary encoded, the token processor only reads json events")
+
+# Redis health task, runs on the event loop next to the listeners (started in main) and drives the breaker
+health_task = HealthTask(publisher.redis_client, 10, redis_breaker)
 
 # Global variables
-last_base = None
-last_quote = None
 subscriptions = {}
+TRACKING_LENGTH = int(os.getenv("TRACKING_LENGTH")) if os.getenv("TRACKING_LENGTH") is not None else 60
+
+# CONSUMER_ROLE: standalone (default, one process does everything), leader (consumes the Raydium logs and
+# assigns new pools to workers) or worker (tracks the swaps of the pools it is assigned), see sharding.py
+CONSUMER_ROLE = consumer_role(os.getenv("CONSUMER_ROLE"))
+shard_coordinator = None
+if CONSUMER_ROLE != "standalone":
+    shard_coordinator = ShardCoordinator(
+        AsyncRedis(host=os.getenv("REDIS_HOST"), port=os.getenv("REDIS_PORT"), db=os.getenv("REDIS_DB"), decode_responses=True),
+        worker_id=os.getenv("SHARD_WORKER_ID"),
+        heartbeat_interval=float(os.getenv("SHARD_HEARTBEAT_INTERVAL", 5)),
+        worker_timeout=float(os.getenv("SHARD_WORKER_TIMEOUT", 15))
+    )
 
-async def swap_callback(ctx: AsyncClient, data: str, target_token: str):
+# New pair detections are claimed once per signature and once per pool account. With NEW_PAIR_DEDUP_REDIS
+# the claims are shared through Redis so several consumer replicas never publish the same pair twice
+new_pair_index = DedupIndex(
+    max_size=int(os.getenv("NEW_PAIR_DEDUP_SIZE", 10_000)),
+    ttl=int(os.getenv("NEW_PAIR_DEDUP_TTL", 3600)),
+    redis_client=publisher.redis_client if os.getenv("NEW_PAIR_DEDUP_REDIS") == "True" else None,
+    prefix="dedup:new_pair:"
+)
+
+# Notification callbacks run on bounded worker pools instead of inside the recv loops
+raydium_queue = CallbackQueue("raydium", CALLBACK_WORKERS, CALLBACK_QUEUE_SIZE, CALLBACK_OVERFLOW_POLICY)
+swap_queue = CallbackQueue("swaps", CALLBACK_WORKERS, CALLBACK_QUEUE_SIZE, CALLBACK_OVERFLOW_POLICY)
+
+# All per-pool swap subscriptions share a small fixed pool of sockets and one HTTP client
+swap_multiplexer = SubscriptionMultiplexer(
+    {
+        "rpc": os.environ.get("WSS_PROVIDER_TRANSACTIONS"),
+        "http": os.environ.get("HTTP_PROVIDER_TRANSACTIONS")
+    },
+    pool_size=int(os.getenv("SWAP_SOCKET_POOL_SIZE", 4)),
+    dispatcher=swap_queue,
+    backfill_limit=RECONNECT_BACKFILL_LIMIT,
+    backfill_limiter=backfill_limiter
+)
+
+# Swaps a pool subscription missed (it starts after the pool's first trades, or the queue dropped frames)
+# are recovered by a backfill job when the subscription starts and again when it ends
+POOL_BACKFILL = os.getenv("POOL_BACKFILL", "True") == "True"
+swap_backfill = SwapBackfill(
+    swap_multiplexer.async_client,
+    lambda event: publisher.publish(SWAPS_CHANNEL, event),
+    CheckpointStore(publisher.redis_client),
+    rate=float(os.getenv("BACKFILL_RATE", 10)),
+    concurrency=int(os.getenv("BACKFILL_CONCURRENCY", 8))
+)
+backfill_tasks = set()
+
+def backfill_done(task: asyncio.Task):
+    backfill_tasks.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        logging.error(f"Backfill failed: {''.join(traceback.format_exception(task.exception()))}")
+
+def start_backfill(job: BackfillJob):
+    task = asyncio.create_task(swap_backfill.run(job))
+    backfill_tasks.add(task)
+    task.add_done_callback(backfill_done)
+
+
+async def swap_callback(ctx: AsyncClient, notification: LogsNotification, target_token: str):
     """Handle swap callback for transactions."""
-    json_data = json.loads(data)
+    value = notification.result.value
 
-    if json_data["result"]["value"]["err"] is not None:
+    if value.err is not None:
         return
     
-    for log in json_data["result"]["value"]["logs"]:
-        if log.startswith("Program log: err:"):
-            return
+    if classify_logs(value.logs).has_error:
+        return
 
     swap_data = None
 
     try:
-        signature = Signature.from_string(json_data["result"]["value"]["signature"])
+        signature = value.signature
         swap_data = await Transaction.get_swap(ctx,signature, target_token)
         
         if swap_data is None:
@@ -84,7 +212,7 @@ async def swap_callback(ctx: AsyncClient, data: str, target_token: str):
         
 
         event = SwapEvent(swap_data)
-        redis_client.publish(str(SWAPS_CHANNEL), str(event))
+        publisher.publish(SWAPS_CHANNEL, event)
         
     except Exception as e:
         logging.error("Error fetching transaction from RPC")
@@ -93,112 +221,143 @@ async def swap_callback(ctx: AsyncClient, data: str, target_token: str):
         return
 
 
-async def callback_raydium(ctx: AsyncClient, data: str):
-    global last_base, last_quote
-    json_data = json.loads(data)
+async def callback_raydium(ctx: AsyncClient, notification: LogsNotification):
+    value = notification.result.value
+
+    if value.err is not None:
+        return
+
+    classified = classify_logs(value.logs)
+
+    if classified.initialize2 is not None and await new_pair_index.claim(f"sig:{value.signature}"):
+        await handle_new_pair(ctx, value.signature, classified.initialize2)
+
+    # ---------------------- Burn instruction ----------------------
+    if TRACK_BURNS and classified.burns:
+        await handle_burns(ctx, value.signature)
+
+
+async def handle_new_pair(ctx: AsyncClient, signature: Signature, initialize2: Initialize2):
+    token_mint_timestamp = initialize2.open_time
+    delta = int(time.time()) - token_mint_timestamp # may be negative if mint is scheduled in the future
+    logging.info("Caught new pair within: " + str(delta) + " seconds of launch") 
+
+    try:
+        transaction = await transaction_cache.fetch(ctx, signature)
+
+    except Exception as e:
+        logging.error(f"Error fetching transaction: {e}")
+        # let the next arrival of this signature (redundant provider, another replica) try again
+        await new_pair_index.release(f"sig:{signature}")
+        return
+    
+    accounts = []
+
+    if raw_tx.is_raw(transaction):
+        accounts = raw_tx.instruction_accounts(transaction, RAYDIUM_PUBLIC_KEY)
+    else:
+        parsed_tx = json.loads(transaction.to_json())
+        for instruction in parsed_tx["result"]["transaction"]["message"]["instructions"]:
+            if instruction["programId"] == RAYDIUM_PUBLIC_KEY_STRING:
+                accounts = instruction["accounts"]
+                break
+
+    if len(accounts) == 0:
+        logging.info("No accounts found")
+        return
     
-    for log in json_data["result"]["value"]["logs"]:
+    else:
+        pool_account = accounts[4]
+        logging.info(f"Pool account: {pool_account}")
+        base = accounts[8]
+        quote = accounts[9]
+        base_pool_account = accounts[10]
+        quote_pool_account = accounts[11]
+
+
+    # Swap base and quote if quote is WRAPPED_SOL_PUBKEY_STRING
+    if base == WRAPPED_SOL_PUBKEY_STRING:
+        base, quote = quote, base
+        logging.info(f"Swapped base and quote: {base} - {quote}")
+        base_pool_account, quote_pool_account = quote_pool_account, base_pool_account
         
-        if json_data["result"]["value"]["err"] is None:
+    logging.info(f"Base Pool: {base_pool_account}")
+    logging.info(f"Quote Pool: {quote_pool_account}")
+
+    if not await new_pair_index.claim(f"pool:{pool_account}"):
+        logging.info(f"{Fore.RED}Pair already exists{Fore.RESET}")
+        return
+
+    logging.info(f"{Fore.GREEN}New pair found: {base} - {quote}{Fore.RESET}")
+
+    response = NewPairEvent(base, quote, base_pool_account, quote_pool_account, token_mint_timestamp)
+    publisher.publish(NEW_PAIRS_CHANNEL, response)
+
+    pool = {"pool_account": pool_account, "base": base, "quote": quote, "signature": str(signature)}
+    if CONSUMER_ROLE == "leader":
+        try:
+            worker = await shard_coordinator.assign(pool_account, pool, time.time() + TRACKING_LENGTH)
+            logging.info(f"Assigned pool {pool_account} to {worker}")
+            return
+        except Exception as e:
+            # Redis is down, track the pool here rather than lose it
+            logging.error(f"Could not assign pool {pool_account}, tracking it locally: {e}")
+    await track_pool(pool, TRACKING_LENGTH)
+
+
+async def track_pool(pool: dict, duration: float):
+    """Subscribe to the swaps of a new pool for `duration` seconds."""
+    pool_account, base, quote = pool["pool_account"], pool["base"], pool["quote"]
+    subscription_key = f"swaps-{base}-{quote}"
+    if subscription_key not in subscriptions:
+        pool_account_filter = RpcTransactionLogsFilterMentions(Pubkey.from_string(pool_account))
+        try:
+            # target_token is the base token in the pair (makes it easier to filter out noise in swap transactions)
+            handler_swaps = await swap_multiplexer.subscribe(pool_account_filter, swap_callback, base)
+        except Exception as e:
+            logging.error(f"Error subscribing to {subscription_key}: {e}")
+            return
+        subscriptions[subscription_key] = handler_swaps
+        asyncio.create_task(unsubscribe_after_timeout(subscription_key, duration=duration))
+        logging.info(f"Subscribed to {subscription_key}")
+        if POOL_BACKFILL:
+            # swaps between the pool's creation and the subscription, the shared seen window drops live duplicates
+            start_backfill(BackfillJob(pool_account, base, until=pool["signature"], seen=handler_swaps.seen))
+    else:
+        logging.info(f"{Fore.RED}Subscription for {subscription_key} already exists{Fore.RESET}")
 
-            sig_string = json_data["result"]["value"]["signature"]
-        
-            if log.startswith("Program log: initialize2"):
-                
-                mint_log_info = log[48:]
-                token_mint_timestamp = mint_log_info.split("open_time: ")[1].split(",")[0]
-                delta = int(time.time()) - int(token_mint_timestamp) # may be negative if mint is scheduled in the future
-                logging.info("Caught new pair within: " + str(delta) + " seconds of launch") 
-
-                signature = Signature.from_string(json_data["result"]["value"]["signature"])
-                try:
-                    transaction = await ctx.get_transaction(signature, max_supported_transaction_version=0, commitment=Confirmed,encoding="jsonParsed")
-
-                except Exception as e:
-                    logging.error(f"Error fetching transaction: {e}")
-                    return
-                
-                tx_str = transaction.to_json()
-                parsed_tx = json.loads(tx_str)
-
-                accounts = []
-
-                for instruction in parsed_tx["result"]["transaction"]["message"]["instructions"]:
-                    if instruction["programId"] == RAYDIUM_PUBLIC_KEY_STRING:
-                        accounts = instruction["accounts"]
-                        break
-
-                if len(accounts) == 0:
-                    logging.info("No accounts found")
-                    return
-                
-                else:
-                    pool_account = accounts[4]
-                    logging.info(f"Pool account: {pool_account}")
-                    base = accounts[8]
-                    quote = accounts[9]
-                    base_pool_account = accounts[10]
-                    quote_pool_account = accounts[11]
-
-
-                # Swap base and quote if quote is WRAPPED_SOL_PUBKEY_STRING
-                if base == WRAPPED_SOL_PUBKEY_STRING:
-                    base, quote = quote, base
-                    logging.info(f"Swapped base and quote: {base} - {quote}")
-                    base_pool_account, quote_pool_account = quote_pool_account, base_pool_account
-                    
-                logging.info(f"Base Pool: {base_pool_account}")
-                logging.info(f"Quote Pool: {quote_pool_account}")
-
-                if base == last_base and quote == last_quote:
-                    logging.info(f"{Fore.RED}Pair already exists{Fore.RESET}")
-                    return
-
-                last_base = base
-                last_quote = quote
-
-                logging.info(f"{Fore.GREEN}New pair found: {base} - {quote}{Fore.RESET}")
-
-                response = NewPairEvent(base, quote, base_pool_account, quote_pool_account, token_mint_timestamp)
-                redis_client.publish(str(NEW_PAIRS_CHANNEL), str(response))
-
-                subscription_key = f"swaps-{base}-{quote}"
-                if subscription_key not in subscriptions:
-                    pool_account_filter = RpcTransactionLogsFilterMentions(Pubkey.from_string(pool_account))
-                    handler_swaps = TransactionSubscriptionHandler({"rpc":os.environ.get("WSS_PROVIDER_TRANSACTIONS"), "http":os.environ.get("HTTP_PROVIDER_TRANSACTIONS")}, filter=pool_account_filter)
-                    subscriptions[subscription_key] = handler_swaps
-                    asyncio.create_task(handler_swaps.listen(swap_callback, base)) # target_token is the base token in the pair (makes it easier to filter out noise in swap transactions)
-                    followLen = int(os.getenv("TRACKING_LENGTH")) if os.getenv("TRACKING_LENGTH") is not None else 60
-                    asyncio.create_task(unsubscribe_after_timeout(subscription_key, duration=followLen))
-                    logging.info(f"Subscribed to {subscription_key}")
-                else:
-                    logging.info(f"{Fore.RED}Subscription for {subscription_key} already exists{Fore.RESET}")
-            # ---------------------- Burn instruction ----------------------                    
-            if TRACK_BURNS:
-                if "Burn" in log:
-                    signature = Signature.from_string(json_data["result"]["value"]["signature"])
-                    try:
-                        res = await ctx.get_transaction(signature, max_supported_transaction_version=0, commitment=Confirmed,encoding="jsonParsed")
-                        for instruction in res.value.transaction.meta.inner_instructions:
-                            for i in instruction.instructions:
-                                if type(i)==ParsedInstruction:
-                                    if(i.parsed["type"].find("burn") != -1):
-                                        info = i.parsed.get("info")
-                                        if isinstance(info, dict):
-                                            mint = info.get("mint")
-                                            account = info.get("account")
-                                            authority = info.get("authority")
-                                            amount = info.get("amount")
-                                            publish_data = BurnEvent(mint, account, authority, amount, res.value.block_time)
-                                        else:
-                                            logging.warning("Invalid 'info' format")
-                                            return
-
-                                        redis_client.publish(str(BURNS_CHANNEL),str(publish_data))
-
-                    except Exception as e:
-                        logging.error(f"Error fetching transaction: {e}")
-                        return
+
+async def on_pool_assigned(pool: dict, expires_at: float):
+    """Worker side of sharding, track a pool the leader assigned (or handed over) until its tracking ends."""
+    remaining = expires_at - time.time()
+    if remaining > 0:
+        await track_pool(pool, remaining)
+
+
+async def handle_burns(ctx: AsyncClient, signature: Signature):
+    try:
+        res = await transaction_cache.fetch(ctx, signature)
+        if raw_tx.is_raw(res):
+            for mint, account, authority, amount in raw_tx.burns(res):
+                publisher.publish(BURNS_CHANNEL, BurnEvent(mint, account, authority, amount, res.value.block_time))
+            return
+
+        for instruction in res.value.transaction.meta.inner_instructions:
+            for i in instruction.instructions:
+                if type(i)==ParsedInstruction:
+                    if(i.parsed["type"].find("burn") != -1):
+                        info = i.parsed.get("info")
+                        if isinstance(info, dict):
+                            publish_data = BurnEvent.from_parsed_info(info, res.value.block_time)
+                        else:
+                            logging.warning("Invalid 'info' format")
+                            return
+
+                        publisher.publish(BURNS_CHANNEL, publish_data)
+
+    except Exception as e:
+        logging.error(f"Error fetching transaction: {e}")
+        return
 
 
 async def unsubscribe_after_timeout(subscription_key: str, duration: int):
@@ -208,21 +367,119 @@ async def unsubscribe_after_timeout(subscription_key: str, duration: int):
         handler = subscriptions.pop(subscription_key)
         await handler.unsubscribe()
         logging.info(f"Unsubscribed from {subscription_key} after {duration} seconds")
+        if POOL_BACKFILL and handler.last_signature is not None:
+            # catch up on anything after the last live notification that never made it through
+            start_backfill(BackfillJob(handler.filter.pubkey, handler.args[0], until=handler.last_signature, seen=handler.seen))
+        if shard_coordinator is not None:
+            try:
+                await shard_coordinator.release(str(handler.filter.pubkey))
+            except Exception as e:
+                logging.error(f"Could not release pool {handler.filter.pubkey}: {e}")
+
+
+async def report_metrics(interval: int):
+    """Periodically log queue depth/lag and subscription counts, counters cover the last interval."""
+    while True:
+        await asyncio.sleep(interval)
+        periodic = [raydium_queue, swap_queue, new_pair_index, *transaction_cache.fetchers.values(), publisher, swap_backfill]
+        for queue in (raydium_queue, swap_queue):
+            logging.info(f"Queue {queue.name}: {queue.stats()}")
+        logging.info(f"Swap sockets: {swap_multiplexer.stats()}")
+        logging.info(f"Transaction cache: {transaction_cache.stats()}")
+        logging.info(f"New pair dedup: {new_pair_index.stats()}")
+        for fetcher in transaction_cache.fetchers.values():
+            logging.info(f"RPC batches {fetcher.name}: {fetcher.stats()}")
+        if rpc_pool is not None:
+            logging.info(f"RPC pool: {rpc_pool.stats()}")
+            periodic.append(rpc_pool)
+        if isinstance(subscriptions.get("raydium"), RedundantLogsSubscriptionHandler):
+            logging.info(f"Raydium providers: {subscriptions['raydium'].stats()}")
+            periodic.append(subscriptions["raydium"])
+        logging.info(f"Publisher: {publisher.stats()}")
+        logging.info(f"Swap backfill: {swap_backfill.stats()}")
+        if shard_coordinator is not None:
+            logging.info(f"Shard: {shard_coordinator.stats()}")
+            periodic.append(shard_coordinator)
+        for component in periodic:
+            component.reset_stats()
+
+
+async def shutdown():
+    """Unsubscribe everything, leave the shard and flush the publisher (SIGTERM/SIGINT)."""
+    logging.info("Shutting down")
+    if shard_coordinator is not None:
+        await shard_coordinator.stop()
+    for subscription_key, handler in list(subscriptions.items()):
+        try:
+            await handler.unsubscribe()
+            logging.info(f"Unsubscribed from {subscription_key}")
+        except Exception as e:
+            logging.error(f"Error unsubscribing from {subscription_key}: {e}")
+    subscriptions.clear()
+    # unfinished backfills keep their checkpoints, `swap_backfill.py resume` finishes them
+    for task in list(backfill_tasks):
+        task.cancel()
+    await swap_multiplexer.close()
+    await raydium_queue.close()
+    if rpc_pool is not None:
+        await rpc_pool.close()
+    await publisher.close()
 
 
 async def main():
     """Main entry point for the async tasks."""
     filter_raydium = RpcTransactionLogsFilterMentions(RAYDIUM_PUBLIC_KEY)
-    handler_mint = LogsSubscriptionHandler(
-        {
-            "rpc": os.getenv("WSS_MAINNET"),
-            "http": os.getenv("HTTP_PROVIDER_MAIN")
-        },
-        filter=filter_raydium
-    )
+    # WSS_MAINNET_PROVIDERS: comma separated websocket urls, subscribes on all of them and keeps the first arrival
+    wss_providers = [url.strip() for url in os.getenv("WSS_MAINNET_PROVIDERS", "").split(",") if url.strip()]
+    if wss_providers:
+        handler_mint = RedundantLogsSubscriptionHandler(
+            [{"rpc": url, "http": os.getenv("HTTP_PROVIDER_MAIN")} for url in wss_providers],
+            filter=filter_raydium,
+            dispatcher=raydium_queue,
+            window=int(os.getenv("INGEST_DEDUP_WINDOW", 60))
+        )
+    else:
+        handler_mint = LogsSubscriptionHandler(
+            {
+                "rpc": os.getenv("WSS_MAINNET"),
+                "http": os.getenv("HTTP_PROVIDER_MAIN")
+            },
+            filter=filter_raydium,
+            dispatcher=raydium_queue,
+            backfill_limit=RAYDIUM_BACKFILL_LIMIT,
+            backfill_limiter=backfill_limiter
+        )
     subscriptions["raydium"] = handler_mint
-    mint_task = handler_mint.listen(callback_raydium)
-    await asyncio.gather(mint_task)
+    if EVENT_OUTPUT_MODE != "pubsub":
+        # make sure the downstream group exists before the first XADD so nothing is missed
+        for channel in (NEW_PAIRS_CHANNEL, SWAPS_CHANNEL, BURNS_CHANNEL):
+            await ensure_consumer_group(publisher.redis_client, str(channel), REDIS_STREAM_GROUP)
+    publisher.start()
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, stop.set)
+
+    tasks = [asyncio.create_task(health_task.run()), asyncio.create_task(report_metrics(METRICS_INTERVAL))]
+    if CONSUMER_ROLE == "worker":
+        tasks.append(asyncio.create_task(shard_coordinator.run_worker(on_pool_assigned)))
+    elif CONSUMER_ROLE == "leader":
+        # standby leaders wait for the lease, only the holder consumes the Raydium log stream
+        tasks.append(asyncio.create_task(shard_coordinator.run_leader(lambda: handler_mint.listen(callback_raydium))))
+    else:
+        tasks.append(asyncio.create_task(handler_mint.listen(callback_raydium)))
+
+    stopped = asyncio.create_task(stop.wait())
+    done, _ = await asyncio.wait([stopped, *tasks], return_when=asyncio.FIRST_COMPLETED)
+    for task in done:
+        if task is not stopped and not task.cancelled() and task.exception() is not None:
+            logging.error(f"Task failed, shutting down: {task.exception()}")
+    await shutdown()
+    for task in (stopped, *tasks):
+        task.cancel()
+    await asyncio.gather(stopped, *tasks, return_exceptions=True)
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    # USE_UVLOOP: run on uvloop when it is installed (see supervisor.py for the multi-process mode)
+    run(main, use_uvloop=os.getenv("USE_UVLOOP") == "True")
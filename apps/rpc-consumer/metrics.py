@@ -0,0 +1,53 @@
+"""
+metrics.py
+Per-period counters and histograms behind the components' stats(), read with snapshot() and cleared with reset()
+"""
+
+
+class Counters:
+    """
+    Named counters (and running totals/maxima) for one reporting period, updated as plain attributes:
+    `counters.published += 1`. Reading them never changes them, whoever reports the period calls `reset()`.
+    """
+
+    def __init__(self, *names):
+        self._names = names
+        self.reset()
+
+    def reset(self):
+        for name in self._names:
+            setattr(self, name, 0)
+
+    def snapshot(self):
+        return {name: getattr(self, name) for name in self._names}
+
+    def __repr__(self):
+        return f"Counters({self.snapshot()})"
+
+
+class Histogram:
+    """Fixed bucket histogram, counts accumulate until `reset()`."""
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.reset()
+
+    def reset(self):
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, value):
+        self.count += 1
+        self.total += value
+        for i, bound in enumerate(self.bounds):
+            if value <= bound:
+                self.counts[i] += 1
+                return
+        self.counts[-1] += 1
+
+    def snapshot(self):
+        buckets = {f"<={bound}": count for bound, count in zip(self.bounds, self.counts) if count}
+        if self.counts[-1]:
+            buckets[f">{self.bounds[-1]}"] = self.counts[-1]
+        return {"count": self.count, "avg": round(self.total / self.count, 2) if self.count else 0.0, "buckets": buckets}
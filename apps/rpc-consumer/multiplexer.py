@@ -0,0 +1,293 @@
+"""
+multiplexer.py
+Runs many logs_subscribe mention filters over a small fixed pool of shared websocket connections
+"""
+
+from solders.rpc.responses import parse_websocket_message, LogsNotification, SubscriptionResult, SubscriptionError
+from solders.rpc.requests import LogsSubscribe, LogsUnsubscribe
+from solders.rpc.config import RpcTransactionLogsConfig
+from websockets.legacy.client import connect as ws_connect
+from solana.rpc.async_api import AsyncClient
+from workers import CallbackQueue
+from classes import transaction_cache, RESUME_WINDOW
+from backfill import replay_gap
+from dedup import SeenWindow
+from helpers import Backoff
+import asyncio, itertools, json, logging, traceback
+
+SUBSCRIBE_TIMEOUT = 10 # seconds to wait for the node to acknowledge a (un)subscribe request
+CONNECT_ATTEMPTS = 3 # connection attempts a subscribe() makes before giving up, the background re-subscribe never gives up
+
+
+class MultiplexedSubscription:
+    """A single logs filter living on one of the shared connections."""
+
+    def __init__(self, connection, filter, callback, args):
+        self.connection = connection
+        self.filter = filter
+        self.callback = callback
+        self.args = args
+        self.subscription_id = None
+        self.running = True
+        self.last_signature = None # resume point for the gap backfill after a reconnect
+        self.seen = SeenWindow(RESUME_WINDOW)
+
+    async def unsubscribe(self):
+        self.running = False
+        await self.connection.unsubscribe(self)
+
+
+class MultiplexedConnection:
+    """One websocket carrying many subscriptions, notifications are routed by subscription id."""
+
+    def __init__(self, url, client, dispatcher, backfill_limit=1000, backfill_limiter=None):
+        self.url = url
+        self.client = client
+        self.dispatcher = dispatcher
+        self.backfill_limit = backfill_limit
+        self.backfill_limiter = backfill_limiter
+        self.backoff = Backoff()
+        self.backfill_tasks = set()
+        self.websocket = None
+        self.handles = [] # every live subscription on this socket, used to re-subscribe after a reconnect
+        self.subscriptions = {} # subscription id -> MultiplexedSubscription
+        self.pending = {} # websocket -> {request id -> future waiting for the node's reply}
+        self.pending_handles = {} # subscribe request id -> handle, registered as soon as the ack is read
+        self.request_ids = itertools.count(1)
+        self.reader_task = None
+        self.resubscribe_task = None
+        self.connect_lock = asyncio.Lock()
+        self.running = True
+
+    async def ensure_connected(self, attempts=None):
+        """Connect the shared socket if it is down, raises ConnectionError after `attempts` failed tries (None: retry while running)."""
+        tries = 0
+        while self.running:
+            # the lock is only held for one attempt, a bounded subscribe() never waits behind an endless retry
+            async with self.connect_lock:
+                if self.websocket is not None and self.websocket.open:
+                    return
+                try:
+                    logging.info(f"Connecting shared socket to {self.url}")
+                    websocket = await ws_connect(self.url)
+                except Exception as e:
+                    error = e
+                else:
+                    self._attach(websocket)
+                    return
+            tries += 1
+            if attempts is not None and tries >= attempts:
+                raise ConnectionError(f"Could not connect to {self.url} after {tries} attempts: {error}")
+            delay = self.backoff.next_delay()
+            logging.error(f"Error connecting to websocket: {error}, retrying in {delay:.1f}s")
+            await asyncio.sleep(delay)
+        raise ConnectionError(f"Shared socket to {self.url} is closed")
+
+    def _attach(self, websocket):
+        self.websocket = websocket
+        self.subscriptions = {} # a fresh socket carries no subscriptions yet
+        self.pending[websocket] = {}
+        self.reader_task = asyncio.create_task(self._read_loop(websocket))
+        if self.handles:
+            self._schedule_resubscribe() # replaced a dropped socket before its reader noticed
+
+    async def _request(self, body):
+        websocket = self.websocket
+        pending = self.pending.get(websocket)
+        if pending is None:
+            raise ConnectionError("Shared socket closed")
+        future = asyncio.get_running_loop().create_future()
+        pending[body.id] = future
+        try:
+            await websocket.send(body.to_json())
+            return await asyncio.wait_for(future, SUBSCRIBE_TIMEOUT)
+        finally:
+            pending.pop(body.id, None)
+
+    async def subscribe(self, handle):
+        await self.ensure_connected(CONNECT_ATTEMPTS)
+        self.handles.append(handle)
+        try:
+            await self._subscribe_handle(handle)
+        except Exception:
+            self.handles.remove(handle)
+            raise
+
+    async def _subscribe_handle(self, handle):
+        request = LogsSubscribe(handle.filter, RpcTransactionLogsConfig(None), next(self.request_ids))
+        self.pending_handles[request.id] = handle
+        try:
+            await self._request(request)
+        finally:
+            self.pending_handles.pop(request.id, None)
+        logging.info(f"Subscribed with id {handle.subscription_id} on {self.url} ({len(self.handles)} on socket)")
+
+    async def unsubscribe(self, handle):
+        if handle in self.handles:
+            self.handles.remove(handle)
+        if self.subscriptions.pop(handle.subscription_id, None) is None:
+            return
+        try:
+            await self._request(LogsUnsubscribe(handle.subscription_id, next(self.request_ids)))
+            logging.info(f"Unsubscribed from {handle.subscription_id}")
+        except Exception as e:
+            logging.error(f"Error unsubscribing from {handle.subscription_id}: {e}")
+
+    async def close(self):
+        self.running = False
+        if self.resubscribe_task is not None:
+            self.resubscribe_task.cancel()
+        for handle in list(self.handles):
+            await handle.unsubscribe()
+        if self.websocket is not None:
+            await self.websocket.close()
+        if self.reader_task is not None:
+            self.reader_task.cancel()
+
+    async def _read_loop(self, websocket):
+        pending = self.pending[websocket]
+        try:
+            async for raw in websocket:
+                await self._dispatch(raw, pending)
+        except asyncio.CancelledError:
+            return
+        except Exception:
+            logging.error(f"Error in shared socket reader: {traceback.format_exc()}")
+
+        self.pending.pop(websocket, None)
+        for future in pending.values():
+            if not future.done():
+                future.set_exception(ConnectionError("Shared socket closed"))
+        # a subscribe() may already have replaced this socket, its new state is not ours to wipe
+        if websocket is self.websocket and self.running:
+            self.subscriptions = {}
+            self._schedule_resubscribe()
+
+    def _schedule_resubscribe(self):
+        if self.resubscribe_task is None or self.resubscribe_task.done():
+            self.resubscribe_task = asyncio.create_task(self._resubscribe())
+
+    async def _resubscribe(self):
+        """Re-subscribe every handle missing from the current socket, retrying with the back-off until all are live or unsubscribed."""
+        while self.running:
+            missing = [handle for handle in self.handles if self.subscriptions.get(handle.subscription_id) is not handle]
+            if not missing and self.websocket is not None and self.websocket.open:
+                self.backoff.reset()
+                return
+            delay = self.backoff.next_delay()
+            logging.info(f"Re-subscribing {len(missing)} filters on {self.url} in {delay:.1f}s")
+            await asyncio.sleep(delay)
+            try:
+                await self.ensure_connected()
+            except ConnectionError:
+                continue # closed meanwhile
+            for handle in missing:
+                if handle not in self.handles or self.subscriptions.get(handle.subscription_id) is handle:
+                    continue # unsubscribed, or re-subscribed by a subscribe() that raced the reconnect
+                try:
+                    await self._subscribe_handle(handle)
+                except Exception as e:
+                    logging.error(f"Error re-subscribing filter: {e}")
+                    continue
+                if handle not in self.handles:
+                    await self.unsubscribe(handle) # unsubscribed while the ack was in flight
+                elif handle.last_signature is not None:
+                    self._start_backfill(handle)
+
+    def _start_backfill(self, handle):
+        account = getattr(handle.filter, "pubkey", None)
+        if account is None or self.backfill_limit <= 0:
+            return
+        task = asyncio.create_task(self._backfill(handle, account, handle.last_signature))
+        self.backfill_tasks.add(task)
+        task.add_done_callback(self.backfill_tasks.discard)
+
+    async def _backfill(self, handle, account, until):
+        async def dispatch(notification):
+            if not handle.running or handle.seen.first_seen(notification.result.value.signature) is not None:
+                return False # unsubscribed meanwhile or delivered live after the reconnect
+            return await self.dispatcher.put(handle.callback, self.client, notification, *handle.args)
+
+        try:
+            replayed = await replay_gap(self.client, account, until, dispatch, transaction_cache.fetch, handle.subscription_id or 0,
+                                        self.backfill_limit, limiter=self.backfill_limiter)
+            logging.info(f"Backfilled {replayed} notifications for {account} missed while reconnecting")
+        except Exception:
+            logging.error(f"Error backfilling {account}: {traceback.format_exc()}")
+
+    async def _dispatch(self, raw, pending):
+        try:
+            messages = parse_websocket_message(raw)
+        except Exception:
+            # logsUnsubscribe acks ({"result": true}) are not understood by the solders parser
+            message = json.loads(raw)
+            future = pending.get(message.get("id"))
+            if future is not None and not future.done():
+                future.set_result(message.get("result"))
+            return
+
+        for message in messages:
+            if isinstance(message, LogsNotification):
+                handle = self.subscriptions.get(message.subscription)
+                if handle is not None and handle.running:
+                    signature = message.result.value.signature
+                    if handle.seen.first_seen(signature) is not None:
+                        continue # already replayed by a backfill
+                    handle.last_signature = signature
+                    await self.dispatcher.put(handle.callback, self.client, message, *handle.args)
+            elif isinstance(message, (SubscriptionResult, SubscriptionError)):
+                future = pending.get(message.id)
+                if future is None or future.done():
+                    continue
+                if isinstance(message, SubscriptionError):
+                    future.set_exception(Exception(f"Subscription request failed: {message.error}"))
+                else:
+                    # route right away, the first notification can arrive in the same read as the ack
+                    handle = self.pending_handles.get(message.id)
+                    if handle is not None:
+                        handle.subscription_id = message.result
+                        self.subscriptions[message.result] = handle
+                    future.set_result(message.result)
+
+
+class SubscriptionMultiplexer:
+    """
+    Spreads logs subscriptions over at most `pool_size` websocket connections and shares a
+    single HTTP client between all of them, instead of one socket + client per subscription.
+    """
+
+    def __init__(self, url, pool_size=4, dispatcher=None, backfill_limit=1000, backfill_limiter=None):
+        self.url = url["rpc"] if isinstance(url, dict) else url
+        self.url_2 = url.get("http") if isinstance(url, dict) else None
+        self.pool_size = max(1, pool_size)
+        self.backfill_limit = backfill_limit
+        self.backfill_limiter = backfill_limiter
+        self.async_client = AsyncClient(self.url_2 or self.url)
+        self.dispatcher = dispatcher or CallbackQueue("swaps")
+        self.connections = []
+
+    def _pick_connection(self):
+        if len(self.connections) < self.pool_size:
+            connection = MultiplexedConnection(self.url, self.async_client, self.dispatcher, self.backfill_limit, self.backfill_limiter)
+            self.connections.append(connection)
+            return connection
+        return min(self.connections, key=lambda connection: len(connection.handles))
+
+    async def subscribe(self, filter, callback, *args):
+        """Subscribe `filter` on the least loaded socket, `callback(client, notification, *args)` is called per LogsNotification."""
+        connection = self._pick_connection()
+        handle = MultiplexedSubscription(connection, filter, callback, args)
+        await connection.subscribe(handle)
+        return handle
+
+    async def close(self):
+        for connection in self.connections:
+            await connection.close()
+        await self.dispatcher.close()
+        await self.async_client.close()
+
+    def stats(self):
+        return {
+            "connections": len(self.connections),
+            "subscriptions": sum(len(connection.handles) for connection in self.connections),
+        }
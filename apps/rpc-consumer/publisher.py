@@ -0,0 +1,195 @@
+"""
+publisher.py
+Non-blocking event publisher, buffers events and flushes them to Redis in pipelined batches
+"""
+
+from redis.asyncio import Redis as AsyncRedis
+from collections import deque
+from codec import encode_event
+from helpers import CircuitBreaker
+from metrics import Counters, Histogram
+from spill import SpillBuffer
+import asyncio, logging, time, traceback
+
+OUTPUT_MODES = ("pubsub", "streams", "both")
+
+
+class AsyncEventPublisher:
+    """
+    `publish` only appends to an in-memory buffer and returns, so callbacks never wait on Redis.
+    A single flusher task drains the buffer in FIFO order with one pipelined round trip per batch,
+    which keeps per-channel ordering. A batch goes out once it holds `batch_size` events or once
+    the oldest buffered event has waited `flush_interval` seconds.
+
+    In "streams" mode events are XADDed to a capped stream named after the channel instead of being
+    published ("both" does both), trimmed to roughly `stream_maxlen` entries or to the last
+    `stream_minid_age` seconds.
+
+    `encodings` maps a channel to "json" (default, `str(event)`) or "binary" (codec.encode_event).
+
+    Flushes go through `breaker`. While it is open (Redis down) nothing is sent and, with a `spill`
+    buffer, new events are spilled to it instead of growing the buffer. Once anything is spilled every
+    later event is spilled too until the spill has been drained, so events still reach Redis in order:
+    the buffer first, then the spill.
+    """
+
+    def __init__(self, redis_client: AsyncRedis, batch_size=100, flush_interval=0.005, max_buffer=100_000,
+                 mode="pubsub", stream_maxlen=None, stream_minid_age=None, encodings=None,
+                 breaker: CircuitBreaker = None, spill: SpillBuffer = None):
+        if mode not in OUTPUT_MODES:
+            raise ValueError(f"Unknown output mode {mode}, expected one of {OUTPUT_MODES}")
+        self.redis_client = redis_client
+        self.mode = mode
+        self.stream_maxlen = stream_maxlen
+        self.stream_minid_age = stream_minid_age
+        self.encodings = {str(channel): encoding for channel, encoding in (encodings or {}).items()}
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_buffer = max_buffer
+        self.buffer = deque() # (channel, payload, enqueued_at)
+        self.has_data = asyncio.Event()
+        self.batch_ready = asyncio.Event()
+        self.running = False
+        self.task = None
+        self.breaker = breaker or CircuitBreaker("redis")
+        self.spill = spill
+
+        self.counters = Counters("published", "dropped", "errors", "spilled", "drained")
+        self.latency_ms = Histogram((1, 2, 5, 10, 25, 50, 100, 250, 500, 1000))
+        self.batch_sizes = Histogram((1, 2, 4, 8, 16, 32, 64, 128, 256, 512))
+
+    def publish(self, channel, event):
+        """Queue `event` for `channel`, never blocks."""
+        channel = str(channel)
+        payload = encode_event(event) if self.encodings.get(channel) == "binary" else str(event)
+        if self.spill is not None and (self.spill or not self.breaker.closed or len(self.buffer) >= self.max_buffer):
+            if self.spill.append(channel, payload):
+                self.counters.spilled += 1
+            else:
+                self.counters.dropped += 1
+            self.has_data.set()
+            return
+        if len(self.buffer) >= self.max_buffer:
+            self.buffer.popleft()
+            self.counters.dropped += 1
+        self.buffer.append((channel, payload, time.monotonic()))
+        self.has_data.set()
+        if len(self.buffer) >= self.batch_size:
+            self.batch_ready.set()
+
+    def start(self):
+        self.running = True
+        self.task = asyncio.create_task(self.run())
+        return self.task
+
+    def _pending(self):
+        return bool(self.buffer) or bool(self.spill)
+
+    async def run(self):
+        # once stopped, keep flushing only while Redis takes it, close() keeps the rest in the spill
+        while self.running or (self._pending() and self.breaker.closed):
+            if not self._pending():
+                self.has_data.clear()
+                await self.has_data.wait()
+                continue
+
+            if not self.breaker.allow():
+                if self.running:
+                    # the health task may close the breaker before the reset timeout
+                    await asyncio.sleep(min(max(self.breaker.retry_in(), 0.05), 1.0))
+                continue
+
+            if not self.buffer:
+                await self._flush_spill()
+                continue
+
+            remaining = self.buffer[0][2] + self.flush_interval - time.monotonic()
+            if len(self.buffer) < self.batch_size and remaining > 0 and self.running:
+                self.batch_ready.clear()
+                try:
+                    await asyncio.wait_for(self.batch_ready.wait(), remaining)
+                except asyncio.TimeoutError:
+                    pass
+
+            await self._flush()
+
+    def _trim_args(self):
+        if self.stream_minid_age is not None:
+            # stream ids start with the ms timestamp, so MINID trims everything older than the age
+            return {"minid": f"{int((time.time() - self.stream_minid_age) * 1000)}-0", "approximate": True}
+        if self.stream_maxlen is not None:
+            return {"maxlen": self.stream_maxlen, "approximate": True}
+        return {}
+
+    async def _send(self, batch):
+        """One pipelined round trip for `batch` of (channel, payload, ...), the outcome feeds the breaker."""
+        trim = self._trim_args() if self.mode != "pubsub" else None
+        try:
+            async with self.redis_client.pipeline(transaction=False) as pipe:
+                for channel, payload, *_ in batch:
+                    if self.mode != "streams":
+                        pipe.publish(channel, payload)
+                    if self.mode != "pubsub":
+                        pipe.xadd(channel, {"event": payload}, **trim)
+                await pipe.execute()
+        except Exception:
+            self.counters.errors += 1
+            self.breaker.record_failure()
+            logging.error(f"Error publishing batch of {len(batch)} events: {traceback.format_exc()}")
+            return False
+        self.breaker.record_success()
+        return True
+
+    async def _flush_spill(self):
+        batch, token = self.spill.read(self.batch_size)
+        if await self._send(batch):
+            self.spill.commit(token)
+            self.counters.published += len(batch)
+            self.counters.drained += len(batch)
+        elif self.breaker.closed:
+            await asyncio.sleep(1)
+
+    async def _flush(self):
+        batch = [self.buffer.popleft() for _ in range(min(self.batch_size, len(self.buffer)))]
+        if not await self._send(batch):
+            # put the batch back in front so ordering is kept, then back off before retrying
+            self.buffer.extendleft(reversed(batch))
+            if self.breaker.closed:
+                await asyncio.sleep(1)
+            return
+
+        now = time.monotonic()
+        self.counters.published += len(batch)
+        self.batch_sizes.observe(len(batch))
+        for _, _, enqueued_at in batch:
+            self.latency_ms.observe((now - enqueued_at) * 1000)
+
+    async def close(self):
+        """Flush whatever is still buffered and stop the flusher, with Redis down the buffer goes to the spill."""
+        self.running = False
+        self.has_data.set()
+        self.batch_ready.set()
+        if self.task is not None:
+            await self.task
+        if self.spill is not None:
+            self.spill.prepend([(channel, payload) for channel, payload, _ in self.buffer])
+            self.buffer.clear()
+            if self.spill:
+                logging.warning(f"{len(self.spill)} events left unpublished in the spill buffer")
+            self.spill.close()
+        await self.redis_client.aclose()
+
+    def stats(self):
+        return {
+            "buffered": len(self.buffer),
+            **self.counters.snapshot(),
+            "circuit": self.breaker.state,
+            "spill": len(self.spill) if self.spill is not None else 0,
+            "latency_ms": self.latency_ms.snapshot(),
+            "batch_size": self.batch_sizes.snapshot(),
+        }
+
+    def reset_stats(self):
+        self.counters.reset()
+        self.latency_ms.reset()
+        self.batch_sizes.reset()
@@ -0,0 +1,83 @@
+"""
+raw_tx.py
+Extractors for transactions fetched with encoding="base64", works on compiled instructions and account indices
+"""
+
+from solders.transaction import VersionedTransaction
+from solders.pubkey import Pubkey
+import struct
+
+TOKEN_PROGRAM_IDS = (
+    Pubkey.from_string("TokenkegQfeZyiNwAJbNbGKPFXCWuBvf9Ss623VQ5DA"),
+    Pubkey.from_string("TokenzQdBNbLqP5VEhdkAS6EPFLC1PHnBqCXEpPxuEb"), # token-2022 keeps the same burn layout
+)
+BURN_TAGS = (8, 15) # Burn { amount: u64 }, BurnChecked { amount: u64, decimals: u8 }
+AMOUNT = struct.Struct("<Q")
+
+B58_ALPHABET = "123456789ABCDEFGHJKLMNPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz"
+B58_INDEX = {char: index for index, char in enumerate(B58_ALPHABET)}
+
+
+def b58decode(value: str) -> bytes:
+    """Inner instruction data comes back base58 encoded even in the base64 response."""
+    number = 0
+    for char in value:
+        number = number * 58 + B58_INDEX[char]
+    leading_zeros = len(value) - len(value.lstrip("1"))
+    return bytes(leading_zeros) + number.to_bytes((number.bit_length() + 7) // 8, "big")
+
+
+def is_raw(trans_data) -> bool:
+    """True when `trans_data` is a getTransaction response fetched with encoding="base64"."""
+    return isinstance(trans_data.value.transaction.transaction, VersionedTransaction)
+
+
+def account_keys(trans_data) -> list:
+    """
+    Full account list instruction indices point into: the static message keys followed by the
+    writable and then the readonly addresses loaded from lookup tables.
+    """
+    keys = list(trans_data.value.transaction.transaction.message.account_keys)
+    loaded = trans_data.value.transaction.meta.loaded_addresses
+    if loaded is not None:
+        keys.extend(loaded.writable)
+        keys.extend(loaded.readonly)
+    return keys
+
+
+def instruction_accounts(trans_data, program_id: Pubkey) -> list:
+    """Accounts (as strings) of the first top level instruction calling `program_id`, empty when there is none."""
+    message = trans_data.value.transaction.transaction.message
+    keys = account_keys(trans_data)
+    for instruction in message.instructions:
+        if keys[instruction.program_id_index] == program_id:
+            return [str(keys[index]) for index in instruction.accounts]
+    return []
+
+
+def burns(trans_data) -> list:
+    """(mint, account, authority, raw amount) for every token burn in the inner instructions."""
+    inner_instructions = trans_data.value.transaction.meta.inner_instructions
+    if not inner_instructions:
+        return []
+
+    keys = account_keys(trans_data)
+    found = []
+    for inner in inner_instructions:
+        for instruction in inner.instructions:
+            if keys[instruction.program_id_index] not in TOKEN_PROGRAM_IDS:
+                continue
+            data = b58decode(instruction.data)
+            if len(data) < 9 or data[0] not in BURN_TAGS:
+                continue
+            account, mint, authority = (str(keys[index]) for index in instruction.accounts[:3])
+            found.append((mint, account, authority, str(AMOUNT.unpack_from(data, 1)[0])))
+    return found
+
+
+def signer_writable_keys(trans_data) -> list:
+    """Static keys that signed the transaction and are writable, fee payer first."""
+    message = trans_data.value.transaction.transaction.message
+    header = message.header
+    count = header.num_required_signatures - header.num_readonly_signed_accounts
+    return list(message.account_keys[:count])
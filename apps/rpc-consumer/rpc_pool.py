@@ -0,0 +1,179 @@
+"""
+rpc_pool.py
+Pool of HTTP RPC providers, routes get_transaction to the fastest healthy one and hedges slow calls
+"""
+
+from solana.rpc.async_api import AsyncClient
+from solana.rpc.core import RPCException
+from collections import deque
+from metrics import Counters
+import asyncio, httpx, logging, time
+
+WINDOW = 200 # calls kept per endpoint for the rolling figures
+WARMUP_CALLS = 5 # endpoints with fewer samples are preferred so every provider gets measured
+
+
+def is_rate_limited(exc: BaseException) -> bool:
+    """HTTP 429 (possibly wrapped in a SolanaRpcException) or a JSON-RPC rate limit error."""
+    while exc is not None:
+        if isinstance(exc, httpx.HTTPStatusError) and exc.response.status_code == 429:
+            return True
+        if isinstance(exc, RPCException) and ("429" in str(exc) or "rate limit" in str(exc).lower()):
+            return True
+        exc = exc.__cause__
+    return False
+
+
+class RpcEndpoint:
+    """One provider with its rolling latency, error rate and rate limit cooldown."""
+
+    def __init__(self, url, client: AsyncClient, fetcher=None):
+        self.url = url
+        self.client = client
+        self.fetcher = fetcher or client # what get_transaction is called on, e.g. a BatchingFetcher
+        self.latencies = deque(maxlen=WINDOW) # seconds, successful calls only
+        self.outcomes = deque(maxlen=WINDOW) # True for errors
+        self.cooldown_until = 0.0
+        self._sorted = None
+
+        self.counters = Counters("calls", "errors", "rate_limited")
+
+    def record(self, latency, error=False, rate_limited=False):
+        self.counters.calls += 1
+        self.outcomes.append(error)
+        if error:
+            self.counters.errors += 1
+        else:
+            self.latencies.append(latency)
+            self._sorted = None
+        if rate_limited:
+            self.counters.rate_limited += 1
+
+    def percentile(self, fraction):
+        if not self.latencies:
+            return None
+        if self._sorted is None:
+            self._sorted = sorted(self.latencies)
+        return self._sorted[min(len(self._sorted) - 1, int(len(self._sorted) * fraction))]
+
+    @property
+    def error_rate(self):
+        return sum(self.outcomes) / len(self.outcomes) if self.outcomes else 0.0
+
+    def score(self, now):
+        """Lower is better, endpoints cooling down after a rate limit sort last."""
+        if now < self.cooldown_until:
+            return float("inf")
+        if len(self.latencies) < WARMUP_CALLS:
+            return 0.0
+        return self.percentile(0.5) * (1 + 4 * self.error_rate)
+
+    def stats(self):
+        p50, p95 = self.percentile(0.5), self.percentile(0.95)
+        return {
+            **self.counters.snapshot(),
+            "error_rate": round(self.error_rate, 3),
+            "p50_ms": round(p50 * 1000, 1) if p50 is not None else None,
+            "p95_ms": round(p95 * 1000, 1) if p95 is not None else None,
+            "cooling_down": time.monotonic() < self.cooldown_until,
+        }
+
+
+class RpcEndpointPool:
+    """
+    Drop-in for `AsyncClient.get_transaction` over several providers. Each call goes to the endpoint
+    with the lowest rolling median latency (weighted by its error rate); a call still running after
+    that endpoint's p95 is hedged to the runner-up and whichever answers first wins. A call that fails
+    outright is retried once on the runner-up. Rate limited endpoints sit out `rate_limit_cooldown`.
+
+    `wrap(client)` may return the object calls are made on per endpoint (the transaction cache passes
+    its batching fetcher factory).
+    """
+
+    def __init__(self, urls, hedge=True, hedge_min=0.05, hedge_default=0.25, rate_limit_cooldown=5.0, wrap=None):
+        if not urls:
+            raise ValueError("RpcEndpointPool needs at least one url")
+        self.endpoints = []
+        for url in urls:
+            client = AsyncClient(url)
+            self.endpoints.append(RpcEndpoint(url, client, wrap(client) if wrap is not None else None))
+        self.hedge = hedge
+        self.hedge_min = hedge_min
+        self.hedge_default = hedge_default
+        self.rate_limit_cooldown = rate_limit_cooldown
+
+        self.counters = Counters("hedged", "hedge_wins", "failovers")
+
+    def ranked(self):
+        now = time.monotonic()
+        return sorted(self.endpoints, key=lambda endpoint: endpoint.score(now))
+
+    def deadline(self, endpoint):
+        p95 = endpoint.percentile(0.95)
+        return self.hedge_default if p95 is None else max(self.hedge_min, p95)
+
+    async def _call(self, endpoint, args, kwargs):
+        started = time.monotonic()
+        try:
+            response = await endpoint.fetcher.get_transaction(*args, **kwargs)
+        except asyncio.CancelledError:
+            # lost a hedge race, the elapsed time is a lower bound but keeps a slowing endpoint's median honest
+            endpoint.record(time.monotonic() - started)
+            raise
+        except Exception as e:
+            rate_limited = is_rate_limited(e)
+            if rate_limited:
+                endpoint.cooldown_until = time.monotonic() + self.rate_limit_cooldown
+                logging.warning(f"RPC endpoint {endpoint.url} rate limited, cooling down for {self.rate_limit_cooldown}s")
+            endpoint.record(time.monotonic() - started, error=True, rate_limited=rate_limited)
+            raise
+        endpoint.record(time.monotonic() - started)
+        return response
+
+    async def get_transaction(self, *args, **kwargs):
+        ranked = self.ranked()
+        primary = asyncio.create_task(self._call(ranked[0], args, kwargs))
+        if len(ranked) == 1:
+            return await primary
+
+        tasks = {primary}
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=self.deadline(ranked[0]) if self.hedge else None)
+            if done and primary.exception() is None:
+                return primary.result()
+
+            # primary failed (fail over) or is slower than its p95 (hedge), race the runner-up
+            hedging = not done
+            if hedging:
+                self.counters.hedged += 1
+            else:
+                self.counters.failovers += 1
+                tasks = set()
+            backup = asyncio.create_task(self._call(ranked[1], args, kwargs))
+            tasks.add(backup)
+
+            error = None if hedging else primary.exception()
+            while tasks:
+                done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is backup and hedging:
+                            self.counters.hedge_wins += 1
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def close(self):
+        for endpoint in self.endpoints:
+            await endpoint.client.close()
+
+    def stats(self):
+        return {**self.counters.snapshot(), "endpoints": {endpoint.url: endpoint.stats() for endpoint in self.endpoints}}
+
+    def reset_stats(self):
+        self.counters.reset()
+        for endpoint in self.endpoints:
+            endpoint.counters.reset()
@@ -0,0 +1,245 @@
+"""
+sharding.py
+Sharded pool tracking over several rpc-consumer processes, coordinated through Redis
+
+One leader (holder of a Redis lease) consumes the Raydium log stream and assigns every new pool to a
+live worker by consistent hashing. Workers heartbeat, take assignments from their own Redis list and
+own the swap subscriptions for those pools. When a worker stops heartbeating the leader hands its
+unexpired pools to the remaining workers.
+
+Redis keys (all under `prefix`, "shard:" by default):
+    leader              lease, value is the leader's id, expires unless renewed
+    workers             hash worker id -> last heartbeat (unix time)
+    pools               hash pool account -> JSON assignment (worker, expires_at and the pool payload)
+    queue:<worker id>   list of JSON assignments waiting for that worker
+"""
+
+from redis.asyncio import Redis as AsyncRedis
+from bisect import bisect
+from metrics import Counters
+import asyncio, hashlib, json, logging, os, socket, time, traceback
+
+CONSUMER_ROLES = ("standalone", "leader", "worker")
+
+RENEW_LEASE = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("pexpire", KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+
+def consumer_role(value):
+    """The CONSUMER_ROLE of a process, standalone when unset."""
+    role = (value or "standalone").strip().lower()
+    if role not in CONSUMER_ROLES:
+        raise ValueError(f"Unknown consumer role {value}, expected one of {CONSUMER_ROLES}")
+    return role
+
+
+def default_worker_id():
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+class HashRing:
+    """Consistent hash ring, each node is placed `replicas` times so keys spread evenly."""
+
+    def __init__(self, nodes=(), replicas=64):
+        self.replicas = replicas
+        self.ring = [] # sorted (hash, node)
+        for node in nodes:
+            self.add(node)
+
+    @staticmethod
+    def _hash(value):
+        return int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest(), "big")
+
+    def add(self, node):
+        for replica in range(self.replicas):
+            self.ring.append((self._hash(f"{node}#{replica}"), node))
+        self.ring.sort()
+
+    def node_for(self, key):
+        if not self.ring:
+            return None
+        index = bisect(self.ring, (self._hash(str(key)),)) % len(self.ring)
+        return self.ring[index][1]
+
+
+class ShardCoordinator:
+    def __init__(self, redis_client: AsyncRedis, worker_id=None, prefix="shard:", heartbeat_interval=5, worker_timeout=15, lease_ttl=15):
+        self.redis_client = redis_client
+        self.worker_id = worker_id or default_worker_id()
+        self.prefix = prefix
+        self.heartbeat_interval = heartbeat_interval
+        self.worker_timeout = worker_timeout
+        self.lease_ttl = lease_ttl
+        self.renew_lease = redis_client.register_script(RENEW_LEASE)
+        self.running = True
+        self.is_leader = False
+
+        self.counters = Counters("assigned", "handed_off", "received")
+
+    def key(self, name):
+        return f"{self.prefix}{name}"
+
+    # ------- leader -------
+
+    async def live_workers(self):
+        now = time.time()
+        heartbeats = await self.redis_client.hgetall(self.key("workers"))
+        return sorted(worker for worker, beat in heartbeats.items() if now - float(beat) <= self.worker_timeout)
+
+    async def assign(self, pool_account, payload, expires_at):
+        """Give `pool_account` to a live worker; with none alive it stays unowned until the next rebalance."""
+        workers = await self.live_workers()
+        worker = HashRing(workers).node_for(pool_account)
+        await self._send(pool_account, {"pool": payload, "expires_at": expires_at}, worker)
+        self.counters.assigned += 1
+        return worker
+
+    async def _send(self, pool_account, assignment, worker):
+        assignment["worker"] = worker
+        raw = json.dumps(assignment)
+        async with self.redis_client.pipeline(transaction=True) as pipe:
+            pipe.hset(self.key("pools"), pool_account, raw)
+            if worker is not None:
+                pipe.rpush(self.key(f"queue:{worker}"), raw)
+            await pipe.execute()
+        if worker is None:
+            logging.warning(f"No live workers, pool {pool_account} waits for one to join")
+
+    async def rebalance(self):
+        """Drop dead workers and expired pools, hand the unexpired pools of dead (or no) workers to live ones."""
+        now = time.time()
+        workers = await self.live_workers()
+        dead = [worker for worker in await self.redis_client.hkeys(self.key("workers")) if worker not in workers]
+        if dead:
+            logging.warning(f"Workers stopped heartbeating: {dead}")
+            await self.redis_client.hdel(self.key("workers"), *dead)
+            await self.redis_client.delete(*(self.key(f"queue:{worker}") for worker in dead))
+
+        ring = HashRing(workers)
+        for pool_account, raw in (await self.redis_client.hgetall(self.key("pools"))).items():
+            assignment = json.loads(raw)
+            if assignment["expires_at"] <= now:
+                await self.redis_client.hdel(self.key("pools"), pool_account)
+            elif assignment["worker"] not in workers and workers:
+                await self._send(pool_account, assignment, ring.node_for(pool_account))
+                self.counters.handed_off += 1
+
+    async def run_leader(self, start):
+        """
+        Stand by until the leader lease is won, then run `start()` (the Raydium subscription) and
+        rebalance every heartbeat interval while renewing the lease. Losing the lease stops `start()`.
+        """
+        lease_ms = int(self.lease_ttl * 1000)
+        while self.running:
+            try:
+                won = await self.redis_client.set(self.key("leader"), self.worker_id, nx=True, px=lease_ms)
+            except Exception as e:
+                logging.error(f"Could not reach Redis for the shard leader lease: {e}")
+                won = False
+            if not won:
+                await asyncio.sleep(self.heartbeat_interval)
+                continue
+
+            logging.info(f"{self.worker_id} is the shard leader")
+            self.is_leader = True
+            leader_task = asyncio.create_task(start())
+            last_renewed = time.monotonic()
+            try:
+                while self.running and not leader_task.done():
+                    try:
+                        await self.rebalance()
+                    except Exception as e:
+                        logging.error(f"Error rebalancing shard: {e}")
+                    await asyncio.sleep(self.heartbeat_interval)
+                    try:
+                        if not await self.renew_lease(keys=[self.key("leader")], args=[self.worker_id, lease_ms]):
+                            logging.error(f"{self.worker_id} lost the shard leader lease")
+                            break
+                        last_renewed = time.monotonic()
+                    except Exception as e:
+                        # with Redis unreachable keep leading until the lease would have expired
+                        logging.error(f"Could not renew the shard leader lease: {e}")
+                        if time.monotonic() - last_renewed >= self.lease_ttl:
+                            break
+            except Exception:
+                logging.error(f"Error in shard leader loop: {traceback.format_exc()}")
+            finally:
+                self.is_leader = False
+                leader_task.cancel()
+                if leader_task.done() and not leader_task.cancelled() and leader_task.exception():
+                    logging.error(f"Leader task failed: {leader_task.exception()}")
+
+    # ------- worker -------
+
+    async def heartbeat(self):
+        while self.running:
+            try:
+                await self.redis_client.hset(self.key("workers"), self.worker_id, time.time())
+            except Exception as e:
+                logging.error(f"Shard heartbeat failed: {e}")
+            await asyncio.sleep(self.heartbeat_interval)
+
+    async def run_worker(self, on_assign):
+        """Heartbeat and call `on_assign(pool_payload, expires_at)` for every pool handed to this worker."""
+        heartbeat_task = asyncio.create_task(self.heartbeat())
+        queue = self.key(f"queue:{self.worker_id}")
+        try:
+            resumed = False
+            while self.running:
+                try:
+                    if not resumed:
+                        await self._resume_owned(on_assign)
+                        resumed = True
+                    item = await self.redis_client.blpop([queue], timeout=self.heartbeat_interval)
+                except Exception as e:
+                    # keep tracking the pools already assigned through a Redis outage
+                    logging.error(f"Could not read shard assignments: {e}")
+                    await asyncio.sleep(self.heartbeat_interval)
+                    continue
+                if item is None:
+                    continue
+                assignment = json.loads(item[1])
+                self.counters.received += 1
+                try:
+                    await on_assign(assignment["pool"], assignment["expires_at"])
+                except Exception:
+                    logging.error(f"Error taking over pool: {traceback.format_exc()}")
+        finally:
+            heartbeat_task.cancel()
+
+    async def _resume_owned(self, on_assign):
+        """
+        A worker restarted under the same id (the supervisor's workers are) takes its unexpired pools back
+        before the leader notices it was gone, their queued assignments were consumed by the previous process.
+        """
+        now = time.time()
+        for raw in (await self.redis_client.hgetall(self.key("pools"))).values():
+            assignment = json.loads(raw)
+            if assignment["worker"] == self.worker_id and assignment["expires_at"] > now:
+                try:
+                    await on_assign(assignment["pool"], assignment["expires_at"])
+                except Exception:
+                    logging.error(f"Error resuming pool: {traceback.format_exc()}")
+
+    async def release(self, pool_account):
+        """Forget a pool this worker stopped tracking."""
+        raw = await self.redis_client.hget(self.key("pools"), pool_account)
+        if raw is not None and json.loads(raw)["worker"] == self.worker_id:
+            await self.redis_client.hdel(self.key("pools"), pool_account)
+
+    async def stop(self):
+        """Leave the shard, the leader hands whatever this worker still owned to the others."""
+        self.running = False
+        await self.redis_client.hdel(self.key("workers"), self.worker_id)
+        if self.is_leader:
+            await self.redis_client.delete(self.key("leader"))
+
+    def stats(self):
+        return {"worker_id": self.worker_id, "leader": self.is_leader, **self.counters.snapshot()}
+
+    def reset_stats(self):
+        self.counters.reset()
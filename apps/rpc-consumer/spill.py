@@ -0,0 +1,111 @@
+"""
+spill.py
+Bounded FIFO the publisher spills events to while Redis is unreachable, in memory or backed by a file
+"""
+
+from collections import deque
+from itertools import islice
+import base64, json, logging, os
+
+
+def _encode(channel, payload):
+    if isinstance(payload, bytes):
+        return (json.dumps([channel, base64.b64encode(payload).decode(), True]) + "\n").encode()
+    return (json.dumps([channel, payload]) + "\n").encode()
+
+
+def _decode(line):
+    record = json.loads(line)
+    if len(record) == 3:
+        return record[0], base64.b64decode(record[1])
+    return record[0], record[1]
+
+
+class SpillBuffer:
+    """
+    (channel, payload) records kept in order, at most `max_size` of them (`append` refuses more).
+    With `path` the records are appended to that file instead of memory, so they survive a restart;
+    the file is truncated once it has been drained. A crash half way through a drain replays the file
+    from the start, delivery is at least once.
+
+    Draining is two step: `read(count)` returns the oldest records and a token, `commit(token)`
+    removes them once they were published, so a failed publish leaves them in place.
+    """
+
+    def __init__(self, max_size=100_000, path=None):
+        self.max_size = max_size
+        self.path = path
+        self.memory = deque()
+        self.file = None
+        self.read_offset = 0
+        self.size = 0
+        if path is not None:
+            self.file = open(path, "a+b")
+            self.file.seek(0)
+            self.size = sum(1 for line in self.file if line.strip())
+            if self.size:
+                logging.warning(f"Spill file {path} holds {self.size} events from a previous run, they are published first")
+
+    def __len__(self):
+        return self.size
+
+    def append(self, channel, payload) -> bool:
+        if self.size >= self.max_size:
+            return False
+        if self.file is not None:
+            self.file.write(_encode(channel, payload))
+            self.file.flush()
+        else:
+            self.memory.append((channel, payload))
+        self.size += 1
+        return True
+
+    def read(self, count):
+        if self.file is None:
+            records = list(islice(self.memory, count))
+            return records, (len(records), None)
+
+        self.file.seek(self.read_offset)
+        records = []
+        while len(records) < count:
+            line = self.file.readline()
+            if not line:
+                break
+            if line.strip():
+                records.append(_decode(line))
+        return records, (len(records), self.file.tell())
+
+    def commit(self, token):
+        count, offset = token
+        if self.file is None:
+            for _ in range(count):
+                self.memory.popleft()
+        else:
+            self.read_offset = offset
+        self.size -= count
+        if self.size == 0 and self.file is not None:
+            self.file.truncate(0)
+            self.read_offset = 0
+
+    def prepend(self, records):
+        """Put `records` (older than anything spilled) in front, ignores `max_size` since they were already accepted."""
+        if not records:
+            return
+        if self.file is None:
+            self.memory.extendleft(reversed(records))
+        else:
+            remaining, _ = self.read(self.size)
+            tmp = f"{self.path}.tmp"
+            with open(tmp, "wb") as file:
+                for channel, payload in (*records, *remaining):
+                    file.write(_encode(channel, payload))
+            self.file.close()
+            os.replace(tmp, self.path)
+            self.file = open(self.path, "a+b")
+            self.read_offset = 0
+        self.size += len(records)
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
@@ -0,0 +1,71 @@
+"""
+streams.py
+Consumer group and replay helpers for the Redis Streams output mode
+
+usage:
+    python streams.py create-group <stream> <group> [start_id]   create the group (and stream) if missing
+    python streams.py replay <stream> <group> <from_id>          rewind the group so it re-reads from <from_id>
+    python streams.py info <stream>                              length, first/last ids and group lag
+"""
+
+from redis.asyncio import Redis as AsyncRedis
+from redis.exceptions import ResponseError
+from dotenv import load_dotenv, find_dotenv
+import asyncio, logging, os, sys
+
+
+async def ensure_consumer_group(redis_client: AsyncRedis, stream: str, group: str, start_id: str = "0"):
+    """Create `group` on `stream` (creating the stream too), no-op if the group already exists."""
+    try:
+        await redis_client.xgroup_create(stream, group, id=start_id, mkstream=True)
+        logging.info(f"Created consumer group {group} on {stream} from {start_id}")
+        return True
+    except ResponseError as e:
+        if "BUSYGROUP" not in str(e):
+            raise
+        return False
+
+
+async def replay(redis_client: AsyncRedis, stream: str, group: str, from_id: str):
+    """
+    Rewind `group` so its next `XREADGROUP >` delivers every entry after `from_id`.
+    Entries already trimmed from the stream cannot be replayed.
+    """
+    await ensure_consumer_group(redis_client, stream, group, from_id)
+    await redis_client.xgroup_setid(stream, group, from_id)
+    logging.info(f"Consumer group {group} on {stream} will replay from {from_id}")
+
+
+async def stream_info(redis_client: AsyncRedis, stream: str):
+    info = await redis_client.xinfo_stream(stream)
+    groups = await redis_client.xinfo_groups(stream)
+    return {
+        "length": info["length"],
+        "first_id": info["first-entry"][0] if info["first-entry"] else None,
+        "last_id": info["last-generated-id"],
+        "groups": {group["name"]: {"pending": group["pending"], "last_delivered_id": group["last-delivered-id"], "lag": group.get("lag")} for group in groups},
+    }
+
+
+async def main(args):
+    redis_client = AsyncRedis(host=os.getenv("REDIS_HOST"), port=os.getenv("REDIS_PORT"), db=os.getenv("REDIS_DB"), decode_responses=True)
+    try:
+        if args[0] == "create-group":
+            await ensure_consumer_group(redis_client, args[1], args[2], args[3] if len(args) > 3 else "0")
+        elif args[0] == "replay":
+            await replay(redis_client, args[1], args[2], args[3])
+        elif args[0] == "info":
+            print(await stream_info(redis_client, args[1]))
+        else:
+            print(__doc__)
+    finally:
+        await redis_client.aclose()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    load_dotenv(find_dotenv(".env"))
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(1)
+    asyncio.run(main(sys.argv[1:]))
@@ -0,0 +1,132 @@
+"""
+supervisor.py
+Runs the rpc-consumer as several processes on one host: a shard leader and N workers (see sharding.py),
+each pinned to its own core. Crashed children are restarted with backoff under the same worker id, so
+they take their pools back. SIGTERM/SIGINT are forwarded and every child unsubscribes before exiting.
+
+usage: python supervisor.py [--workers N] [--cpus 0,1,2-5] [--no-leader] [--grace 20]
+"""
+
+from dotenv import load_dotenv, find_dotenv
+from helpers import Backoff
+import argparse, logging, os, signal, socket, subprocess, sys, time
+
+MAIN = os.path.join(os.path.dirname(os.path.abspath(__file__)), "main.py")
+
+logging.basicConfig(level=logging.INFO, format="[Supervisor] %(asctime)s - %(levelname)s - %(message)s")
+
+
+def parse_cpus(value):
+    """"0,2,4-7" -> [0, 2, 4, 5, 6, 7]"""
+    cpus = []
+    for part in value.split(","):
+        start, _, end = part.strip().partition("-")
+        cpus.extend(range(int(start), int(end or start) + 1))
+    return cpus
+
+
+def available_cpus():
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+class Child:
+    """One consumer process, restarted with jittered backoff whenever it exits while the supervisor runs."""
+
+    def __init__(self, name, env, cpu=None):
+        self.name = name
+        self.env = env
+        self.cpu = cpu
+        self.process = None
+        self.backoff = Backoff(base=1, cap=60)
+        self.restart_at = 0.0
+        self.started_at = 0.0
+        self.restarts = 0
+
+    def start(self):
+        self.process = subprocess.Popen([sys.executable, MAIN], env=self.env, cwd=os.path.dirname(MAIN))
+        self.started_at = time.monotonic()
+        if self.cpu is not None and hasattr(os, "sched_setaffinity"):
+            try:
+                os.sched_setaffinity(self.process.pid, {self.cpu})
+            except OSError as e:
+                logging.warning(f"Could not pin {self.name} to cpu {self.cpu}: {e}")
+        logging.info(f"Started {self.name} (pid {self.process.pid}, cpu {self.cpu})")
+
+    def poll(self, now):
+        """Restart the process once its backoff has passed, True while it is running."""
+        if self.process is not None and self.process.poll() is None:
+            return True
+        if self.process is not None:
+            # a child that ran for a while before dying starts over with a short delay
+            if now - self.started_at > 60:
+                self.backoff.reset()
+            self.restart_at = now + self.backoff.next_delay()
+            logging.error(f"{self.name} exited with {self.process.returncode}, restarting in {self.restart_at - now:.1f}s")
+            self.process = None
+            self.restarts += 1
+        if now >= self.restart_at:
+            self.start()
+        return False
+
+    def terminate(self):
+        if self.process is not None and self.process.poll() is None:
+            self.process.send_signal(signal.SIGTERM)
+
+
+class Supervisor:
+    def __init__(self, workers, cpus, leader=True, grace=20.0):
+        host = socket.gethostname()
+        self.grace = grace
+        self.running = True
+        self.children = []
+        slots = (["leader"] if leader else []) + [f"worker-{i}" for i in range(workers)]
+        for index, name in enumerate(slots):
+            env = dict(os.environ)
+            env["CONSUMER_ROLE"] = "leader" if name == "leader" else "worker"
+            # a stable id per slot, a restarted worker resumes the pools it owned (ShardCoordinator._resume_owned)
+            env["SHARD_WORKER_ID"] = f"{host}-{name}"
+            self.children.append(Child(name, env, cpus[index % len(cpus)] if cpus else None))
+
+    def stop(self, signum, frame):
+        logging.info(f"Received signal {signum}, stopping {len(self.children)} processes")
+        self.running = False
+
+    def run(self):
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        while self.running:
+            now = time.monotonic()
+            for child in self.children:
+                child.poll(now)
+            time.sleep(0.5)
+        self.shutdown()
+
+    def shutdown(self):
+        """SIGTERM every child (they unsubscribe and flush), SIGKILL whatever is left after `grace` seconds."""
+        for child in self.children:
+            child.terminate()
+        deadline = time.monotonic() + self.grace
+        for child in self.children:
+            if child.process is None:
+                continue
+            try:
+                child.process.wait(timeout=max(0.0, deadline - time.monotonic()))
+            except subprocess.TimeoutExpired:
+                logging.error(f"{child.name} did not stop within {self.grace}s, killing it")
+                child.process.kill()
+                child.process.wait()
+        logging.info("All processes stopped")
+
+
+if __name__ == "__main__":
+    load_dotenv(find_dotenv(".env"))
+    cpus = available_cpus()
+    parser = argparse.ArgumentParser(description="Run the rpc-consumer as a leader and pinned worker processes")
+    parser.add_argument("--workers", type=int, default=int(os.getenv("SUPERVISOR_WORKERS", max(1, len(cpus) - 1))))
+    parser.add_argument("--cpus", type=parse_cpus, default=os.getenv("SUPERVISOR_CPUS"), help="cores to pin to, e.g. 0,2,4-7 (default: all usable cores)")
+    parser.add_argument("--no-leader", dest="leader", action="store_false", help="workers only, the leader runs elsewhere")
+    parser.add_argument("--grace", type=float, default=20.0, help="seconds children get to unsubscribe before they are killed")
+    args = parser.parse_args()
+    Supervisor(args.workers, args.cpus or cpus, leader=args.leader, grace=args.grace).run()
@@ -0,0 +1,216 @@
+"""
+swap_backfill.py
+Backfill engine for tracked pools: pages getSignaturesForAddress for a pool account, fetches the
+transactions under a rate limit and emits the swaps found as SwapEvents flagged as backfilled.
+Progress is checkpointed in Redis so an interrupted job resumes where it stopped.
+
+usage:
+    python swap_backfill.py run <pool_account> <target_token> [--until SIG] [--before SIG]
+                                [--min-slot N] [--max-slot N] [--rate N] [--concurrency N]
+    python swap_backfill.py resume        finish every job that has an unfinished checkpoint
+    python swap_backfill.py status        list unfinished jobs and their checkpoints
+"""
+
+from solana.rpc.async_api import AsyncClient
+from solders.signature import Signature
+from redis.asyncio import Redis as AsyncRedis
+from dotenv import load_dotenv, find_dotenv
+from classes import Transaction, pubkey_from_string
+from events import SwapEvent
+from backfill import signatures_between
+from helpers import RateLimiter
+from metrics import Counters
+from publisher import AsyncEventPublisher
+import argparse, asyncio, json, logging, os, time, traceback
+
+CHECKPOINT_KEY = "backfill:checkpoints"
+NO_SWAP_ERRORS = ("No swaps detected in transaction", "Target token not found in transaction")
+
+
+def _signature(value):
+    # jobs and checkpoints keep signatures as strings
+    return Signature.from_string(value) if value else None
+
+
+class BackfillJob:
+    """
+    Swaps of `target_token` through `pool_account` between two signatures (both exclusive) and/or
+    slots (both inclusive). A missing lower bound walks back until `limit`, a missing upper bound means now.
+    `seen` (a dedup.SeenWindow) is shared with a live subscription so neither emits a swap twice.
+    """
+
+    def __init__(self, pool_account, target_token, until=None, before=None, min_slot=None, max_slot=None, seen=None):
+        self.pool_account = str(pool_account)
+        self.target_token = str(target_token)
+        self.until = str(until) if until is not None else None
+        self.before = str(before) if before is not None else None
+        self.min_slot = min_slot
+        self.max_slot = max_slot
+        self.seen = seen
+
+    @property
+    def id(self):
+        lower = self.until or (self.min_slot if self.min_slot is not None else "-")
+        upper = self.before or (self.max_slot if self.max_slot is not None else "-")
+        return f"{self.pool_account}:{self.target_token}:{lower}:{upper}"
+
+    def to_dict(self):
+        return {"pool_account": self.pool_account, "target_token": self.target_token, "until": self.until,
+                "before": self.before, "min_slot": self.min_slot, "max_slot": self.max_slot}
+
+    @staticmethod
+    def from_dict(data):
+        return BackfillJob(**data)
+
+
+class CheckpointStore:
+    """Job checkpoints in one Redis hash, job id -> JSON state. Finished jobs are removed."""
+
+    def __init__(self, redis_client: AsyncRedis, key=CHECKPOINT_KEY):
+        self.redis_client = redis_client
+        self.key = key
+
+    async def load(self, job_id):
+        raw = await self.redis_client.hget(self.key, job_id)
+        return json.loads(raw) if raw else None
+
+    async def save(self, job_id, state):
+        await self.redis_client.hset(self.key, job_id, json.dumps(state))
+
+    async def finish(self, job_id):
+        await self.redis_client.hdel(self.key, job_id)
+
+    async def unfinished(self):
+        return {job_id: json.loads(raw) for job_id, raw in (await self.redis_client.hgetall(self.key)).items()}
+
+
+class SwapBackfill:
+    """
+    Runs BackfillJobs. Signatures are processed oldest first in chunks of `chunk_size`; transactions
+    in a chunk are fetched concurrently (at most `concurrency` at once, `rate` per second) through
+    Transaction.get_swap, swaps are handed to `publish(event)` in chain order and the checkpoint
+    moves to the newest signature of the chunk.
+    """
+
+    def __init__(self, client: AsyncClient, publish, checkpoints: CheckpointStore = None, rate=10.0, concurrency=8, chunk_size=100, limit=100_000):
+        self.client = client
+        self.publish = publish
+        self.checkpoints = checkpoints
+        self.limiter = RateLimiter(rate)
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.chunk_size = chunk_size
+        self.limit = limit
+        self.running = set() # job ids, a job is never run twice at the same time
+
+        self.counters = Counters("jobs", "processed", "emitted", "failed")
+
+    async def run(self, job: BackfillJob):
+        if job.id in self.running:
+            return None
+        self.running.add(job.id)
+        try:
+            return await self._run(job)
+        finally:
+            self.running.discard(job.id)
+
+    async def _run(self, job):
+        state = await self.checkpoints.load(job.id) if self.checkpoints else None
+        state = state or {"job": job.to_dict(), "until": job.until, "processed": 0, "emitted": 0}
+
+        statuses = await signatures_between(self.client, pubkey_from_string(job.pool_account),
+                                            until=_signature(state["until"]), before=_signature(job.before),
+                                            limit=self.limit, min_slot=job.min_slot)
+        statuses = [
+            status for status in reversed(statuses)
+            if status.err is None and (job.max_slot is None or status.slot <= job.max_slot)
+        ]
+        logging.info(f"Backfilling {len(statuses)} transactions for pool {job.pool_account}")
+
+        for start in range(0, len(statuses), self.chunk_size):
+            chunk = statuses[start:start + self.chunk_size]
+            swaps = await asyncio.gather(*(self._swap(job, status.signature) for status in chunk))
+            for status, swap in zip(chunk, swaps):
+                # claimed only once decoded, a failed fetch leaves the signature to the live subscription
+                if swap is not None and (job.seen is None or job.seen.first_seen(status.signature) is None):
+                    self.publish(SwapEvent(swap, backfilled=True))
+                    state["emitted"] += 1
+            state["processed"] += len(chunk)
+            state["until"] = str(chunk[-1].signature)
+            state["updated_at"] = time.time()
+            if self.checkpoints:
+                await self.checkpoints.save(job.id, state)
+
+        self.counters.jobs += 1
+        self.counters.processed += state["processed"]
+        self.counters.emitted += state["emitted"]
+        if self.checkpoints:
+            await self.checkpoints.finish(job.id)
+        logging.info(f"Backfill of pool {job.pool_account} done, {state['emitted']} swaps from {state['processed']} transactions")
+        return state
+
+    async def _swap(self, job, signature):
+        if job.seen is not None and job.seen.contains(signature):
+            return None # delivered by the live subscription
+        async with self.semaphore:
+            await self.limiter.acquire()
+            try:
+                return await Transaction.get_swap(self.client, signature, job.target_token)
+            except Exception as e:
+                if str(e) not in NO_SWAP_ERRORS:
+                    self.counters.failed += 1
+                    logging.error(f"Error backfilling {signature}: {traceback.format_exc()}")
+                return None
+
+    def stats(self):
+        return {"running": len(self.running), **self.counters.snapshot()}
+
+    def reset_stats(self):
+        self.counters.reset()
+
+
+async def main(args):
+    redis_client = AsyncRedis(host=os.getenv("REDIS_HOST"), port=os.getenv("REDIS_PORT"), db=os.getenv("REDIS_DB"), decode_responses=True)
+    swaps_channel = os.getenv("REDIS_SWAPS_CHANNEL")
+    publisher = AsyncEventPublisher(
+        AsyncRedis(host=os.getenv("REDIS_HOST"), port=os.getenv("REDIS_PORT"), db=os.getenv("REDIS_DB"), decode_responses=True),
+        mode=os.getenv("EVENT_OUTPUT_MODE", "pubsub"),
+        stream_maxlen=int(os.getenv("REDIS_STREAM_MAXLEN")) if os.getenv("REDIS_STREAM_MAXLEN") else None,
+        encodings={swaps_channel: os.getenv("REDIS_SWAPS_ENCODING", "json")},
+    )
+    client = AsyncClient(os.getenv("HTTP_PROVIDER_TRANSACTIONS") or os.getenv("HTTP_PROVIDER_MAIN"))
+    checkpoints = CheckpointStore(redis_client)
+    engine = SwapBackfill(client, lambda event: publisher.publish(swaps_channel, event), checkpoints, rate=args.rate, concurrency=args.concurrency)
+
+    try:
+        if args.command == "status":
+            for job_id, state in (await checkpoints.unfinished()).items():
+                print(job_id, state)
+            return
+        publisher.start()
+        if args.command == "run":
+            job = BackfillJob(args.pool_account, args.target_token, args.until, args.before, args.min_slot, args.max_slot)
+            await engine.run(job)
+        elif args.command == "resume":
+            for state in (await checkpoints.unfinished()).values():
+                await engine.run(BackfillJob.from_dict(state["job"]))
+    finally:
+        await publisher.close()
+        await redis_client.aclose()
+        await client.close()
+
+
+if __name__ == "__main__":
+    load_dotenv(find_dotenv(".env"))
+    parser = argparse.ArgumentParser(description="Backfill swaps of tracked pools")
+    commands = parser.add_subparsers(dest="command", required=True)
+    run = commands.add_parser("run")
+    run.add_argument("pool_account")
+    run.add_argument("target_token")
+    run.add_argument("--until", help="oldest signature, exclusive")
+    run.add_argument("--before", help="newest signature, exclusive")
+    run.add_argument("--min-slot", type=int)
+    run.add_argument("--max-slot", type=int)
+    for command in (run, commands.add_parser("resume"), commands.add_parser("status")):
+        command.add_argument("--rate", type=float, default=float(os.getenv("BACKFILL_RATE", 10)))
+        command.add_argument("--concurrency", type=int, default=int(os.getenv("BACKFILL_CONCURRENCY", 8)))
+    asyncio.run(main(parser.parse_args()))
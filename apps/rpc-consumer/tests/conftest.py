@@ -0,0 +1,27 @@
+"""
+conftest.py
+Puts the rpc-consumer modules on the import path and holds the fakes shared by the tests
+"""
+
+import os, sys, pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class RecordingDispatcher:
+    """Stands in for a CallbackQueue, keeps every (callback, args) it is handed."""
+
+    def __init__(self):
+        self.calls = []
+
+    async def put(self, callback, *args):
+        self.calls.append((callback, args))
+        return True
+
+    async def close(self):
+        pass
+
+
+@pytest.fixture
+def dispatcher():
+    return RecordingDispatcher()
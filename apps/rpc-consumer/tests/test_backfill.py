@@ -0,0 +1,108 @@
+"""
+test_backfill.py
+Gap replay after a reconnect: paging, oldest-first dispatch and bounded fetch concurrency
+"""
+
+from backfill import signatures_between, replay_gap
+from solders.signature import Signature
+from types import SimpleNamespace
+import asyncio
+
+
+class FakeHistory:
+    """getSignaturesForAddress over `count` signatures, newest first, one slot each."""
+
+    def __init__(self, count, failed=()):
+        self.statuses = [SimpleNamespace(signature=Signature.new_unique(), slot=1000 - i, err="failed" if i in failed else None)
+                         for i in range(count)]
+        self.pages = []
+
+    async def get_signatures_for_address(self, account, before=None, until=None, limit=1000, commitment=None):
+        start = 0 if before is None else next(i for i, status in enumerate(self.statuses) if status.signature == before) + 1
+        stop = len(self.statuses) if until is None else next(i for i, status in enumerate(self.statuses) if status.signature == until)
+        page = self.statuses[start:min(stop, start + limit)]
+        self.pages.append(len(page))
+        return SimpleNamespace(value=page)
+
+
+def transaction(logs):
+    return SimpleNamespace(value=SimpleNamespace(transaction=SimpleNamespace(meta=SimpleNamespace(log_messages=logs))))
+
+
+class FakeLimiter:
+    def __init__(self):
+        self.acquired = 0
+
+    async def acquire(self):
+        self.acquired += 1
+
+
+def test_signatures_are_paged_until_the_resume_point(monkeypatch):
+    monkeypatch.setattr("backfill.PAGE_SIZE", 10)
+
+    async def scenario():
+        history = FakeHistory(35)
+        statuses = await signatures_between(history, "account", until=history.statuses[25].signature, limit=100)
+        assert statuses == history.statuses[:25]
+        assert history.pages == [10, 10, 5]
+
+    asyncio.run(scenario())
+
+
+def test_signatures_stop_at_the_limit_and_min_slot():
+    async def scenario():
+        history = FakeHistory(50)
+        assert len(await signatures_between(history, "account", limit=20)) == 20
+        statuses = await signatures_between(history, "account", min_slot=990)
+        assert [status.slot for status in statuses] == list(range(1000, 989, -1))
+
+    asyncio.run(scenario())
+
+
+def test_replay_dispatches_oldest_first_and_skips_failures():
+    async def scenario():
+        history = FakeHistory(6, failed={2})
+        until = history.statuses[5].signature
+        missing = history.statuses[1].signature
+
+        async def fetch(client, signature):
+            if signature == missing:
+                raise RuntimeError("not available")
+            return transaction([f"log {signature}"])
+
+        dispatched = []
+
+        async def dispatch(notification):
+            dispatched.append(notification.result.value.signature)
+            return True
+
+        replayed = await replay_gap(history, "account", until, dispatch, fetch, subscription_id=7)
+        assert replayed == 3
+        assert dispatched == [history.statuses[i].signature for i in (4, 3, 0)]
+
+    asyncio.run(scenario())
+
+
+def test_replay_fetches_are_bounded_and_rate_limited():
+    async def scenario():
+        history = FakeHistory(40)
+        limiter = FakeLimiter()
+        in_flight, peak = 0, 0
+
+        async def fetch(client, signature):
+            nonlocal in_flight, peak
+            in_flight += 1
+            peak = max(peak, in_flight)
+            await asyncio.sleep(0.001)
+            in_flight -= 1
+            return transaction([])
+
+        async def dispatch(notification):
+            return True
+
+        replayed = await replay_gap(history, "account", None, dispatch, fetch, limit=30, concurrency=3, limiter=limiter)
+        assert replayed == 30
+        assert peak == 3
+        assert limiter.acquired == 30
+
+    asyncio.run(scenario())
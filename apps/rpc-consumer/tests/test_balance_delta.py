@@ -0,0 +1,86 @@
+"""
+test_balance_delta.py
+Swap extraction from token balance deltas, and that the maker is the signing wallet
+"""
+
+from solders.rpc.responses import GetTransactionResp
+from solders.signature import Signature
+from solders.pubkey import Pubkey
+from balance_delta import swap_delta, SOLANA_PUB_ADDRESS
+from classes import Transaction
+import json, pytest
+
+AMM_AUTHORITY = "5Q544fKrFoe6tsEbD7S8EmxGTJYAKtTVhAW5Q5pge4j1"
+TOKEN_PROGRAM = "TokenkegQfeZyiNwAJbNbGKPFXCWuBvf9Ss623VQ5DA"
+
+
+def balance(index, mint, owner, amount, decimals=9):
+    ui = amount / 10**decimals
+    return {"accountIndex": index, "mint": mint, "owner": owner, "programId": TOKEN_PROGRAM,
+            "uiTokenAmount": {"amount": str(amount), "decimals": decimals, "uiAmount": ui, "uiAmountString": str(ui)}}
+
+
+def transaction(signers, accounts, pre, post, fee=5000):
+    """jsonParsed getTransaction response, `signers` come first in the account keys (fee payer first)."""
+    keys = [{"pubkey": key, "signer": True, "writable": True, "source": "transaction"} for key in signers]
+    keys += [{"pubkey": key, "signer": False, "writable": True, "source": "transaction"} for key in accounts]
+    keys.append({"pubkey": AMM_AUTHORITY, "signer": False, "writable": False, "source": "transaction"})
+    return GetTransactionResp.from_json(json.dumps({"jsonrpc": "2.0", "id": 1, "result": {
+        "slot": 1, "blockTime": 1726100000,
+        "transaction": {"signatures": [str(Signature.new_unique())],
+                        "message": {"accountKeys": keys, "recentBlockhash": str(Pubkey.new_unique()), "instructions": []}},
+        "meta": {"err": None, "status": {"Ok": None}, "fee": fee,
+                 "preBalances": [0] * len(keys), "postBalances": [0] * len(keys),
+                 "innerInstructions": [], "logMessages": [],
+                 "preTokenBalances": pre, "postTokenBalances": post,
+                 "rewards": [], "loadedAddresses": {"writable": [], "readonly": []}, "computeUnitsConsumed": 0},
+        "version": 0,
+    }}))
+
+
+def transaction_balances(balances):
+    return transaction([str(Pubkey.new_unique())], [], balances, balances).value.transaction.meta.pre_token_balances
+
+
+def test_buy_and_sell_follow_the_amm_wsol_balance():
+    target, wallet = str(Pubkey.new_unique()), str(Pubkey.new_unique())
+    pre = [balance(1, SOLANA_PUB_ADDRESS, AMM_AUTHORITY, 10_000_000_000), balance(2, target, AMM_AUTHORITY, 1_000_000)]
+    bought = [balance(1, SOLANA_PUB_ADDRESS, AMM_AUTHORITY, 11_500_000_000), balance(2, target, AMM_AUTHORITY, 900_000),
+              balance(3, target, wallet, 100_000)]
+    delta = swap_delta(transaction_balances(pre), transaction_balances(bought), Pubkey.from_string(target), Pubkey.from_string(AMM_AUTHORITY))
+    assert (delta.transaction_type, delta.amount_sol) == ("Buy", "1.5")
+
+    sold = [balance(1, SOLANA_PUB_ADDRESS, AMM_AUTHORITY, 9_750_000_000), balance(2, target, AMM_AUTHORITY, 1_100_000)]
+    delta = swap_delta(transaction_balances(pre), transaction_balances(sold), Pubkey.from_string(target), Pubkey.from_string(AMM_AUTHORITY))
+    assert (delta.transaction_type, delta.amount_sol) == ("Sell", "0.25")
+
+
+def test_maker_is_the_fee_paying_signer_in_multi_owner_transactions():
+    target = str(Pubkey.new_unique())
+    fee_payer, co_signer, router, recipient = (str(Pubkey.new_unique()) for _ in range(4))
+    # the router's and the recipient's target balances change first, neither signed the transaction
+    pre = [balance(3, target, router, 500), balance(1, SOLANA_PUB_ADDRESS, AMM_AUTHORITY, 10_000_000_000),
+           balance(2, target, AMM_AUTHORITY, 1_000_000)]
+    post = [balance(3, target, router, 0), balance(4, target, recipient, 100_500),
+            balance(1, SOLANA_PUB_ADDRESS, AMM_AUTHORITY, 10_200_000_000), balance(2, target, AMM_AUTHORITY, 900_000)]
+    trans_data = transaction([fee_payer, co_signer], [router, recipient], pre, post)
+
+    swap = Transaction.swap_from_transaction(trans_data, "sig", target, AMM_AUTHORITY)
+
+    assert str(swap.maker) == fee_payer
+    assert (swap.transaction_type, swap.amount_sol, swap.fee_sol) == ("Buy", "0.2", "0.000005")
+
+
+def test_maker_is_unknown_without_a_writable_signer():
+    target = str(Pubkey.new_unique())
+    post = [balance(1, SOLANA_PUB_ADDRESS, AMM_AUTHORITY, 1), balance(2, target, AMM_AUTHORITY, 1)]
+    trans_data = transaction([], [str(Pubkey.new_unique())], post, post)
+    assert Transaction.swap_from_transaction(trans_data, "sig", target, AMM_AUTHORITY).maker == "Unknown"
+
+
+def test_missing_target_is_an_error():
+    other = str(Pubkey.new_unique())
+    post = [balance(1, SOLANA_PUB_ADDRESS, AMM_AUTHORITY, 1), balance(2, other, AMM_AUTHORITY, 1)]
+    trans_data = transaction([str(Pubkey.new_unique())], [], post, post)
+    with pytest.raises(Exception, match="Target token not found"):
+        Transaction.swap_from_transaction(trans_data, "sig", str(Pubkey.new_unique()), AMM_AUTHORITY)
@@ -0,0 +1,108 @@
+"""
+test_batch_fetch.py
+Micro-batched getTransaction calls: responses matched by id, per-call errors and missing replies
+"""
+
+from solana.rpc.async_api import AsyncClient
+from solana.rpc.core import RPCException, RPCNoResultException
+from solders.signature import Signature
+from batch_fetch import BatchingFetcher
+import asyncio, json, pytest
+
+
+class FakeBatchNode:
+    """Replaces the provider's batch call, `reply(requests)` builds the raw response body."""
+
+    def __init__(self, reply):
+        self.reply = reply
+        self.batches = []
+
+    async def make_batch_request_unparsed(self, bodies):
+        requests = [json.loads(body.to_json()) for body in bodies]
+        self.batches.append(requests)
+        return json.dumps(self.reply(requests))
+
+
+def make_fetcher(reply, max_batch=4):
+    client = AsyncClient("http://127.0.0.1:8899")
+    node = FakeBatchNode(reply)
+    client._provider.make_batch_request_unparsed = node.make_batch_request_unparsed
+    return BatchingFetcher(client, max_batch=max_batch, max_wait=0.01), node
+
+
+async def fetch_all(fetcher, signatures):
+    return await asyncio.gather(*(fetcher.get_transaction(signature, encoding="jsonParsed") for signature in signatures),
+                                return_exceptions=True)
+
+
+def not_found(request):
+    return {"jsonrpc": "2.0", "result": None, "id": request["id"]}
+
+
+def error(request, message="Node is behind"):
+    return {"jsonrpc": "2.0", "error": {"code": -32005, "message": message}, "id": request["id"]}
+
+
+def test_replies_are_matched_by_id_not_by_position():
+    signatures = [Signature.new_unique() for _ in range(4)]
+
+    def reply(requests):
+        # first and third failed, the array comes back reversed
+        return [error(request, f"failed {request['params'][0]}") if i % 2 == 0 else not_found(request)
+                for i, request in enumerate(requests)][::-1]
+
+    async def scenario():
+        fetcher, node = make_fetcher(reply)
+        results = await fetch_all(fetcher, signatures)
+        assert len(node.batches) == 1 and len({request["id"] for request in node.batches[0]}) == 4
+
+        for i, (signature, result) in enumerate(zip(signatures, results)):
+            if i % 2 == 0:
+                assert isinstance(result, RPCException) and str(signature) in str(result)
+            else:
+                assert result.value is None
+
+    asyncio.run(scenario())
+
+
+def test_calls_without_a_reply_fail():
+    signatures = [Signature.new_unique() for _ in range(4)]
+
+    async def scenario():
+        fetcher, _ = make_fetcher(lambda requests: [not_found(request) for request in requests[:2]])
+        results = await fetch_all(fetcher, signatures)
+        assert [result.value for result in results[:2]] == [None, None]
+        assert all(isinstance(result, RPCNoResultException) for result in results[2:])
+
+    asyncio.run(scenario())
+
+
+def test_error_objects_without_data_do_not_break_the_batch():
+    async def scenario():
+        fetcher, _ = make_fetcher(lambda requests: [{"jsonrpc": "2.0", "error": {"code": 429, "message": "Too many requests"}, "id": request["id"]}
+                                                    for request in requests])
+        results = await fetch_all(fetcher, [Signature.new_unique() for _ in range(4)])
+        assert all(isinstance(result, RPCException) and "429" in str(result) for result in results)
+
+    asyncio.run(scenario())
+
+
+def test_a_rejected_batch_fails_every_call():
+    async def scenario():
+        fetcher, _ = make_fetcher(lambda requests: {"jsonrpc": "2.0", "error": {"code": -32600, "message": "batch too large"}, "id": None})
+        results = await fetch_all(fetcher, [Signature.new_unique() for _ in range(4)])
+        assert all(isinstance(result, RPCException) for result in results)
+        assert fetcher.counters.errors == 1
+
+    asyncio.run(scenario())
+
+
+def test_calls_are_split_into_batches_of_max_batch():
+    async def scenario():
+        fetcher, node = make_fetcher(lambda requests: [not_found(request) for request in requests], max_batch=3)
+        results = await fetch_all(fetcher, [Signature.new_unique() for _ in range(6)])
+        assert [len(batch) for batch in node.batches] == [3, 3]
+        assert all(result.value is None for result in results)
+        assert fetcher.stats()["fill_ratio"] == 1.0
+
+    asyncio.run(scenario())
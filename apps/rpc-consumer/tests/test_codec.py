@@ -0,0 +1,68 @@
+"""
+test_codec.py
+Binary event encoding round trips, including burns without an amount
+"""
+
+from codec import encode_event, decode_event, MISSING_AMOUNT
+from events import NewPairEvent, SwapEvent, BurnEvent
+from classes import Transaction
+from solders.signature import Signature
+from solders.pubkey import Pubkey
+import json, pytest, struct
+
+
+def keys(count):
+    return [str(Pubkey.new_unique()) for _ in range(count)]
+
+
+def test_new_pair_round_trip():
+    event = NewPairEvent(*keys(4), block_time=1726100000.0)
+    assert decode_event(encode_event(event)) == json.loads(event.to_json())
+
+
+def test_swap_round_trip_keeps_amounts_and_backfilled_flag():
+    token, maker = keys(2)
+    transaction = Transaction(str(Signature.new_unique()), token, "Sell", maker, "1.234567891", "0.000005", 1726100000.0)
+    decoded = decode_event(encode_event(SwapEvent(transaction, backfilled=True)))
+    assert decoded["data"]["backfilled"] is True
+    assert decoded["data"]["transaction"]["amount_sol"] == "1.234567891"
+    assert decoded["data"]["transaction"]["fee_sol"] == "0.000005"
+    assert decoded["data"]["transaction"]["transaction_type"] == "Sell"
+    assert decoded["data"]["transaction"]["maker"] == maker
+
+
+def test_burn_round_trip():
+    event = BurnEvent(*keys(3), "5000000", block_time=1726100000.0)
+    assert decode_event(encode_event(event)) == json.loads(event.to_json())
+
+
+def test_burn_without_amount_is_encoded_explicitly():
+    event = BurnEvent(*keys(3), None, block_time=1726100000.0)
+    payload = encode_event(event)
+    assert struct.unpack_from("<Q", payload, 2 + 96)[0] == MISSING_AMOUNT
+    assert decode_event(payload)["data"]["amount"] is None
+    assert json.loads(event.to_json())["data"]["amount"] is None
+
+
+def test_unknown_keys_round_trip():
+    event = BurnEvent("Unknown", *keys(2), "1", block_time=0.0)
+    assert decode_event(encode_event(event))["data"]["token"] == "Unknown"
+
+
+def test_unsupported_version_is_rejected():
+    payload = bytearray(encode_event(BurnEvent(*keys(3), "1", block_time=0.0)))
+    payload[0] = 99
+    with pytest.raises(ValueError):
+        decode_event(bytes(payload))
+
+
+def test_burn_checked_amount_comes_from_token_amount():
+    mint, account, authority = keys(3)
+    burn = {"mint": mint, "account": account, "authority": authority, "amount": "42"}
+    burn_checked = {"mint": mint, "account": account, "authority": authority,
+                    "tokenAmount": {"amount": "42", "decimals": 6, "uiAmount": 0.000042, "uiAmountString": "0.000042"}}
+
+    for info in (burn, burn_checked):
+        event = BurnEvent.from_parsed_info(info, 1726100000.0)
+        assert (event.token, event.account, event.authority, event.amount) == (mint, account, authority, "42")
+        assert decode_event(encode_event(event))["data"]["amount"] == "42"
@@ -0,0 +1,178 @@
+"""
+test_dedup.py
+Sliding window dedup, first arrival merging across providers and the new pair claim index
+"""
+
+from dedup import SeenWindow, FirstArrivalDispatcher, DedupIndex, provider_name
+from types import SimpleNamespace
+import asyncio, pytest
+
+
+def notification(signature):
+    return SimpleNamespace(result=SimpleNamespace(value=SimpleNamespace(signature=signature)))
+
+
+def test_seen_window_reports_the_first_sighting():
+    seen = SeenWindow(window=10)
+    assert seen.first_seen("a", "provider-1", now=0) is None
+    assert seen.first_seen("a", "provider-2", now=1) == (0, "provider-1")
+
+
+def test_seen_window_forgets_keys_older_than_the_window():
+    seen = SeenWindow(window=10)
+    seen.first_seen("a", now=0)
+    assert seen.first_seen("b", now=11) is None
+    assert seen.first_seen("a", now=11) is None
+    assert len(seen) == 2
+
+
+def test_seen_window_contains_does_not_record():
+    seen = SeenWindow(window=10)
+    assert not seen.contains("a", now=0)
+    assert seen.first_seen("a", now=0) is None
+    assert seen.contains("a", now=10)
+    assert not seen.contains("a", now=11)
+
+
+def test_seen_window_is_bounded():
+    seen = SeenWindow(window=60, max_size=3)
+    for i, key in enumerate("abcd"):
+        seen.first_seen(key, now=i)
+    assert len(seen) == 3
+    assert seen.first_seen("a", now=5) is None # evicted as the oldest
+
+
+def test_only_the_first_arrival_is_dispatched(dispatcher):
+    async def scenario():
+        merger = FirstArrivalDispatcher(dispatcher)
+        fast, slow = merger.provider("fast"), merger.provider("slow")
+
+        assert await fast.put("callback", "client", notification("sig-1")) is True
+        assert await slow.put("callback", "client", notification("sig-1")) is False
+        assert await slow.put("callback", "client", notification("sig-2")) is True
+        assert await fast.put("callback", "client", SimpleNamespace()) is True # no signature, passed through
+
+        assert len(dispatcher.calls) == 3
+        stats = merger.stats()
+        assert (stats["fast"]["wins"], stats["fast"]["arrivals"]) == (1, 2)
+        assert (stats["slow"]["wins"], stats["slow"]["win_rate"]) == (1, 0.5)
+        assert stats["slow"]["skew_max_ms"] >= 0
+        assert merger.stats() == stats
+
+        merger.reset_stats()
+        assert merger.stats()["fast"]["arrivals"] == 0
+
+    asyncio.run(scenario())
+
+
+def test_provider_name_keeps_keys_out_of_logs():
+    assert provider_name("wss://node.example.com/secret-key?token=abc") == "node.example.com"
+    assert provider_name({"rpc": "https://rpc.example.com/key"}) == "rpc.example.com"
+
+
+class FakeRedis:
+    """SET NX and DELETE shared by every index built on it, or failing with `error`."""
+
+    def __init__(self, error=None):
+        self.keys = {}
+        self.error = error
+
+    async def set(self, key, value, nx=False, ex=None):
+        if self.error is not None:
+            raise self.error
+        if nx and key in self.keys:
+            return None
+        self.keys[key] = (value, ex)
+        return True
+
+    async def delete(self, key):
+        if self.error is not None:
+            raise self.error
+        return int(self.keys.pop(key, None) is not None)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = SimpleNamespace(now=0.0)
+    monkeypatch.setattr("dedup.time", SimpleNamespace(monotonic=lambda: clock.now))
+    return clock
+
+
+def test_index_claims_a_key_once(clock):
+    async def scenario():
+        index = DedupIndex()
+        assert await index.claim("pool:a")
+        assert not await index.claim("pool:a")
+        assert await index.claim("pool:b")
+        assert index.stats() == {"size": 2, "claimed": 2, "duplicates": 1, "remote_duplicates": 0, "redis_errors": 0}
+
+    asyncio.run(scenario())
+
+
+def test_index_claims_expire_after_the_ttl(clock):
+    async def scenario():
+        index = DedupIndex(ttl=10)
+        assert await index.claim("a")
+        clock.now = 9.9
+        assert not await index.claim("a")
+        clock.now = 10
+        assert await index.claim("a")
+
+    asyncio.run(scenario())
+
+
+def test_index_evicts_the_least_recently_claimed(clock):
+    async def scenario():
+        index = DedupIndex(max_size=2)
+        await index.claim("a")
+        await index.claim("b")
+        await index.claim("a") # a duplicate refreshes its recency
+        await index.claim("c")
+        assert list(index.entries) == ["a", "c"]
+        assert await index.claim("b")
+
+    asyncio.run(scenario())
+
+
+def test_index_claims_are_shared_through_redis(clock):
+    async def scenario():
+        redis = FakeRedis()
+        replica_1, replica_2 = DedupIndex(ttl=60, redis_client=redis), DedupIndex(ttl=60, redis_client=redis)
+        assert await replica_1.claim("pool:a")
+        assert not await replica_2.claim("pool:a")
+        assert redis.keys == {"dedup:pool:a": (1, 60)}
+        assert replica_2.stats()["remote_duplicates"] == 1
+        assert not await replica_2.claim("pool:a") # now known locally, Redis is not asked again
+        assert replica_2.stats()["duplicates"] == 1
+
+    asyncio.run(scenario())
+
+
+def test_index_decides_locally_when_redis_fails(clock):
+    async def scenario():
+        index = DedupIndex(redis_client=FakeRedis(error=ConnectionError("refused")))
+        assert await index.claim("a")
+        assert not await index.claim("a")
+        assert index.stats()["redis_errors"] == 1
+
+    asyncio.run(scenario())
+
+
+def test_a_released_claim_can_be_claimed_again(clock):
+    async def scenario():
+        redis = FakeRedis()
+        replica_1, replica_2 = DedupIndex(ttl=60, redis_client=redis), DedupIndex(ttl=60, redis_client=redis)
+        assert await replica_1.claim("sig:a")
+        await replica_1.release("sig:a") # the fetch failed
+        assert redis.keys == {}
+        assert await replica_2.claim("sig:a")
+        await replica_2.release("sig:a")
+        assert await replica_1.claim("sig:a") # the local entry went too
+
+        index = DedupIndex(redis_client=FakeRedis(error=ConnectionError("refused")))
+        assert await index.claim("a")
+        await index.release("a")
+        assert await index.claim("a")
+        assert index.stats()["redis_errors"] == 3
+
+    asyncio.run(scenario())
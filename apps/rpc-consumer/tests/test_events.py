@@ -0,0 +1,61 @@
+"""
+test_events.py
+Slotted events serialize from their fields, with the block time they were given
+"""
+
+from events import Event, NewPairEvent, SwapEvent, BurnEvent
+from classes import Transaction
+from solders.signature import Signature
+from solders.pubkey import Pubkey
+import json, pytest
+
+
+def swap(block_time=1726100000):
+    return Transaction(Signature.new_unique(), Pubkey.new_unique(), "buy", Pubkey.new_unique(), 1.5, 0.000005, block_time)
+
+
+@pytest.mark.parametrize("event", [
+    NewPairEvent("base", "quote", "base pool", "quote pool", block_time=1.0),
+    SwapEvent(swap()),
+    BurnEvent("mint", "account", "authority", "100", block_time=1.0),
+])
+def test_events_keep_no_instance_dict(event):
+    assert not hasattr(event, "__dict__")
+    with pytest.raises(AttributeError):
+        event.unexpected = True
+
+
+def test_str_and_to_json_are_the_same_payload():
+    event = BurnEvent("mint", "account", "authority", "100", block_time=1726100000.5)
+    assert str(event) == event.to_json()
+    assert json.loads(str(event)) == {
+        "event_type": "burn",
+        "data": {"token": "mint", "account": "account", "authority": "authority", "amount": "100", "block_time": 1726100000.5},
+    }
+
+
+def test_the_given_block_time_is_kept():
+    assert NewPairEvent("base", "quote", "base pool", "quote pool", block_time=42).data["block_time"] == 42
+    assert BurnEvent("mint", "account", "authority", 1, block_time=42).block_time == 42
+    assert SwapEvent(swap(block_time=42)).block_time == 42
+
+
+def test_the_block_time_defaults_to_construction_time(monkeypatch):
+    monkeypatch.setattr("events.time.time", lambda: 1000.0)
+    assert NewPairEvent("base", "quote", "base pool", "quote pool").block_time == 1000.0
+    monkeypatch.setattr("events.time.time", lambda: 2000.0)
+    assert BurnEvent("mint", "account", "authority", 1).block_time == 2000.0
+
+
+def test_swap_payload_marks_backfilled_swaps_only():
+    transaction = swap()
+    live, backfilled = json.loads(str(SwapEvent(transaction))), json.loads(str(SwapEvent(transaction, backfilled=True)))
+    assert live["data"] == {"transaction": transaction.to_json()}
+    assert backfilled["data"] == {"transaction": transaction.to_json(), "backfilled": True}
+    with pytest.raises(ValueError):
+        SwapEvent(None)
+
+
+def test_plain_events_round_trip():
+    event = Event("custom", {"key": "value"})
+    assert Event.from_json(event.to_json()) == event
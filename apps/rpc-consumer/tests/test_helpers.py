@@ -0,0 +1,59 @@
+"""
+test_helpers.py
+The event loop entry point (uvloop, and its fallback before asyncio.Runner) and the reconnect backoff
+"""
+
+from helpers import Backoff, run
+from types import ModuleType
+import asyncio, pytest, sys
+
+
+@pytest.fixture
+def fake_uvloop(monkeypatch):
+    """A uvloop module that records which way its loops were asked for."""
+    uvloop = ModuleType("uvloop")
+    uvloop.loops = []
+
+    def new_event_loop():
+        uvloop.loops.append("factory")
+        return asyncio.new_event_loop()
+
+    class EventLoopPolicy(asyncio.DefaultEventLoopPolicy):
+        def new_event_loop(self):
+            uvloop.loops.append("policy")
+            return super().new_event_loop()
+
+    uvloop.new_event_loop = new_event_loop
+    uvloop.EventLoopPolicy = EventLoopPolicy
+    monkeypatch.setitem(sys.modules, "uvloop", uvloop)
+    return uvloop
+
+
+async def answer():
+    return 42
+
+
+def test_run_uses_the_uvloop_loop_factory(fake_uvloop):
+    assert run(answer, use_uvloop=True) == 42
+    assert fake_uvloop.loops == ["factory"]
+
+
+def test_run_falls_back_to_the_loop_policy_without_asyncio_runner(fake_uvloop, monkeypatch):
+    monkeypatch.delattr(asyncio, "Runner")
+    assert run(answer, use_uvloop=True) == 42
+    assert fake_uvloop.loops == ["policy"]
+    assert not isinstance(asyncio.get_event_loop_policy(), fake_uvloop.EventLoopPolicy)
+
+
+def test_run_without_uvloop_installed(monkeypatch):
+    monkeypatch.setitem(sys.modules, "uvloop", None) # import fails
+    assert run(answer, use_uvloop=True) == 42
+    assert run(answer) == 42
+
+
+def test_backoff_is_capped_and_resets(monkeypatch):
+    monkeypatch.setattr("helpers.random.uniform", lambda low, high: high)
+    backoff = Backoff(base=1, cap=10, factor=2)
+    assert [backoff.next_delay() for _ in range(6)] == [1, 2, 4, 8, 10, 10]
+    backoff.reset()
+    assert backoff.next_delay() == 1
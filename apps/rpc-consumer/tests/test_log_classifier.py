@@ -0,0 +1,45 @@
+"""
+test_log_classifier.py
+Single pass classification of Raydium log lines
+"""
+
+from log_classifier import classify_logs
+
+INITIALIZE2 = ("Program log: initialize2: InitializeInstruction2 { nonce: 254, open_time: 1726100000, "
+               "init_pc_amount: 79000000000, init_coin_amount: 206900000000000000 }")
+
+
+def test_initialize2_fields_are_parsed():
+    result = classify_logs(["Program 675kPX9MHTjS2zt1qfr1NYHuzeLXfQM9H24wFSUt1Mp8 invoke [1]", INITIALIZE2])
+    assert result.initialize2.nonce == 254
+    assert result.initialize2.open_time == 1726100000
+    assert result.initialize2.init_pc_amount == 79000000000
+    assert result.initialize2.init_coin_amount == 206900000000000000
+    assert not result.has_error
+
+
+def test_only_the_first_initialize2_is_kept():
+    second = INITIALIZE2.replace("nonce: 254", "nonce: 1")
+    assert classify_logs([INITIALIZE2, second]).initialize2.nonce == 254
+
+
+def test_burns_and_errors_are_collected():
+    result = classify_logs([
+        "Program log: Instruction: Burn",
+        "Program log: Instruction: BurnChecked",
+        "Program log: Instruction: Transfer",
+        "Program log: err: custom program error: 0x1",
+    ])
+    assert result.burns == ["Burn", "BurnChecked"]
+    assert result.errors == ["Program log: err: custom program error: 0x1"]
+    assert result.has_error
+    assert result.initialize2 is None
+
+
+def test_lines_that_only_contain_a_marker_are_ignored():
+    result = classify_logs([
+        "Program data: Program log: Instruction: Burn",
+        "Program log: Instruction: Burnish",
+        "Program log: ray_log: err:",
+    ])
+    assert result.burns == [] and result.errors == []
@@ -0,0 +1,56 @@
+"""
+test_metrics.py
+Counters and histograms only change on explicit reset(), reading stats() twice gives the same answer
+"""
+
+from metrics import Counters, Histogram
+from dedup import DedupIndex
+from workers import CallbackQueue
+import asyncio
+
+
+def test_counters_snapshot_and_reset():
+    counters = Counters("sent", "lag_max")
+    counters.sent += 3
+    counters.lag_max = max(counters.lag_max, 0.5)
+    assert counters.snapshot() == {"sent": 3, "lag_max": 0.5}
+    assert counters.snapshot() == {"sent": 3, "lag_max": 0.5}
+
+    counters.reset()
+    assert counters.snapshot() == {"sent": 0, "lag_max": 0}
+
+
+def test_histogram_snapshot_does_not_reset():
+    histogram = Histogram((1, 10))
+    for value in (0.5, 5, 50):
+        histogram.observe(value)
+    expected = {"count": 3, "avg": 18.5, "buckets": {"<=1": 1, "<=10": 1, ">10": 1}}
+    assert histogram.snapshot() == expected
+    assert histogram.snapshot() == expected
+
+    histogram.reset()
+    assert histogram.snapshot() == {"count": 0, "avg": 0.0, "buckets": {}}
+
+
+def test_component_stats_are_read_only():
+    async def scenario():
+        index = DedupIndex()
+        await index.claim("a")
+        await index.claim("a")
+        assert index.stats() == index.stats() == {"size": 1, "claimed": 1, "duplicates": 1, "remote_duplicates": 0, "redis_errors": 0}
+
+        index.reset_stats()
+        assert index.stats()["claimed"] == 0
+        assert index.stats()["size"] == 1 # state, not a period counter
+
+        queue = CallbackQueue(workers=1)
+        await queue.put(asyncio.sleep, 0)
+        await queue.queue.join()
+        first = queue.stats()
+        assert first == queue.stats()
+        assert first["processed"] == 1
+        queue.reset_stats()
+        assert queue.stats()["processed"] == 0
+        await queue.close()
+
+    asyncio.run(scenario())
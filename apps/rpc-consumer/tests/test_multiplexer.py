@@ -0,0 +1,284 @@
+"""
+test_multiplexer.py
+Routing and reconnect behaviour of the shared websocket connections, against a fake node
+"""
+
+from solders.rpc.requests import LogsUnsubscribe
+from solders.rpc.config import RpcTransactionLogsFilterMentions
+from solders.signature import Signature
+from solders.pubkey import Pubkey
+from helpers import Backoff
+import multiplexer
+import asyncio, json
+
+
+class FakeNode:
+    """Hands out FakeSockets from `connect`, acks every logsSubscribe with a fresh subscription id (or an error while `reject_subscribes`)."""
+
+    def __init__(self, fail_connects=0):
+        self.sockets = []
+        self.subscription_ids = iter(range(100, 1000))
+        self.fail_connects = fail_connects
+        self.connects = 0
+        self.reject_subscribes = 0
+
+    async def connect(self, url):
+        self.connects += 1
+        if self.fail_connects:
+            self.fail_connects -= 1
+            raise OSError("connection refused")
+        socket = FakeSocket(self)
+        self.sockets.append(socket)
+        return socket
+
+
+class FakeSocket:
+    def __init__(self, node):
+        self.node = node
+        self.open = True
+        self.sent = []
+        self.inbox = asyncio.Queue()
+
+    async def send(self, raw):
+        request = json.loads(raw)
+        self.sent.append(request)
+        if request["method"] == "logsSubscribe" and self.node.reject_subscribes:
+            self.node.reject_subscribes -= 1
+            self.push({"jsonrpc": "2.0", "error": {"code": -32602, "message": "Invalid params"}, "id": request["id"]})
+        elif request["method"] == "logsSubscribe":
+            self.push({"jsonrpc": "2.0", "result": next(self.node.subscription_ids), "id": request["id"]})
+        elif request["method"] == "logsUnsubscribe":
+            self.push({"jsonrpc": "2.0", "result": True, "id": request["id"]})
+
+    def push(self, message):
+        self.inbox.put_nowait(json.dumps(message))
+
+    def notify(self, subscription, signature):
+        self.push({"jsonrpc": "2.0", "method": "logsNotification", "params": {
+            "result": {"context": {"slot": 1}, "value": {"signature": str(signature), "err": None, "logs": []}},
+            "subscription": subscription,
+        }})
+
+    def drop(self):
+        self.open = False
+        self.inbox.put_nowait(None)
+
+    async def close(self):
+        self.drop()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        raw = await self.inbox.get()
+        if raw is None:
+            raise StopAsyncIteration
+        return raw
+
+
+async def settle():
+    for _ in range(20):
+        await asyncio.sleep(0)
+
+
+async def wait_for_subscriptions(connection, count):
+    for _ in range(50):
+        if len(connection.subscriptions) == count:
+            return
+        await asyncio.sleep(0.01)
+
+
+def make_connection(monkeypatch, node, dispatcher, backfill_limit=0):
+    monkeypatch.setattr(multiplexer, "ws_connect", node.connect)
+    connection = multiplexer.MultiplexedConnection("wss://node", None, dispatcher, backfill_limit)
+    connection.backoff = Backoff(base=0)
+    return connection
+
+
+def callback(client, notification, *args):
+    pass
+
+
+def test_notifications_are_routed_by_subscription_id(monkeypatch, dispatcher):
+    async def scenario():
+        node = FakeNode()
+        connection = make_connection(monkeypatch, node, dispatcher)
+        first = multiplexer.MultiplexedSubscription(connection, RpcTransactionLogsFilterMentions(Pubkey.new_unique()), callback, ("a",))
+        second = multiplexer.MultiplexedSubscription(connection, RpcTransactionLogsFilterMentions(Pubkey.new_unique()), callback, ("b",))
+        await connection.subscribe(first)
+        await connection.subscribe(second)
+        assert len(node.sockets) == 1
+
+        node.sockets[0].notify(second.subscription_id, Signature.new_unique())
+        node.sockets[0].notify(12345, Signature.new_unique()) # unknown subscription, dropped
+        await settle()
+
+        assert [args[2:] for _, args in connection.dispatcher.calls] == [("b",)]
+        await connection.close()
+
+    asyncio.run(scenario())
+
+
+def test_duplicate_signatures_are_dispatched_once(monkeypatch, dispatcher):
+    async def scenario():
+        node = FakeNode()
+        connection = make_connection(monkeypatch, node, dispatcher)
+        handle = multiplexer.MultiplexedSubscription(connection, RpcTransactionLogsFilterMentions(Pubkey.new_unique()), callback, ())
+        await connection.subscribe(handle)
+
+        signature = Signature.new_unique()
+        node.sockets[0].notify(handle.subscription_id, signature)
+        node.sockets[0].notify(handle.subscription_id, signature)
+        await settle()
+
+        assert len(connection.dispatcher.calls) == 1
+        assert handle.last_signature == signature
+        await connection.close()
+
+    asyncio.run(scenario())
+
+
+def test_dropped_socket_resubscribes_every_filter(monkeypatch, dispatcher):
+    async def scenario():
+        node = FakeNode()
+        connection = make_connection(monkeypatch, node, dispatcher)
+        handles = [multiplexer.MultiplexedSubscription(connection, RpcTransactionLogsFilterMentions(Pubkey.new_unique()), callback, ())
+                   for _ in range(3)]
+        for handle in handles:
+            await connection.subscribe(handle)
+        old_ids = [handle.subscription_id for handle in handles]
+
+        node.fail_connects = 2 # the first reconnect attempts are refused
+        node.sockets[0].drop()
+        await settle()
+        await wait_for_subscriptions(connection, 3)
+
+        assert len(node.sockets) == 2
+        new_ids = [handle.subscription_id for handle in handles]
+        assert set(new_ids).isdisjoint(old_ids)
+        assert set(connection.subscriptions) == set(new_ids)
+        assert connection.backoff.attempts == 0
+
+        node.sockets[1].notify(new_ids[0], Signature.new_unique())
+        node.sockets[1].notify(old_ids[1], Signature.new_unique()) # stale id from the dropped socket
+        await settle()
+        assert len(connection.dispatcher.calls) == 1
+        await connection.close()
+
+    asyncio.run(scenario())
+
+
+def test_rejected_resubscribe_is_retried(monkeypatch, dispatcher):
+    async def scenario():
+        node = FakeNode()
+        connection = make_connection(monkeypatch, node, dispatcher)
+        handles = [multiplexer.MultiplexedSubscription(connection, RpcTransactionLogsFilterMentions(Pubkey.new_unique()), callback, ())
+                   for _ in range(2)]
+        for handle in handles:
+            await connection.subscribe(handle)
+
+        node.reject_subscribes = 1 # the first re-subscribe ack after the reconnect is an error
+        node.sockets[0].drop()
+        await settle()
+        await wait_for_subscriptions(connection, 2)
+
+        assert len(node.sockets) == 2
+        assert set(connection.subscriptions) == {handle.subscription_id for handle in handles}
+        assert connection.backoff.attempts == 0
+        node.sockets[1].notify(handles[0].subscription_id, Signature.new_unique())
+        await settle()
+        assert len(connection.dispatcher.calls) == 1
+        await connection.close()
+
+    asyncio.run(scenario())
+
+
+def test_subscribe_gives_up_when_the_node_is_unreachable(monkeypatch, dispatcher):
+    async def scenario():
+        node = FakeNode(fail_connects=100)
+        connection = make_connection(monkeypatch, node, dispatcher)
+        handle = multiplexer.MultiplexedSubscription(connection, RpcTransactionLogsFilterMentions(Pubkey.new_unique()), callback, ())
+        try:
+            await connection.subscribe(handle)
+        except ConnectionError:
+            pass
+        else:
+            raise AssertionError("subscribe should give up after CONNECT_ATTEMPTS")
+        assert node.connects == multiplexer.CONNECT_ATTEMPTS
+        assert handle not in connection.handles
+
+    asyncio.run(scenario())
+
+
+def test_late_reader_of_a_replaced_socket_keeps_the_new_state(monkeypatch, dispatcher):
+    async def scenario():
+        node = FakeNode()
+        connection = make_connection(monkeypatch, node, dispatcher)
+        first = multiplexer.MultiplexedSubscription(connection, RpcTransactionLogsFilterMentions(Pubkey.new_unique()), callback, ())
+        await connection.subscribe(first)
+
+        old = node.sockets[0]
+        old.open = False # closed, but its reader has not seen the end of the stream yet
+        second = multiplexer.MultiplexedSubscription(connection, RpcTransactionLogsFilterMentions(Pubkey.new_unique()), callback, ())
+        await connection.subscribe(second) # reconnects first
+        await wait_for_subscriptions(connection, 2)
+        new = node.sockets[1]
+        send = new.send
+        new.send = lambda raw: asyncio.sleep(0) # the next request stays pending on the new socket
+        waiting = asyncio.create_task(connection._request(LogsUnsubscribe(12345, 999)))
+        await settle()
+
+        old.drop() # the old reader finishes only now
+        await settle()
+
+        assert len(node.sockets) == 2
+        assert set(connection.subscriptions) == {first.subscription_id, second.subscription_id}
+        assert not waiting.done()
+        waiting.cancel()
+        new.send = send
+        await connection.close()
+
+    asyncio.run(scenario())
+
+
+def test_pending_requests_fail_when_the_socket_drops(monkeypatch, dispatcher):
+    async def scenario():
+        node = FakeNode()
+        connection = make_connection(monkeypatch, node, dispatcher)
+        await connection.ensure_connected()
+        connection.running = False # no reconnect, only the failure path
+        socket = node.sockets[0]
+        socket.send = lambda raw: asyncio.sleep(0) # swallow the request, no ack comes back
+
+        handle = multiplexer.MultiplexedSubscription(connection, RpcTransactionLogsFilterMentions(Pubkey.new_unique()), callback, ())
+        subscribing = asyncio.create_task(connection.subscribe(handle))
+        await settle()
+        socket.drop()
+        try:
+            await subscribing
+        except ConnectionError:
+            pass
+        else:
+            raise AssertionError("subscribe should fail once the socket is gone")
+        assert handle not in connection.handles
+
+    asyncio.run(scenario())
+
+
+def test_unsubscribe_stops_routing(monkeypatch, dispatcher):
+    async def scenario():
+        node = FakeNode()
+        connection = make_connection(monkeypatch, node, dispatcher)
+        handle = multiplexer.MultiplexedSubscription(connection, RpcTransactionLogsFilterMentions(Pubkey.new_unique()), callback, ())
+        await connection.subscribe(handle)
+        subscription_id = handle.subscription_id
+
+        await handle.unsubscribe()
+        node.sockets[0].notify(subscription_id, Signature.new_unique())
+        await settle()
+
+        assert connection.dispatcher.calls == []
+        assert node.sockets[0].sent[-1]["method"] == "logsUnsubscribe"
+        await connection.close()
+
+    asyncio.run(scenario())
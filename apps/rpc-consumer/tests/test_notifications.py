@@ -0,0 +1,32 @@
+"""
+test_notifications.py
+The callbacks read err, signature and logs off the typed logsNotification, the same values the JSON round trip gave
+"""
+
+from solders.rpc.responses import parse_websocket_message, LogsNotification
+from solders.signature import Signature
+import json, os
+
+FIXTURE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks", "fixtures", "logs_notifications.jsonl")
+
+
+def frames():
+    with open(FIXTURE, "r") as file:
+        return [line for line in file if line.strip()]
+
+
+def test_typed_fields_match_the_json_round_trip():
+    for raw in frames():
+        notification, = parse_websocket_message(raw)
+        assert isinstance(notification, LogsNotification)
+        value = notification.result.value
+
+        json_value = json.loads(notification.to_json())["result"]["value"]
+        assert value.signature == Signature.from_string(json_value["signature"])
+        assert value.logs == json_value["logs"]
+        assert (value.err is None) == (json_value["err"] is None)
+
+
+def test_the_corpus_has_failed_and_successful_frames():
+    errors = [parse_websocket_message(raw)[0].result.value.err for raw in frames()]
+    assert any(err is None for err in errors) and any(err is not None for err in errors)
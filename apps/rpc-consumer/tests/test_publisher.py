@@ -0,0 +1,147 @@
+"""
+test_publisher.py
+Batched publishing, output modes, and spilling while the Redis circuit is open
+"""
+
+from publisher import AsyncEventPublisher
+from helpers import CircuitBreaker
+from spill import SpillBuffer
+import asyncio, pytest
+
+
+class FakePipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.commands = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def publish(self, channel, payload):
+        self.commands.append(("publish", channel, payload))
+
+    def xadd(self, stream, fields, **trim):
+        self.commands.append(("xadd", stream, fields["event"]))
+
+    async def execute(self):
+        self.redis.round_trips += 1
+        if self.redis.down:
+            raise ConnectionError("Redis is down")
+        self.redis.commands.extend(self.commands)
+
+
+class FakeRedis:
+    def __init__(self):
+        self.commands = []
+        self.round_trips = 0
+        self.down = False
+        self.closed = False
+
+    def pipeline(self, transaction=False):
+        return FakePipeline(self)
+
+    async def aclose(self):
+        self.closed = True
+
+
+def published(redis):
+    return [payload for command, _, payload in redis.commands if command == "publish"]
+
+
+async def settle(condition, timeout=1.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        assert asyncio.get_running_loop().time() < deadline, "timed out"
+        await asyncio.sleep(0.001)
+
+
+def test_events_go_out_in_order_in_pipelined_batches():
+    async def scenario():
+        redis = FakeRedis()
+        publisher = AsyncEventPublisher(redis, batch_size=10, flush_interval=0.01)
+        publisher.start()
+        for i in range(25):
+            publisher.publish("channel", i)
+        await settle(lambda: len(redis.commands) == 25)
+        await publisher.close()
+        assert published(redis) == [str(i) for i in range(25)]
+        assert redis.round_trips == 3
+        assert redis.closed
+
+    asyncio.run(scenario())
+
+
+def test_both_mode_publishes_and_appends_to_the_stream():
+    async def scenario():
+        redis = FakeRedis()
+        publisher = AsyncEventPublisher(redis, mode="both")
+        publisher.start()
+        publisher.publish("swaps", "event")
+        await publisher.close()
+        assert redis.commands == [("publish", "swaps", "event"), ("xadd", "swaps", "event")]
+
+    asyncio.run(scenario())
+    with pytest.raises(ValueError):
+        AsyncEventPublisher(FakeRedis(), mode="kafka")
+
+
+def test_events_are_spilled_while_the_circuit_is_open_and_drained_in_order():
+    async def scenario():
+        redis = FakeRedis()
+        breaker = CircuitBreaker("redis", failure_threshold=1, reset_timeout=0.05)
+        publisher = AsyncEventPublisher(redis, batch_size=2, flush_interval=0, breaker=breaker, spill=SpillBuffer())
+        publisher.start()
+
+        redis.down = True
+        publisher.publish("channel", "buffered")
+        await settle(lambda: not breaker.closed)
+        for i in range(3):
+            publisher.publish("channel", f"spilled {i}")
+        assert len(publisher.spill) == 3 and list(publisher.buffer)[0][1] == "buffered"
+
+        redis.down = False
+        await settle(lambda: not publisher.spill and not publisher.buffer)
+        publisher.publish("channel", "after")
+        await publisher.close()
+
+        # the buffer goes out before the spill, then new events again through the buffer
+        assert published(redis) == ["buffered", "spilled 0", "spilled 1", "spilled 2", "after"]
+        assert publisher.stats()["spilled"] == 3 and publisher.stats()["drained"] == 3
+
+    asyncio.run(scenario())
+
+
+def test_close_with_redis_down_keeps_everything_in_the_spill(tmp_path):
+    path = str(tmp_path / "spill.jsonl")
+
+    async def scenario():
+        redis = FakeRedis()
+        breaker = CircuitBreaker("redis", failure_threshold=1, reset_timeout=60)
+        publisher = AsyncEventPublisher(redis, batch_size=100, flush_interval=0, breaker=breaker, spill=SpillBuffer(path=path))
+        publisher.start()
+        redis.down = True
+        publisher.publish("channel", "a")
+        await settle(lambda: not breaker.closed)
+        publisher.publish("channel", "b")
+        await asyncio.wait_for(publisher.close(), 3) # after the flusher's back off sleep of at most 1s
+        assert redis.commands == []
+
+    asyncio.run(scenario())
+    spill = SpillBuffer(path=path)
+    assert spill.read(10)[0] == [("channel", "a"), ("channel", "b")]
+    spill.close()
+
+
+def test_a_full_spill_drops_new_events():
+    async def scenario():
+        breaker = CircuitBreaker("redis", failure_threshold=1, reset_timeout=60)
+        breaker.record_failure()
+        publisher = AsyncEventPublisher(FakeRedis(), breaker=breaker, spill=SpillBuffer(max_size=1))
+        publisher.publish("channel", "kept")
+        publisher.publish("channel", "dropped")
+        assert publisher.stats()["spilled"] == 1 and publisher.stats()["dropped"] == 1
+
+    asyncio.run(scenario())
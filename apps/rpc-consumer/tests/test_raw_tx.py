@@ -0,0 +1,78 @@
+"""
+test_raw_tx.py
+Burns and signers read from base64 encoded transactions
+"""
+
+from solders.rpc.responses import GetTransactionResp
+from solders.transaction import VersionedTransaction
+from solders.instruction import Instruction, AccountMeta
+from solders.message import Message
+from solders.keypair import Keypair
+from solders.pubkey import Pubkey
+from solders.hash import Hash
+import raw_tx
+import base64, json, struct
+
+TOKEN_PROGRAM = raw_tx.TOKEN_PROGRAM_IDS[0]
+
+
+def b58encode(data: bytes) -> str:
+    number = int.from_bytes(data, "big")
+    encoded = ""
+    while number:
+        number, remainder = divmod(number, 58)
+        encoded = raw_tx.B58_ALPHABET[remainder] + encoded
+    return "1" * (len(data) - len(data.lstrip(b"\0"))) + encoded
+
+
+def response(payer, inner):
+    """base64 getTransaction response for a transaction signed by `payer`, `inner` are (program index, accounts, data)."""
+    program = Pubkey.new_unique()
+    accounts = [AccountMeta(Pubkey.new_unique(), False, True) for _ in range(3)]
+    message = Message([Instruction(program, b"", accounts), Instruction(TOKEN_PROGRAM, b"", [])], payer.pubkey())
+    transaction = VersionedTransaction(message, [payer])
+    keys = list(message.account_keys)
+    return GetTransactionResp.from_json(json.dumps({"jsonrpc": "2.0", "id": 1, "result": {
+        "slot": 1, "blockTime": 1726100000,
+        "transaction": [base64.b64encode(bytes(transaction)).decode(), "base64"],
+        "meta": {"err": None, "status": {"Ok": None}, "fee": 5000,
+                 "preBalances": [0] * len(keys), "postBalances": [0] * len(keys),
+                 "innerInstructions": [{"index": 0, "instructions": [
+                     {"programIdIndex": keys.index(program_id), "accounts": [keys.index(key) for key in instruction_keys],
+                      "data": b58encode(data), "stackHeight": 2}
+                     for program_id, instruction_keys, data in inner(keys)]}],
+                 "logMessages": [], "preTokenBalances": [], "postTokenBalances": [], "rewards": [],
+                 "loadedAddresses": {"writable": [], "readonly": []}, "computeUnitsConsumed": 0},
+        "version": "legacy",
+    }})), keys
+
+
+def test_b58decode_keeps_leading_zero_bytes():
+    for data in (b"\0\0\x08abc", bytes([15]) + struct.pack("<Q", 2**64 - 1) + b"\x06", b"\x01"):
+        assert raw_tx.b58decode(b58encode(data)) == data
+
+
+def test_burn_and_burn_checked_are_extracted():
+    payer = Keypair()
+
+    def inner(keys):
+        account, mint, authority = keys[1], keys[2], keys[0]
+        return [
+            (TOKEN_PROGRAM, [account, mint, authority], bytes([8]) + struct.pack("<Q", 1_000)),
+            (TOKEN_PROGRAM, [account, mint, authority], bytes([3]) + struct.pack("<Q", 7)), # transfer, skipped
+            (TOKEN_PROGRAM, [account, mint, authority], bytes([15]) + struct.pack("<Q", 2_500) + bytes([6])),
+        ]
+
+    trans_data, keys = response(payer, inner)
+    assert raw_tx.is_raw(trans_data)
+    assert raw_tx.burns(trans_data) == [
+        (str(keys[2]), str(keys[1]), str(keys[0]), "1000"),
+        (str(keys[2]), str(keys[1]), str(keys[0]), "2500"),
+    ]
+
+
+def test_signer_writable_keys_start_with_the_fee_payer():
+    payer = Keypair()
+    trans_data, _ = response(payer, lambda keys: [])
+    assert raw_tx.signer_writable_keys(trans_data) == [payer.pubkey()]
+    assert raw_tx.burns(trans_data) == []
@@ -0,0 +1,115 @@
+"""
+test_rpc_pool.py
+Endpoint ranking, hedging, failover and rate limit cooldown of the RPC provider pool
+"""
+
+from solana.rpc.core import RPCException
+from rpc_pool import RpcEndpointPool, is_rate_limited, WARMUP_CALLS
+import asyncio, httpx, pytest
+
+
+class FakeEndpoint:
+    """Stands in for an endpoint's fetcher, answers after `delay` or raises `error`."""
+
+    def __init__(self, delay=0.0, error=None):
+        self.delay = delay
+        self.error = error
+        self.calls = 0
+
+    async def get_transaction(self, signature, **kwargs):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        if self.error is not None:
+            raise self.error
+        return (self, signature)
+
+
+def make_pool(*fakes, **kwargs):
+    urls = [f"http://node-{i}" for i in range(len(fakes))]
+    by_url = dict(zip(urls, fakes))
+    return RpcEndpointPool(urls, wrap=lambda client: by_url[str(client._provider.endpoint_uri)], **kwargs)
+
+
+def test_single_endpoint_is_called_directly():
+    async def scenario():
+        fake = FakeEndpoint()
+        pool = make_pool(fake)
+        assert await pool.get_transaction("sig") == (fake, "sig")
+        await pool.close()
+
+    asyncio.run(scenario())
+
+
+def test_the_fastest_endpoint_is_preferred_after_warmup():
+    async def scenario():
+        slow, fast = FakeEndpoint(delay=0.02), FakeEndpoint(delay=0.0)
+        pool = make_pool(slow, fast, hedge=False)
+        for _ in range(WARMUP_CALLS * 2 + 2):
+            await pool.get_transaction("sig")
+        before = fast.calls, slow.calls
+        for _ in range(5):
+            await pool.get_transaction("sig")
+        assert fast.calls - before[0] == 5 and slow.calls == before[1]
+        await pool.close()
+
+    asyncio.run(scenario())
+
+
+def test_a_slow_primary_is_hedged_to_the_runner_up():
+    async def scenario():
+        primary, backup = FakeEndpoint(delay=1.0), FakeEndpoint(delay=0.0)
+        pool = make_pool(primary, backup, hedge_default=0.02)
+        result = await asyncio.wait_for(pool.get_transaction("sig"), 0.5)
+        assert result == (backup, "sig")
+        assert (pool.counters.hedged, pool.counters.hedge_wins) == (1, 1)
+        await pool.close()
+
+    asyncio.run(scenario())
+
+
+def test_a_failing_primary_fails_over():
+    async def scenario():
+        primary, backup = FakeEndpoint(error=RuntimeError("boom")), FakeEndpoint()
+        pool = make_pool(primary, backup)
+        assert await pool.get_transaction("sig") == (backup, "sig")
+        assert pool.counters.failovers == 1
+        assert pool.endpoints[0].counters.errors == 1
+        await pool.close()
+
+    asyncio.run(scenario())
+
+
+def test_the_last_error_is_raised_when_every_endpoint_fails():
+    async def scenario():
+        pool = make_pool(FakeEndpoint(error=RuntimeError("first")), FakeEndpoint(error=RuntimeError("second")))
+        with pytest.raises(RuntimeError, match="second"):
+            await pool.get_transaction("sig")
+        await pool.close()
+
+    asyncio.run(scenario())
+
+
+def test_rate_limited_endpoints_cool_down():
+    async def scenario():
+        limited = FakeEndpoint(error=RPCException({"code": 429, "message": "Too many requests"}))
+        other = FakeEndpoint()
+        pool = make_pool(limited, other, rate_limit_cooldown=60)
+        await pool.get_transaction("sig")
+        assert pool.endpoints[0].counters.rate_limited == 1
+        assert pool.ranked()[-1] is pool.endpoints[0]
+
+        await pool.get_transaction("sig")
+        assert limited.calls == 1 # skipped while cooling down
+        assert pool.stats()["endpoints"]["http://node-0"]["cooling_down"] is True
+        await pool.close()
+
+    asyncio.run(scenario())
+
+
+def test_is_rate_limited_follows_the_exception_chain():
+    request = httpx.Request("POST", "http://node")
+    status = httpx.HTTPStatusError("429", request=request, response=httpx.Response(429, request=request))
+    wrapped = RuntimeError("wrapped")
+    wrapped.__cause__ = status
+    assert is_rate_limited(wrapped)
+    assert not is_rate_limited(RuntimeError("timeout"))
@@ -0,0 +1,216 @@
+"""
+test_sharding.py
+Consistent hashing, pool assignment and hand-off, and the worker and leader loops of the shard coordinator
+"""
+
+from sharding import HashRing, ShardCoordinator, consumer_role
+import asyncio, json, pytest, time
+
+
+class FakePipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.calls = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self.calls.append((name, args, kwargs))
+
+    async def execute(self):
+        return [await getattr(self.redis, name)(*args, **kwargs) for name, args, kwargs in self.calls]
+
+
+class FakeRedis:
+    """The hash, list and string commands the coordinator uses, on dicts. The lease never expires by itself."""
+
+    def __init__(self):
+        self.hashes, self.lists, self.strings = {}, {}, {}
+        self.lease_renewals = True
+
+    async def hset(self, key, field, value):
+        self.hashes.setdefault(key, {})[field] = str(value)
+
+    async def hget(self, key, field):
+        return self.hashes.get(key, {}).get(field)
+
+    async def hgetall(self, key):
+        return dict(self.hashes.get(key, {}))
+
+    async def hkeys(self, key):
+        return list(self.hashes.get(key, {}))
+
+    async def hdel(self, key, *fields):
+        for field in fields:
+            self.hashes.get(key, {}).pop(field, None)
+
+    async def rpush(self, key, value):
+        self.lists.setdefault(key, []).append(value)
+
+    async def blpop(self, keys, timeout=0):
+        for _ in range(int(timeout * 100) or 1):
+            for key in keys:
+                if self.lists.get(key):
+                    return key, self.lists[key].pop(0)
+            await asyncio.sleep(0.01)
+        return None
+
+    async def delete(self, *keys):
+        for key in keys:
+            self.hashes.pop(key, None)
+            self.lists.pop(key, None)
+            self.strings.pop(key, None)
+
+    async def set(self, key, value, nx=False, px=None):
+        if nx and key in self.strings:
+            return None
+        self.strings[key] = value
+        return True
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+    def register_script(self, script):
+        async def renew(keys, args):
+            return int(self.lease_renewals and self.strings.get(keys[0]) == args[0])
+        return renew
+
+
+def coordinator(redis, worker_id, **kwargs):
+    return ShardCoordinator(redis, worker_id, heartbeat_interval=0.01, **kwargs)
+
+
+def pools(redis):
+    return {pool: json.loads(raw) for pool, raw in redis.hashes.get("shard:pools", {}).items()}
+
+
+def test_consumer_role_is_validated():
+    assert consumer_role(None) == "standalone"
+    assert consumer_role(" Worker ") == "worker"
+    with pytest.raises(ValueError):
+        consumer_role("follower")
+
+
+def test_ring_is_stable_and_spreads_keys():
+    ring = HashRing(["w1", "w2", "w3"])
+    keys = [f"pool-{i}" for i in range(3000)]
+    owners = [ring.node_for(key) for key in keys]
+    assert owners == [HashRing(["w3", "w1", "w2"]).node_for(key) for key in keys]
+    assert all(owners.count(worker) > 600 for worker in ("w1", "w2", "w3"))
+
+    # a new node only takes keys, it never moves them between the old nodes
+    ring.add("w4")
+    assert all(ring.node_for(key) in (owner, "w4") for key, owner in zip(keys, owners))
+    assert HashRing().node_for("pool") is None
+
+
+def test_pools_go_to_live_workers_only():
+    async def scenario():
+        redis = FakeRedis()
+        leader = coordinator(redis, "leader", worker_timeout=15)
+        await redis.hset("shard:workers", "w1", time.time())
+        await redis.hset("shard:workers", "w2", time.time() - 60)
+
+        assert await leader.assign("pool-a", {"pool": "a"}, time.time() + 60) == "w1"
+        assert pools(redis)["pool-a"]["worker"] == "w1"
+        assert [json.loads(raw)["pool"] for raw in redis.lists["shard:queue:w1"]] == [{"pool": "a"}]
+        assert "shard:queue:w2" not in redis.lists
+
+    asyncio.run(scenario())
+
+
+def test_rebalance_hands_off_pools_of_dead_workers_and_drops_expired_ones():
+    async def scenario():
+        redis = FakeRedis()
+        leader = coordinator(redis, "leader")
+        now = time.time()
+        await redis.hset("shard:workers", "alive", now)
+        await redis.hset("shard:workers", "dead", now - 60)
+        await redis.rpush("shard:queue:dead", "stale")
+        await redis.hset("shard:pools", "kept", json.dumps({"worker": "dead", "expires_at": now + 60, "pool": "k"}))
+        await redis.hset("shard:pools", "expired", json.dumps({"worker": "dead", "expires_at": now - 1, "pool": "e"}))
+        await redis.hset("shard:pools", "owned", json.dumps({"worker": "alive", "expires_at": now + 60, "pool": "o"}))
+
+        await leader.rebalance()
+
+        assert await redis.hkeys("shard:workers") == ["alive"]
+        assert "shard:queue:dead" not in redis.lists
+        assert {pool: assignment["worker"] for pool, assignment in pools(redis).items()} == {"kept": "alive", "owned": "alive"}
+        assert [json.loads(raw)["pool"] for raw in redis.lists["shard:queue:alive"]] == ["k"]
+        assert leader.stats()["handed_off"] == 1
+
+    asyncio.run(scenario())
+
+
+def test_pools_without_any_worker_wait_for_one():
+    async def scenario():
+        redis = FakeRedis()
+        leader = coordinator(redis, "leader")
+        assert await leader.assign("pool-a", "a", time.time() + 60) is None
+        assert pools(redis)["pool-a"]["worker"] is None
+
+        await redis.hset("shard:workers", "late", time.time())
+        await leader.rebalance()
+        assert pools(redis)["pool-a"]["worker"] == "late"
+
+    asyncio.run(scenario())
+
+
+def test_a_restarted_worker_resumes_its_pools_then_takes_new_ones():
+    async def scenario():
+        redis = FakeRedis()
+        now = time.time()
+        await redis.hset("shard:pools", "mine", json.dumps({"worker": "w1", "expires_at": now + 60, "pool": "mine"}))
+        await redis.hset("shard:pools", "mine-expired", json.dumps({"worker": "w1", "expires_at": now - 1, "pool": "old"}))
+        await redis.hset("shard:pools", "theirs", json.dumps({"worker": "w2", "expires_at": now + 60, "pool": "theirs"}))
+        await redis.rpush("shard:queue:w1", json.dumps({"worker": "w1", "expires_at": now + 60, "pool": "new"}))
+
+        worker = coordinator(redis, "w1")
+        taken = []
+
+        async def on_assign(pool, expires_at):
+            taken.append(pool)
+            if pool == "new":
+                await worker.stop()
+
+        await asyncio.wait_for(worker.run_worker(on_assign), 2)
+        assert taken == ["mine", "new"]
+        assert worker.stats()["received"] == 1
+        assert "w1" not in redis.hashes.get("shard:workers", {})
+
+    asyncio.run(scenario())
+
+
+def test_only_one_leader_runs_and_losing_the_lease_stops_it():
+    async def scenario():
+        redis = FakeRedis()
+        first, second = coordinator(redis, "first"), coordinator(redis, "second")
+        started = []
+        stopped = asyncio.Event()
+
+        async def leading(name):
+            started.append(name)
+            try:
+                await asyncio.Event().wait()
+            finally:
+                stopped.set()
+
+        first_task = asyncio.create_task(first.run_leader(lambda: leading("first")))
+        await asyncio.sleep(0.05)
+        second_task = asyncio.create_task(second.run_leader(lambda: leading("second")))
+        await asyncio.sleep(0.05)
+        assert started == ["first"] and first.is_leader and not second.is_leader
+
+        redis.lease_renewals = False
+        await asyncio.wait_for(stopped.wait(), 1)
+        assert not first.is_leader
+
+        for shard, task in ((first, first_task), (second, second_task)):
+            shard.running = False
+            await asyncio.wait_for(task, 1)
+
+    asyncio.run(scenario())
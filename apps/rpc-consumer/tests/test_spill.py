@@ -0,0 +1,75 @@
+"""
+test_spill.py
+The spill buffer in memory and on file: order, bound, two step draining, prepend and surviving a restart
+"""
+
+from spill import SpillBuffer
+import pytest
+
+
+@pytest.fixture(params=["memory", "file"])
+def make_spill(request, tmp_path):
+    def make(max_size=100):
+        return SpillBuffer(max_size, path=str(tmp_path / "spill.jsonl") if request.param == "file" else None)
+    return make
+
+
+def test_records_are_drained_in_order(make_spill):
+    spill = make_spill()
+    for i in range(5):
+        spill.append("channel", f"event {i}")
+    spill.append("binary", b"\x00\xff")
+
+    records, token = spill.read(4)
+    assert records == [("channel", f"event {i}") for i in range(4)]
+    spill.commit(token)
+    assert len(spill) == 2
+    records, token = spill.read(10)
+    assert records == [("channel", "event 4"), ("binary", b"\x00\xff")]
+    spill.commit(token)
+    assert not spill
+
+
+def test_a_read_without_commit_is_read_again(make_spill):
+    spill = make_spill()
+    spill.append("channel", "a")
+    spill.read(1) # the publish failed
+    assert spill.read(1)[0] == [("channel", "a")]
+    assert len(spill) == 1
+
+
+def test_appends_beyond_the_bound_are_refused(make_spill):
+    spill = make_spill(max_size=2)
+    assert spill.append("channel", "a") and spill.append("channel", "b")
+    assert not spill.append("channel", "c")
+    assert len(spill) == 2
+
+
+def test_prepended_records_come_first_even_beyond_the_bound(make_spill):
+    spill = make_spill(max_size=2)
+    spill.append("channel", "c")
+    spill.append("channel", "d")
+    records, token = spill.read(1)
+    spill.commit(token)
+    spill.prepend([("channel", "a"), ("channel", "b")])
+    assert len(spill) == 3
+    assert spill.read(10)[0] == [("channel", "a"), ("channel", "b"), ("channel", "d")]
+
+
+def test_a_file_spill_survives_a_restart(tmp_path):
+    path = str(tmp_path / "spill.jsonl")
+    spill = SpillBuffer(path=path)
+    for i in range(3):
+        spill.append("channel", f"event {i}")
+    records, token = spill.read(1)
+    spill.commit(token)
+    spill.close()
+
+    # drained records are only forgotten once the whole file was drained, delivery is at least once
+    reopened = SpillBuffer(path=path)
+    assert len(reopened) == 3
+    records, token = reopened.read(10)
+    assert records == [("channel", f"event {i}") for i in range(3)]
+    reopened.commit(token)
+    reopened.close()
+    assert open(path).read() == ""
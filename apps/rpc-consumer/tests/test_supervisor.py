@@ -0,0 +1,72 @@
+"""
+test_supervisor.py
+Core lists, child process slots and restarts with backoff
+"""
+
+from supervisor import Supervisor, Child, parse_cpus
+import pytest
+
+
+class FakeProcess:
+    def __init__(self, returncode=None):
+        self.returncode = returncode
+
+    def poll(self):
+        return self.returncode
+
+
+@pytest.fixture
+def started(monkeypatch):
+    """Child.start without spawning, records the names of the children started."""
+    started = []
+
+    def start(child):
+        child.process = FakeProcess()
+        started.append(child.name)
+
+    monkeypatch.setattr(Child, "start", start)
+    return started
+
+
+def test_parse_cpus():
+    assert parse_cpus("0,2,4-7") == [0, 2, 4, 5, 6, 7]
+    assert parse_cpus(" 3 ") == [3]
+
+
+def test_children_get_roles_stable_ids_and_cores():
+    supervisor = Supervisor(3, [0, 1], leader=True)
+    assert [child.name for child in supervisor.children] == ["leader", "worker-0", "worker-1", "worker-2"]
+    assert [child.env["CONSUMER_ROLE"] for child in supervisor.children] == ["leader", "worker", "worker", "worker"]
+    assert supervisor.children[1].env["SHARD_WORKER_ID"].endswith("-worker-0")
+    assert [child.cpu for child in supervisor.children] == [0, 1, 0, 1]
+    assert [child.name for child in Supervisor(1, [], leader=False).children] == ["worker-0"]
+
+
+def test_a_crashed_child_is_restarted_after_its_backoff(started, monkeypatch):
+    monkeypatch.setattr("helpers.random.uniform", lambda low, high: high)
+    child = Child("worker-0", {})
+    child.backoff.base = 1
+
+    assert not child.poll(0) # first start
+    assert child.poll(1)
+    child.process.returncode = 1
+    assert not child.poll(2) # crashed, restart due at 3
+    assert not child.poll(2.5)
+    assert started == ["worker-0"]
+    assert not child.poll(3)
+    assert started == ["worker-0", "worker-0"] and child.restarts == 1
+
+    child.process.returncode = 1
+    child.poll(4) # crashed again right away, the delay doubles
+    assert child.restart_at == 6
+
+
+def test_a_child_that_ran_a_while_restarts_quickly(started, monkeypatch):
+    monkeypatch.setattr("helpers.random.uniform", lambda low, high: high)
+    child = Child("worker-0", {})
+    child.backoff.base = 1
+    child.backoff.attempts = 5
+    child.poll(0)
+    child.process.returncode = 1
+    child.poll(100)
+    assert child.restart_at == 101
@@ -0,0 +1,133 @@
+"""
+test_swap_backfill.py
+Backfill jobs: ids, chain order emission, checkpoints and sharing the seen window with the live subscription
+"""
+
+from swap_backfill import SwapBackfill, BackfillJob, CheckpointStore
+from dedup import SeenWindow
+from solders.pubkey import Pubkey
+from types import SimpleNamespace
+import asyncio, pytest
+
+POOL = str(Pubkey.new_unique())
+TOKEN = str(Pubkey.new_unique())
+
+
+class FakeRedis:
+    """The hash commands CheckpointStore uses."""
+
+    def __init__(self):
+        self.hashes = {}
+
+    async def hget(self, key, field):
+        return self.hashes.get(key, {}).get(field)
+
+    async def hset(self, key, field, value):
+        self.hashes.setdefault(key, {})[field] = value
+
+    async def hdel(self, key, field):
+        self.hashes.get(key, {}).pop(field, None)
+
+    async def hgetall(self, key):
+        return dict(self.hashes.get(key, {}))
+
+
+@pytest.fixture
+def chain(monkeypatch):
+    """Signatures "s0".."s9", s9 the newest, and get_swap answering from `chain.swaps` (or raising its `errors`)."""
+    chain = SimpleNamespace(statuses=[SimpleNamespace(signature=f"s{i}", slot=i, err=None) for i in reversed(range(10))],
+                            swaps={f"s{i}": f"swap {i}" for i in range(10)}, errors={}, fetched=[], listed=[])
+
+    async def signatures_between(client, account, until=None, before=None, limit=1000, min_slot=None):
+        chain.listed.append(until)
+        stop = next((i for i, status in enumerate(chain.statuses) if str(status.signature) == str(until)), len(chain.statuses))
+        return chain.statuses[:stop]
+
+    async def get_swap(client, signature, target_token):
+        chain.fetched.append(signature)
+        if signature in chain.errors:
+            raise chain.errors[signature]
+        return chain.swaps[signature]
+
+    monkeypatch.setattr("swap_backfill.signatures_between", signatures_between)
+    monkeypatch.setattr("swap_backfill._signature", lambda value: value)
+    monkeypatch.setattr("swap_backfill.Transaction.get_swap", get_swap)
+    monkeypatch.setattr("swap_backfill.SwapEvent", lambda swap, backfilled: swap)
+    return chain
+
+
+def make_engine(**kwargs):
+    published = []
+    engine = SwapBackfill(None, published.append, rate=1000, **kwargs)
+    return engine, published
+
+
+def test_job_ids_have_no_missing_bounds():
+    assert BackfillJob(POOL, TOKEN).id == f"{POOL}:{TOKEN}:-:-"
+    assert BackfillJob(POOL, TOKEN, min_slot=0, max_slot=5).id == f"{POOL}:{TOKEN}:0:5"
+    assert BackfillJob(POOL, TOKEN, until="a", before="b").id == f"{POOL}:{TOKEN}:a:b"
+
+
+def test_swaps_are_published_oldest_first(chain):
+    engine, published = make_engine(chunk_size=3)
+    state = asyncio.run(engine.run(BackfillJob(POOL, TOKEN)))
+    assert published == [f"swap {i}" for i in range(10)]
+    assert state["processed"] == 10 and state["emitted"] == 10
+
+
+def test_failed_fetches_are_left_to_the_live_subscription(chain):
+    chain.errors["s4"] = RuntimeError("timed out")
+    chain.errors["s5"] = Exception("No swaps detected in transaction")
+    seen = SeenWindow()
+    engine, published = make_engine()
+    asyncio.run(engine.run(BackfillJob(POOL, TOKEN, seen=seen)))
+
+    assert "swap 4" not in published and "swap 5" not in published
+    assert not seen.contains("s4") and not seen.contains("s5")
+    assert seen.contains("s3")
+    assert engine.stats()["failed"] == 1 # not finding a swap is not a failure
+
+
+def test_signatures_seen_live_are_not_fetched_or_emitted(chain):
+    seen = SeenWindow()
+    seen.first_seen("s2")
+    engine, published = make_engine()
+    asyncio.run(engine.run(BackfillJob(POOL, TOKEN, seen=seen)))
+    assert "s2" not in chain.fetched
+    assert "swap 2" not in published and len(published) == 9
+
+
+def test_a_swap_claimed_live_during_the_fetch_is_not_emitted_again(chain, monkeypatch):
+    seen = SeenWindow()
+
+    async def get_swap(client, signature, target_token):
+        seen.first_seen(signature) # the live subscription delivered it meanwhile
+        return chain.swaps[signature]
+
+    monkeypatch.setattr("swap_backfill.Transaction.get_swap", get_swap)
+    engine, published = make_engine()
+    asyncio.run(engine.run(BackfillJob(POOL, TOKEN, seen=seen)))
+    assert published == []
+
+
+def test_an_interrupted_job_resumes_from_its_checkpoint(chain):
+    redis = FakeRedis()
+    job = BackfillJob(POOL, TOKEN)
+    engine, published = make_engine(checkpoints=CheckpointStore(redis), chunk_size=4)
+
+    def publish(event):
+        if event == "swap 6":
+            raise RuntimeError("publisher gone")
+        published.append(event)
+
+    engine.publish = publish
+    with pytest.raises(RuntimeError):
+        asyncio.run(engine.run(job))
+    state = asyncio.run(CheckpointStore(redis).load(job.id))
+    assert state["until"] == "s3" and state["processed"] == 4
+
+    engine.publish = published.append
+    asyncio.run(engine.run(job))
+    assert chain.listed[-1] == "s3"
+    assert published[-6:] == [f"swap {i}" for i in range(4, 10)]
+    assert asyncio.run(CheckpointStore(redis).unfinished()) == {}
@@ -0,0 +1,109 @@
+"""
+test_transaction_cache.py
+Hits, request coalescing, expiry and error propagation of the shared transaction cache
+"""
+
+from classes import TransactionCache
+from types import SimpleNamespace
+import asyncio, pytest
+
+
+class FakeClient:
+    def __init__(self, response=..., error=None, delay=0):
+        self.calls = []
+        self.response = SimpleNamespace(value="tx") if response is ... else response
+        self.error = error
+        self.delay = delay
+
+    async def get_transaction(self, signature, **kwargs):
+        self.calls.append((signature, kwargs["encoding"]))
+        await asyncio.sleep(self.delay)
+        if self.error is not None:
+            raise self.error
+        return self.response
+
+
+def test_repeated_lookups_hit_the_cache():
+    async def scenario():
+        cache, client = TransactionCache(), FakeClient()
+        first = await cache.fetch(client, "sig")
+        second = await cache.fetch(client, "sig")
+        assert first is second
+        assert len(client.calls) == 1
+        assert (cache.hits, cache.misses) == (1, 1)
+
+    asyncio.run(scenario())
+
+
+def test_encodings_are_cached_separately():
+    async def scenario():
+        cache, client = TransactionCache(encoding="base64"), FakeClient()
+        await cache.fetch(client, "sig")
+        await cache.fetch(client, "sig", encoding="jsonParsed")
+        assert client.calls == [("sig", "base64"), ("sig", "jsonParsed")]
+
+    asyncio.run(scenario())
+
+
+def test_concurrent_lookups_share_one_request():
+    async def scenario():
+        cache, client = TransactionCache(), FakeClient(delay=0.01)
+        results = await asyncio.gather(*(cache.fetch(client, "sig") for _ in range(5)))
+        assert len(client.calls) == 1
+        assert all(result is results[0] for result in results)
+        assert cache.coalesced == 4
+
+    asyncio.run(scenario())
+
+
+def test_errors_reach_every_waiter_and_are_not_cached():
+    async def scenario():
+        cache, client = TransactionCache(), FakeClient(error=RuntimeError("rpc down"), delay=0.01)
+        results = await asyncio.gather(*(cache.fetch(client, "sig") for _ in range(3)), return_exceptions=True)
+        assert all(isinstance(result, RuntimeError) for result in results)
+
+        client.error = None
+        await cache.fetch(client, "sig")
+        assert len(client.calls) == 2
+        assert not cache.in_flight
+
+    asyncio.run(scenario())
+
+
+def test_not_found_responses_are_not_cached():
+    async def scenario():
+        cache, client = TransactionCache(), FakeClient(response=SimpleNamespace(value=None))
+        await cache.fetch(client, "sig")
+        await cache.fetch(client, "sig")
+        assert len(client.calls) == 2
+
+    asyncio.run(scenario())
+
+
+def test_expired_and_least_recently_used_entries_are_dropped():
+    async def scenario():
+        cache, client = TransactionCache(max_size=2, ttl=0), FakeClient()
+        await cache.fetch(client, "a")
+        await cache.fetch(client, "a") # ttl 0, already expired
+        assert len(client.calls) == 2
+
+        cache.configure(max_size=2, ttl=60)
+        for signature in ("a", "b", "c"):
+            await cache.fetch(client, signature)
+        assert [key[0] for key in cache.entries] == ["b", "c"]
+        assert cache.evictions >= 1
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_fetch_does_not_leave_a_stuck_entry():
+    async def scenario():
+        cache, client = TransactionCache(), FakeClient(delay=1)
+        task = asyncio.create_task(cache.fetch(client, "sig"))
+        await asyncio.sleep(0)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        assert not cache.in_flight
+
+    asyncio.run(scenario())
@@ -0,0 +1,99 @@
+"""
+test_workers.py
+Overflow policies and failure handling of the callback worker pool
+"""
+
+from workers import CallbackQueue
+import asyncio, pytest
+
+
+def test_unknown_policy_is_rejected():
+    with pytest.raises(ValueError):
+        CallbackQueue(policy="drop_all")
+
+
+def test_callbacks_run_and_failures_are_counted():
+    async def scenario():
+        queue = CallbackQueue(workers=2, maxsize=10)
+        ran = []
+
+        async def ok(value):
+            ran.append(value)
+
+        async def boom():
+            raise RuntimeError("callback failed")
+
+        await queue.put(ok, 1)
+        await queue.put(boom)
+        await queue.put(ok, 2)
+        await queue.queue.join()
+
+        assert sorted(ran) == [1, 2]
+        assert (queue.counters.processed, queue.counters.failed) == (3, 1)
+        await queue.close()
+
+    asyncio.run(scenario())
+
+
+async def fill(queue, count):
+    """Put `count` frames while the single worker is stuck on the first one."""
+    release = asyncio.Event()
+    ran = []
+
+    async def blocker():
+        await release.wait()
+
+    async def record(value):
+        ran.append(value)
+
+    await queue.put(blocker)
+    await asyncio.sleep(0) # the worker takes the blocker off the queue
+    results = [await queue.put(record, value) for value in range(count)]
+    return release, ran, results
+
+
+def test_drop_newest_discards_the_incoming_frame():
+    async def scenario():
+        queue = CallbackQueue(workers=1, maxsize=2, policy="drop_newest")
+        release, ran, results = await fill(queue, 3)
+        release.set()
+        await queue.queue.join()
+
+        assert results == [True, True, False]
+        assert ran == [0, 1]
+        assert queue.counters.dropped == 1
+        await queue.close()
+
+    asyncio.run(scenario())
+
+
+def test_drop_oldest_discards_the_oldest_queued_frame():
+    async def scenario():
+        queue = CallbackQueue(workers=1, maxsize=2, policy="drop_oldest")
+        release, ran, results = await fill(queue, 3)
+        release.set()
+        await queue.queue.join()
+
+        assert results == [True, True, True]
+        assert ran == [1, 2]
+        assert queue.counters.dropped == 1
+        await queue.close()
+
+    asyncio.run(scenario())
+
+
+def test_block_waits_for_room():
+    async def scenario():
+        queue = CallbackQueue(workers=1, maxsize=1, policy="block")
+        release, ran, _ = await fill(queue, 1)
+        blocked = asyncio.create_task(queue.put(asyncio.sleep, 0))
+        await asyncio.sleep(0.01)
+        assert not blocked.done()
+
+        release.set()
+        assert await asyncio.wait_for(blocked, 1) is True
+        await queue.queue.join()
+        assert queue.counters.dropped == 0
+        await queue.close()
+
+    asyncio.run(scenario())
@@ -0,0 +1,101 @@
+"""
+workers.py
+Bounded queue + worker pool that runs notification callbacks off the websocket recv loop
+"""
+
+from metrics import Counters
+import asyncio, logging, time, traceback
+
+OVERFLOW_POLICIES = ("block", "drop_oldest", "drop_newest")
+
+
+class CallbackQueue:
+    """
+    Frames are put on a bounded asyncio queue and drained by `workers` concurrent tasks.
+    When the queue is full the overflow policy decides what happens:
+        block       - the producer (recv loop) waits for room, backpressure onto the socket
+        drop_oldest - the oldest queued frame is discarded to make room
+        drop_newest - the incoming frame is discarded
+    """
+
+    def __init__(self, name="callbacks", workers=8, maxsize=1000, policy="block"):
+        if policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy {policy}, expected one of {OVERFLOW_POLICIES}")
+        self.name = name
+        self.worker_count = max(1, workers)
+        self.maxsize = maxsize
+        self.policy = policy
+        self.queue = None
+        self.tasks = []
+
+        self.counters = Counters("enqueued", "processed", "dropped", "failed", "max_depth", "lag_total", "lag_max", "lag_samples")
+
+    def _start(self):
+        # created lazily so the queue binds to the running loop
+        self.queue = asyncio.Queue(maxsize=self.maxsize)
+        self.tasks = [asyncio.create_task(self._worker()) for _ in range(self.worker_count)]
+
+    async def put(self, callback, *args):
+        """Queue `callback(*args)`. Returns False if the frame was dropped."""
+        if self.queue is None:
+            self._start()
+
+        item = (time.monotonic(), callback, args)
+        if self.queue.full():
+            if self.policy == "drop_newest":
+                self.counters.dropped += 1
+                return False
+            if self.policy == "drop_oldest":
+                self.queue.get_nowait()
+                self.queue.task_done()
+                self.counters.dropped += 1
+                self.queue.put_nowait(item)
+            else:
+                await self.queue.put(item)
+        else:
+            self.queue.put_nowait(item)
+
+        self.counters.enqueued += 1
+        self.counters.max_depth = max(self.counters.max_depth, self.queue.qsize())
+        return True
+
+    async def _worker(self):
+        while True:
+            enqueued_at, callback, args = await self.queue.get()
+            lag = time.monotonic() - enqueued_at
+            counters = self.counters
+            counters.lag_total += lag
+            counters.lag_samples += 1
+            counters.lag_max = max(counters.lag_max, lag)
+            try:
+                await callback(*args)
+            except Exception:
+                counters.failed += 1
+                logging.error(f"Error in listen/callback: {traceback.format_exc()}")
+            finally:
+                counters.processed += 1
+                self.queue.task_done()
+
+    async def close(self):
+        for task in self.tasks:
+            task.cancel()
+        self.tasks = []
+        self.queue = None
+
+    def stats(self):
+        """Queue metrics for the period since the last reset_stats()."""
+        counters = self.counters
+        return {
+            "depth": self.queue.qsize() if self.queue is not None else 0,
+            "max_depth": counters.max_depth,
+            "maxsize": self.maxsize,
+            "enqueued": counters.enqueued,
+            "processed": counters.processed,
+            "dropped": counters.dropped,
+            "failed": counters.failed,
+            "lag_avg_ms": round(counters.lag_total / counters.lag_samples * 1000, 2) if counters.lag_samples else 0.0,
+            "lag_max_ms": round(counters.lag_max * 1000, 2),
+        }
+
+    def reset_stats(self):
+        self.counters.reset()
@@ -27,6 +27,9 @@ type Config struct {
 	NewPairsChannel       string
 	ParsedPairsChannel    string
 	SwapsChannel          string
+	EventInputMode        string // "pubsub" or "streams" - must match EVENT_OUTPUT_MODE on the rpc consumer
+	StreamGroup           string
+	StreamConsumer        string
 	RPCURL                string
 	RPCRateLimitTime      int
 	RPCRateLimitBurst     int
@@ -114,6 +117,19 @@ func ParseEnv() *Config {
 	ApplicationConfig.BurnsTopic = GetEnv("KAFKA_BURNS_TOPIC")
 	ApplicationConfig.TokensTopic = GetEnv("KAFKA_TOKENS_TOPIC")
 	ApplicationConfig.SwapsChannel = GetEnv("REDIS_SWAPS_CHANNEL")
+	ApplicationConfig.EventInputMode = "pubsub"
+	if mode, exists := os.LookupEnv("EVENT_INPUT_MODE"); exists {
+		ApplicationConfig.EventInputMode = mode
+	}
+	ApplicationConfig.StreamGroup = "token-processor"
+	if group, exists := os.LookupEnv("REDIS_STREAM_GROUP"); exists {
+		ApplicationConfig.StreamGroup = group
+	}
+	// consumer name within the group, defaults to the hostname so each replica gets its own pending list
+	ApplicationConfig.StreamConsumer, _ = os.Hostname()
+	if consumer, exists := os.LookupEnv("REDIS_STREAM_CONSUMER"); exists {
+		ApplicationConfig.StreamConsumer = consumer
+	}
 	ApplicationConfig.RPCURL = GetEnv("HTTP_PROVIDER_MAIN")
 	rateLimitTime, err1 := strconv.Atoi(GetEnv("PROVIDER_MAIN_RATE_LIMIT_TIME"))
 	rateLimitBurst, err2 := strconv.Atoi(GetEnv("PROVIDER_MAIN_RATE_LIMIT_BURST"))
@@ -27,7 +27,6 @@ var rdb *redis.Client // Redis client
 
 func receiveBurnMessages(ctx context.Context, wg *sync.WaitGroup, tokenMap *map[string]*models.Token) {
 	defer wg.Done()
-	pubsub := rdb.Subscribe(ctx, config.ApplicationConfig.BurnsChannel)
 
 	//schedule necessary tasks to clear unknown tokens
 	go burns.CleanupTask(300)                                                     // Cleanup every 300 seconds (5 minutes)
@@ -35,22 +34,16 @@ func receiveBurnMessages(ctx context.Context, wg *sync.WaitGroup, tokenMap *map[
 	go burns.BlackListRefreshTask(config.ApplicationConfig.BlacklistFilePath, 25) // Reload every 25 seconds - cannot be divisible by 10 for safety from the backup task
 	go burns.MatchingTask(config.ApplicationConfig.PriceInterval, tokenMap)       // Matching every time price interval is reached
 
-	for {
-		msg, err := pubsub.ReceiveMessage(ctx)
-		if err != nil {
-			log.Error().Err(err).Msg("Error receiving message")
-			return
-		}
-
+	receivePayloads(ctx, config.ApplicationConfig.BurnsChannel, false, func(payload string) {
 		var burnEvent ConsumerEvents.BurnEvent
-		err = json.Unmarshal([]byte(msg.Payload), &burnEvent)
+		err := json.Unmarshal([]byte(payload), &burnEvent)
 		if err != nil {
 			log.Error().Err(err).Msg("Error parsing burn event")
-			continue
+			return
 		}
 
 		if burns.IsBlacklisted(burnEvent.Data.TokenAddress) {
-			continue
+			return
 		}
 
 		if _, ok := (*tokenMap)[burnEvent.Data.TokenAddress]; !ok {
@@ -63,30 +56,23 @@ func receiveBurnMessages(ctx context.Context, wg *sync.WaitGroup, tokenMap *map[
 		}
 
 		burns.ProcessBurnEvent(burnEvent, tokenMap)
-	}
+	})
 }
 
 func receiveNewPairsMessages(ctx context.Context, wg *sync.WaitGroup, tokenMap *map[string]*models.Token) {
 	// Receive messages from the new pairs channel
 	defer wg.Done()
-	pubsub := rdb.Subscribe(ctx, config.ApplicationConfig.NewPairsChannel)
 
 	// Wait for messages
-	for {
-
-		msg, errReceive := pubsub.ReceiveMessage(ctx)
-		if errReceive != nil {
-			log.Error().Err(errReceive).Msg("Error receiving message")
-			continue
-		}
+	receivePayloads(ctx, config.ApplicationConfig.NewPairsChannel, true, func(payload string) {
 
 		// Parse the message into a NewPairEvent
 		var newPairEvent ConsumerEvents.NewPairEvent
-		errUnmarshal := json.Unmarshal([]byte(msg.Payload), &newPairEvent)
+		errUnmarshal := json.Unmarshal([]byte(payload), &newPairEvent)
 
 		if errUnmarshal != nil {
 			log.Error().Err(errUnmarshal).Msg("Error parsing new pair event")
-			continue
+			return
 		}
 
 		// log.Info().Msgf("Parsed NewPairEvent: %+v", newPairEvent)
@@ -109,7 +95,7 @@ func receiveNewPairsMessages(ctx context.Context, wg *sync.WaitGroup, tokenMap *
 
 		if errRunAll != nil {
 			log.Error().Err(errRunAll).Msg("Failed to get token info... continuing")
-			continue
+			return
 		}
 
 		elapsed := end.Sub(start)
@@ -132,28 +118,21 @@ func receiveNewPairsMessages(ctx context.Context, wg *sync.WaitGroup, tokenMap *
 
 		// Done
 
-	}
+	})
 }
 
 func receiveSwapMessages(ctx context.Context, wg *sync.WaitGroup, tokenMap *map[string]*models.Token) {
 	// Receive messages from the swaps channel
 	defer wg.Done()
-	pubsub := rdb.Subscribe(ctx, config.ApplicationConfig.SwapsChannel)
 
 	// Wait for messages
-	for {
-		msg, err := pubsub.ReceiveMessage(ctx)
-		if err != nil {
-			log.Error().Err(err).Msg("Error receiving message")
-			return
-		}
-
+	receivePayloads(ctx, config.ApplicationConfig.SwapsChannel, false, func(payload string) {
 		// Unmarshal the entire message directly into a SwapEvent
 		var swapEvent ConsumerEvents.SwapEvent
-		err = json.Unmarshal([]byte(msg.Payload), &swapEvent)
+		err := json.Unmarshal([]byte(payload), &swapEvent)
 		if err != nil {
 			log.Error().Err(err).Msg("Error parsing swap event")
-			continue
+			return
 		}
 
 		//find token in token map and process swap event for that token
@@ -164,7 +143,7 @@ func receiveSwapMessages(ctx context.Context, wg *sync.WaitGroup, tokenMap *map[
 			if notFoundError != nil {
 				log.Error().Msg("Token not found in redis cache")
 				log.Error().Err(notFoundError)
-				continue
+				return
 			}
 			//add to token map
 			(*tokenMap)[swapEvent.Data.TokenAddress] = foundToken
@@ -172,7 +151,7 @@ func receiveSwapMessages(ctx context.Context, wg *sync.WaitGroup, tokenMap *map[
 			token = foundToken
 		}
 		swaps.ProcessSwapEvent(token, swapEvent)
-	}
+	})
 }
 
 func StartServices(ctx context.Context, wg *sync.WaitGroup, tokenMap *map[string]*models.Token) {
@@ -0,0 +1,93 @@
+package listeners
+
+import (
+	"context"
+	"errors"
+	"strings"
+	"time"
+
+	"github.com/Zaydo123/token-processor/internal/config"
+	"github.com/redis/go-redis/v9"
+	"github.com/rs/zerolog/log"
+)
+
+// streamBlock is how long one XREADGROUP waits for new entries before the loop checks ctx again
+const streamBlock = 5 * time.Second
+
+// receivePayloads calls handle for every event published on channel, using either Redis pub/sub
+// or, when EVENT_INPUT_MODE is "streams", a consumer group on the stream of the same name.
+// A pub/sub receive error ends the listener unless retryOnError is set (the new pairs listener
+// keeps going, like it always did). Returns once ctx is done.
+func receivePayloads(ctx context.Context, channel string, retryOnError bool, handle func(payload string)) {
+	if config.ApplicationConfig.EventInputMode == "streams" {
+		consumeStream(ctx, rdb, channel, config.ApplicationConfig.StreamGroup, config.ApplicationConfig.StreamConsumer, streamBlock, handle)
+		return
+	}
+
+	pubsub := rdb.Subscribe(ctx, channel)
+	defer pubsub.Close()
+	for ctx.Err() == nil {
+		msg, err := pubsub.ReceiveMessage(ctx)
+		if err != nil {
+			log.Error().Err(err).Msg("Error receiving message")
+			if !retryOnError {
+				return
+			}
+			continue
+		}
+		handle(msg.Payload)
+	}
+}
+
+// consumeStream reads the stream through a consumer group. Entries are acknowledged after
+// they are handled, and on startup the consumer first drains its own pending entries (id "0") so
+// events delivered before a crash or restart are processed instead of lost.
+func consumeStream(ctx context.Context, rdb *redis.Client, stream, group, consumer string, block time.Duration, handle func(payload string)) {
+	err := rdb.XGroupCreateMkStream(ctx, stream, group, "0").Err()
+	if err != nil && !strings.Contains(err.Error(), "BUSYGROUP") {
+		log.Error().Err(err).Msgf("Error creating consumer group %s on %s", group, stream)
+		return
+	}
+	log.Info().Msgf("Reading stream %s as %s/%s", stream, group, consumer)
+
+	lastID := "0" // pending entries first, then ">" for new ones
+	for ctx.Err() == nil {
+		streams, err := rdb.XReadGroup(ctx, &redis.XReadGroupArgs{
+			Group:    group,
+			Consumer: consumer,
+			Streams:  []string{stream, lastID},
+			Count:    100,
+			Block:    block,
+		}).Result()
+
+		if errors.Is(err, redis.Nil) {
+			continue
+		}
+		if err != nil {
+			if ctx.Err() != nil {
+				return
+			}
+			log.Error().Err(err).Msgf("Error reading stream %s", stream)
+			time.Sleep(time.Second)
+			continue
+		}
+
+		delivered := 0
+		for _, s := range streams {
+			for _, msg := range s.Messages {
+				delivered++
+				if payload, ok := msg.Values["event"].(string); ok {
+					handle(payload)
+				}
+				// an entry that was handled is acked even while shutting down, or it would be handled twice
+				if err := rdb.XAck(context.WithoutCancel(ctx), stream, group, msg.ID).Err(); err != nil {
+					log.Error().Err(err).Msgf("Error acknowledging %s on %s", msg.ID, stream)
+				}
+			}
+		}
+
+		if lastID == "0" && delivered == 0 {
+			lastID = ">"
+		}
+	}
+}
@@ -0,0 +1,135 @@
+package listeners
+
+import (
+	"context"
+	"fmt"
+	"os"
+	"sync"
+	"testing"
+	"time"
+
+	"github.com/redis/go-redis/v9"
+)
+
+// These tests need a real Redis (5.0+ for streams), e.g.
+//
+//	docker run --rm -p 6379:6379 redis:7
+//	REDIS_TEST_ADDR=localhost:6379 go test ./internal/redis/listeners/
+//
+// and are skipped when REDIS_TEST_ADDR is not set.
+
+const testGroup = "token-processor-test"
+
+func testClient(t *testing.T) (*redis.Client, string) {
+	t.Helper()
+	addr := os.Getenv("REDIS_TEST_ADDR")
+	if addr == "" {
+		t.Skip("REDIS_TEST_ADDR not set")
+	}
+	rdb := redis.NewClient(&redis.Options{Addr: addr})
+	stream := fmt.Sprintf("listeners-test-%d", time.Now().UnixNano())
+	t.Cleanup(func() {
+		rdb.Del(context.Background(), stream)
+		rdb.Close()
+	})
+	return rdb, stream
+}
+
+func addEvents(t *testing.T, rdb *redis.Client, stream string, payloads ...string) {
+	t.Helper()
+	for _, payload := range payloads {
+		if err := rdb.XAdd(context.Background(), &redis.XAddArgs{Stream: stream, Values: map[string]interface{}{"event": payload}}).Err(); err != nil {
+			t.Fatalf("XADD: %v", err)
+		}
+	}
+}
+
+// consumeUntil runs consumeStream until want payloads were handled (or a timeout) and returns them
+func consumeUntil(t *testing.T, rdb *redis.Client, stream, consumer string, want int) []string {
+	t.Helper()
+	ctx, cancel := context.WithTimeout(context.Background(), 5*time.Second)
+	defer cancel()
+
+	var mu sync.Mutex
+	var got []string
+	done := make(chan struct{})
+	go func() {
+		defer close(done)
+		consumeStream(ctx, rdb, stream, testGroup, consumer, 100*time.Millisecond, func(payload string) {
+			mu.Lock()
+			defer mu.Unlock()
+			got = append(got, payload)
+			if len(got) == want {
+				cancel()
+			}
+		})
+	}()
+	<-done
+
+	mu.Lock()
+	defer mu.Unlock()
+	return got
+}
+
+func pendingCount(t *testing.T, rdb *redis.Client, stream string) int64 {
+	t.Helper()
+	pending, err := rdb.XPending(context.Background(), stream, testGroup).Result()
+	if err != nil {
+		t.Fatalf("XPENDING: %v", err)
+	}
+	return pending.Count
+}
+
+func TestConsumeStreamHandlesAndAcksInOrder(t *testing.T) {
+	rdb, stream := testClient(t)
+	addEvents(t, rdb, stream, "a", "b", "c")
+
+	got := consumeUntil(t, rdb, stream, "consumer-1", 3)
+
+	if fmt.Sprint(got) != "[a b c]" {
+		t.Fatalf("handled %v, want [a b c]", got)
+	}
+	if count := pendingCount(t, rdb, stream); count != 0 {
+		t.Fatalf("%d entries left unacknowledged", count)
+	}
+}
+
+func TestConsumeStreamRedeliversPendingEntriesFirst(t *testing.T) {
+	rdb, stream := testClient(t)
+	ctx := context.Background()
+	if err := rdb.XGroupCreateMkStream(ctx, stream, testGroup, "0").Err(); err != nil {
+		t.Fatalf("XGROUP CREATE: %v", err)
+	}
+	addEvents(t, rdb, stream, "delivered-before-crash-1", "delivered-before-crash-2")
+
+	// read without acking, as if the processor died while handling them
+	if err := rdb.XReadGroup(ctx, &redis.XReadGroupArgs{Group: testGroup, Consumer: "consumer-1", Streams: []string{stream, ">"}, Count: 10}).Err(); err != nil {
+		t.Fatalf("XREADGROUP: %v", err)
+	}
+	if count := pendingCount(t, rdb, stream); count != 2 {
+		t.Fatalf("%d pending entries before the restart, want 2", count)
+	}
+	addEvents(t, rdb, stream, "new")
+
+	got := consumeUntil(t, rdb, stream, "consumer-1", 3)
+
+	if fmt.Sprint(got) != "[delivered-before-crash-1 delivered-before-crash-2 new]" {
+		t.Fatalf("handled %v, want the pending entries before the new one", got)
+	}
+	if count := pendingCount(t, rdb, stream); count != 0 {
+		t.Fatalf("%d entries left unacknowledged", count)
+	}
+}
+
+func TestConsumeStreamJoinsAnExistingGroup(t *testing.T) {
+	rdb, stream := testClient(t)
+	if err := rdb.XGroupCreateMkStream(context.Background(), stream, testGroup, "0").Err(); err != nil {
+		t.Fatalf("XGROUP CREATE: %v", err)
+	}
+	addEvents(t, rdb, stream, "a")
+
+	// BUSYGROUP from the second create must not stop the consumer
+	if got := consumeUntil(t, rdb, stream, "consumer-2", 1); fmt.Sprint(got) != "[a]" {
+		t.Fatalf("handled %v, want [a]", got)
+	}
+}